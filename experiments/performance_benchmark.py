@@ -0,0 +1,121 @@
+"""Time the stages of zonemap and zonemapalt on synthetic pages of growing size.
+
+Run from the repository root with python -m experiments.performance_benchmark.
+Peak memory is measured with tracemalloc, which sees python and numpy
+allocations but not the ones made inside GEOS.
+"""
+
+import argparse
+import json
+import time
+import tracemalloc
+import zonemap.zonemap as zm
+import zonemapalt.zonemapalt as zma
+from experiments.synthetic_pages import generate_page
+
+__SCALES__ = [10, 100, 1000, 10000]
+__REPEAT__ = 3
+
+def measure(func, *args):
+    """Run func once, return its result, its wall time and its peak traced memory."""
+    tracemalloc.reset_peak()
+    start_memory = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] - start_memory
+    return result, elapsed, peak
+
+def zonemap_stages(ref_zones, hyp_zones, threshold):
+    """Yield the (stage, func, args) steps of zonemap, each fed by the previous ones."""
+    links = yield 'compute_links', zm.compute_links, (ref_zones, hyp_zones)
+    sorted_links = yield 'sort_links', zm.sort_links, (links,)
+    groups = yield 'make_groups', zm.make_groups, (sorted_links,)
+    groups = yield 'add_unmatched', zm.add_unmatched, (groups, ref_zones, hyp_zones)
+    groups = yield 'compute_error_surfs', zm.compute_error_surfs, (groups, ref_zones, hyp_zones,
+                                                                   sorted_links)
+    yield 'compute_zonemap', zm.compute_zonemap, (groups, ref_zones)
+    yield 'end_to_end', zm.zonemap, (ref_zones, hyp_zones)
+
+def zonemapalt_stages(ref_zones, hyp_zones, threshold):
+    """Yield the (stage, func, args) steps of zonemapalt, each fed by the previous ones."""
+    links = yield 'compute_links', zma.compute_links, (ref_zones, hyp_zones)
+    sorted_links = yield 'sort_links', zma.sort_links, (links,)
+    matches, ref_links, hyp_links = yield 'make_matches', zma.make_matches, (
+        sorted_links, ref_zones, hyp_zones, threshold)
+    matches = yield 'find_missed_areas', zma.find_missed_areas, (matches, ref_zones, hyp_zones,
+                                                                 ref_links, hyp_links)
+    scores, _ = yield 'compute_errors', zma.compute_errors, (matches,)
+    yield 'compute_scores', zma.compute_scores, (scores, ref_zones)
+    yield 'end_to_end', zma.zonemapalt, (ref_zones, hyp_zones, threshold)
+
+def run_stages(stages, ref_zones, hyp_zones, threshold):
+    """Run the stages of a metric once, return {stage: (seconds, peak bytes)}."""
+    measures = {}
+    steps = stages(ref_zones, hyp_zones, threshold)
+    result = None
+    try:
+        while True:
+            stage, func, args = steps.send(result)
+            result, elapsed, peak = measure(func, *args)
+            measures[stage] = (elapsed, peak)
+    except StopIteration:
+        pass
+    return measures
+
+def benchmark(scales=__SCALES__, repeat=__REPEAT__, seed=0, threshold=0.15, **rates):
+    """Benchmark both metrics at each scale, keep the fastest of repeat runs of each stage."""
+    records = []
+    tracemalloc.start()
+    try:
+        for n_zones in scales:
+            ref_zones, hyp_zones = generate_page(seed, n_zones, **rates)
+            for metric, stages in (('zonemap', zonemap_stages),
+                                   ('zonemapalt', zonemapalt_stages)):
+                runs = [run_stages(stages, ref_zones, hyp_zones, threshold)
+                        for _ in range(repeat)]
+                for stage in runs[0]:
+                    seconds = min(run[stage][0] for run in runs)
+                    records.append({'metric':metric,
+                                    'zones':n_zones,
+                                    'ref_zones':len(ref_zones),
+                                    'hyp_zones':len(hyp_zones),
+                                    'stage':stage,
+                                    'seconds':seconds,
+                                    'zones_per_second':(len(ref_zones) + len(hyp_zones)) / seconds
+                                                       if seconds > 0 else float('inf'),
+                                    'peak_bytes':max(run[stage][1] for run in runs)})
+    finally:
+        tracemalloc.stop()
+    return records
+
+def print_records(records):
+    """Print the benchmark records as a table."""
+    print('{:<11}{:>7}  {:<20}{:>12}{:>16}{:>12}'.format('metric', 'zones', 'stage', 'ms',
+                                                       'zones/s', 'peak MiB'))
+    for record in records:
+        print('{:<11}{:>7}  {:<20}{:>12.2f}{:>16.0f}{:>12.2f}'.format(
+            record['metric'], record['zones'], record['stage'], record['seconds'] * 1000,
+            record['zones_per_second'], record['peak_bytes'] / float(1 << 20)))
+
+if __name__ == '__main__':
+    __parser__ = argparse.ArgumentParser(description=__doc__)
+    __parser__.add_argument('--scales', type=int, nargs='+', default=__SCALES__)
+    __parser__.add_argument('--repeat', type=int, default=__REPEAT__)
+    __parser__.add_argument('--seed', type=int, default=0)
+    __parser__.add_argument('--threshold', type=float, default=0.15)
+    __parser__.add_argument('--density', type=float, default=0.3)
+    __parser__.add_argument('--split-rate', type=float, default=0.1)
+    __parser__.add_argument('--merge-rate', type=float, default=0.05)
+    __parser__.add_argument('--miss-rate', type=float, default=0.05)
+    __parser__.add_argument('--false-alarm-rate', type=float, default=0.05)
+    __parser__.add_argument('--json', default=None, help='also write the records in this file')
+    __args__ = __parser__.parse_args()
+    __records__ = benchmark(__args__.scales, __args__.repeat, __args__.seed, __args__.threshold,
+                            density=__args__.density, split_rate=__args__.split_rate,
+                            merge_rate=__args__.merge_rate, miss_rate=__args__.miss_rate,
+                            false_alarm_rate=__args__.false_alarm_rate)
+    print_records(__records__)
+    if __args__.json is not None:
+        with open(__args__.json, 'w') as fil:
+            json.dump(__records__, fil, indent=1)
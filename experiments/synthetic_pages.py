@@ -0,0 +1,133 @@
+"""Seeded generator of synthetic GEDI pages for ZoneMap and ZoneMapAlt benchmarks."""
+
+import argparse
+import os
+import random
+from lib.utils import __gedi_ns__
+from lib.zones import ZoneTableBuilder
+
+__PAGE_RATIO__ = 1.4
+__MIN_SIDE__ = 4
+
+def random_zone(rng, page_width, page_height, mean_side):
+    """Return a random (col, row, width, height) zone inside a page."""
+    width = max(__MIN_SIDE__, min(page_width, int(rng.uniform(0.5, 2.0) * mean_side)))
+    height = max(__MIN_SIDE__, min(page_height, int(rng.uniform(0.25, 1.0) * mean_side)))
+    return (rng.randint(0, page_width - width), rng.randint(0, page_height - height),
+            width, height)
+
+def jitter_zone(rng, zone, jitter):
+    """Move and resize a zone by up to jitter pixels on each side."""
+    col, row, width, height = zone
+    left = max(0, col + rng.randint(-jitter, jitter))
+    top = max(0, row + rng.randint(-jitter, jitter))
+    right = max(left + 1, col + width + rng.randint(-jitter, jitter))
+    bottom = max(top + 1, row + height + rng.randint(-jitter, jitter))
+    return (left, top, right - left, bottom - top)
+
+def split_zone(rng, zone):
+    """Cut a zone in 2 or 3 pieces along its longest side."""
+    col, row, width, height = zone
+    n_pieces = rng.randint(2, 3)
+    horizontal = width >= height
+    length = width if horizontal else height
+    if length < n_pieces:
+        return [zone]
+    cuts = sorted(rng.sample(range(1, length), n_pieces - 1))
+    bounds = [0] + cuts + [length]
+    if horizontal:
+        return [(col + start, row, end - start, height) for start, end in zip(bounds, bounds[1:])]
+    return [(col, row + start, width, end - start) for start, end in zip(bounds, bounds[1:])]
+
+def merge_zones(zones):
+    """Return the bounding box of several zones."""
+    left = min(col for col, _, _, _ in zones)
+    top = min(row for _, row, _, _ in zones)
+    right = max(col + width for col, _, width, _ in zones)
+    bottom = max(row + height for _, row, _, height in zones)
+    return (left, top, right - left, bottom - top)
+
+def generate_page(seed, n_zones, density=0.3, split_rate=0.1, merge_rate=0.05, miss_rate=0.05,
+                  false_alarm_rate=0.05, jitter=8, mean_side=120):
+    """Generate the ref and hyp zones of a page as two ZoneTables.
+
+    density is the expected fraction of the page covered by ref zones, so the
+    page grows with n_zones and zones overlap more as density gets close to 1.
+    Each ref zone is missed, split, merged with the next zone in reading order
+    or jittered according to the rates, and false alarms are added on top.
+    """
+    rng = random.Random(seed)
+    mean_area = 1.25 * 0.625 * mean_side * mean_side
+    page_height = int((n_zones * mean_area / density * __PAGE_RATIO__) ** 0.5) + 2 * mean_side
+    page_width = int(page_height / __PAGE_RATIO__) + 2 * mean_side
+    ref_zones = sorted((random_zone(rng, page_width, page_height, mean_side)
+                        for _ in range(n_zones)), key=lambda zone: (zone[1], zone[0]))
+    hyp_zones = []
+    i = 0
+    while i < len(ref_zones):
+        draw = rng.random()
+        if draw < miss_rate:
+            pass
+        elif draw < miss_rate + split_rate:
+            hyp_zones.extend(split_zone(rng, jitter_zone(rng, ref_zones[i], jitter)))
+        elif draw < miss_rate + split_rate + merge_rate and i + 1 < len(ref_zones):
+            hyp_zones.append(jitter_zone(rng, merge_zones(ref_zones[i:i + 2]), jitter))
+            i += 1
+        else:
+            hyp_zones.append(jitter_zone(rng, ref_zones[i], jitter))
+        i += 1
+    for _ in range(int(round(false_alarm_rate * n_zones))):
+        hyp_zones.append(random_zone(rng, page_width, page_height, mean_side))
+    return zone_table(ref_zones), zone_table(hyp_zones)
+
+def zone_table(zones):
+    """Build a ZoneTable of (col, row, width, height) zones with ids starting at 1."""
+    builder = ZoneTableBuilder()
+    for zone_id, zone in enumerate(zones, 1):
+        builder.add(zone_id, *zone)
+    return builder.table()
+
+def gedi_xml(pages):
+    """Return a GEDI document of a list of ZoneTables, one per page."""
+    namespace = __gedi_ns__.strip('{}')
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>',
+             '<GEDI xmlns="{}" GEDI_version="2.4.1">'.format(namespace),
+             '<DL_DOCUMENT src="synthetic" NrOfPages="{}">'.format(len(pages))]
+    for page_id, zones in enumerate(pages, 1):
+        lines.append('<DL_PAGE gedi_type="DL_PAGE" pageID="{}">'.format(page_id))
+        for zone_id, col, row, width, height in zip(zones.ids.tolist(), zones.cols.tolist(),
+                                                    zones.rows.tolist(), zones.widths.tolist(),
+                                                    zones.heights.tolist()):
+            lines.append('<DL_ZONE gedi_type="Area" id="{}" col="{}" row="{}" width="{}" '
+                         'height="{}" />'.format(zone_id, col, row, width, height))
+        lines.append('</DL_PAGE>')
+    lines.append('</DL_DOCUMENT>')
+    lines.append('</GEDI>')
+    return '\n'.join(lines)
+
+def write_corpus(folder, n_files, n_zones, seed=0, **rates):
+    """Write n_files pairs of GEDI files in folder/reference and folder/hypothesis."""
+    for sub_folder in ('reference', 'hypothesis'):
+        os.makedirs(os.path.join(folder, sub_folder), exist_ok=True)
+    for i in range(n_files):
+        ref_zones, hyp_zones = generate_page(seed + i, n_zones, **rates)
+        for sub_folder, zones in (('reference', ref_zones), ('hypothesis', hyp_zones)):
+            with open(os.path.join(folder, sub_folder, 'page_{:05d}.xml'.format(i)), 'w') as fil:
+                fil.write(gedi_xml([zones]))
+
+if __name__ == '__main__':
+    __parser__ = argparse.ArgumentParser(description=__doc__)
+    __parser__.add_argument('folder')
+    __parser__.add_argument('--files', type=int, default=10)
+    __parser__.add_argument('--zones', type=int, default=100)
+    __parser__.add_argument('--seed', type=int, default=0)
+    __parser__.add_argument('--density', type=float, default=0.3)
+    __parser__.add_argument('--split-rate', type=float, default=0.1)
+    __parser__.add_argument('--merge-rate', type=float, default=0.05)
+    __parser__.add_argument('--miss-rate', type=float, default=0.05)
+    __parser__.add_argument('--false-alarm-rate', type=float, default=0.05)
+    __args__ = __parser__.parse_args()
+    write_corpus(__args__.folder, __args__.files, __args__.zones, __args__.seed,
+                 density=__args__.density, split_rate=__args__.split_rate,
+                 merge_rate=__args__.merge_rate, miss_rate=__args__.miss_rate,
+                 false_alarm_rate=__args__.false_alarm_rate)
@@ -1,7 +1,8 @@
 """Benchmark zonemap and zonemapalt algorithm based on beta value."""
 
-from zonemapalt import *
-from zonemap import *
+import numpy as np
+from zonemapalt.zonemapalt import zonemapalt_sweep_xmls
+from lib.display import display_graph
 
 if __name__ == '__main__':
     __abcisse__ = np.arange(0, 1.01, 0.1)
@@ -18,9 +19,9 @@ if __name__ == '__main__':
     __z_match__ = []
 
     print('abcisse vector {}'.format(__abcisse__))
-    for __BETA__ in __abcisse__:
+    __sweep__ = zonemapalt_sweep_xmls("input/all/reference/", "input/all/hypothesis", __abcisse__)
+    for __BETA__, (_, _, za_avg) in zip(__abcisse__, __sweep__):
         print('Beta {}'.format(__BETA__))
-        _, _, za_avg = zonemapalt_xmls("input/all/reference/", "input/all/hypothesis", __BETA__)
         __za_split__.append(za_avg['split'])
         __za_miss__.append(za_avg['miss'])
         __za_merge__.append(za_avg['merge'])
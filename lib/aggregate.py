@@ -0,0 +1,340 @@
+"""Streaming statistics of the page scores of a corpus."""
+
+import heapq
+import math
+from array import array
+from collections import defaultdict
+import numpy as np
+
+__RELATIVE_ACCURACY__ = 0.01
+__BOOTSTRAP_CHUNK__ = 1 << 22
+__TOP_K__ = 20
+# Scores whose worst pages are the lowest ones, and scores that are not errors
+__HIGHER_IS_BETTER__ = ('match',)
+__UNRANKED__ = ('total_gt_area', 'total_ref_area')
+
+class ExactSum:
+    """Running sum of floats without rounding error, kept as non-overlapping partials."""
+
+    __slots__ = ('partials',)
+
+    def __init__(self):
+        self.partials = []
+
+    def add(self, value):
+        """Add a value to the partials, as math.fsum does."""
+        value = float(value)
+        i = 0
+        for partial in self.partials:
+            if abs(value) < abs(partial):
+                value, partial = partial, value
+            high = value + partial
+            low = partial - (high - value)
+            if low:
+                self.partials[i] = low
+                i += 1
+            value = high
+        self.partials[i:] = [value]
+
+    def merge(self, other):
+        """Add the partials of another sum."""
+        for partial in other.partials:
+            self.add(partial)
+
+    def value(self):
+        """Return the correctly rounded sum."""
+        return math.fsum(self.partials)
+
+class Moments:
+    """Count, mean and variance of a stream of values, by Welford's algorithm."""
+
+    __slots__ = ('count', 'mean', 'm2')
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, value):
+        """Update the moments with a value."""
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    def merge(self, other):
+        """Combine the moments of another stream, by Chan's formula."""
+        count = self.count + other.count
+        if count == 0:
+            return
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+
+    def variance(self, ddof=1):
+        """Return the variance, nan with less than ddof + 1 values."""
+        if self.count <= ddof:
+            return math.nan
+        return self.m2 / (self.count - ddof)
+
+class QuantileSketch:
+    """Mergeable sketch of a distribution with logarithmic buckets, as in DDSketch.
+
+    A quantile is within relative_accuracy of the value of that rank, with a
+    number of buckets growing with the log of the range of the values only.
+    """
+
+    def __init__(self, relative_accuracy=__RELATIVE_ACCURACY__):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.positive = defaultdict(int)
+        self.negative = defaultdict(int)
+        self.zeros = 0
+        self.count = 0
+
+    def bucket(self, value):
+        """Return the bucket of a non-zero absolute value."""
+        return math.ceil(math.log(value) / self.log_gamma)
+
+    def add(self, value):
+        """Count a value in its bucket."""
+        self.count += 1
+        if value > 0:
+            self.positive[self.bucket(value)] += 1
+        elif value < 0:
+            self.negative[self.bucket(-value)] += 1
+        else:
+            self.zeros += 1
+
+    def merge(self, other):
+        """Add the buckets of a sketch of the same accuracy."""
+        if other.gamma != self.gamma:
+            raise ValueError('Cannot merge sketches of different accuracies')
+        for buckets, other_buckets in ((self.positive, other.positive),
+                                       (self.negative, other.negative)):
+            for key, count in other_buckets.items():
+                buckets[key] += count
+        self.zeros += other.zeros
+        self.count += other.count
+
+    def quantile(self, q):
+        """Return the value at quantile q in [0, 1], nan if no value was added."""
+        if self.count == 0:
+            return math.nan
+        rank = q * (self.count - 1)
+        seen = 0
+        for key in sorted(self.negative, reverse=True):
+            seen += self.negative[key]
+            if seen > rank:
+                return -2 * self.gamma ** key / (self.gamma + 1)
+        seen += self.zeros
+        if seen > rank:
+            return 0.0
+        for key in sorted(self.positive):
+            seen += self.positive[key]
+            if seen > rank:
+                return 2 * self.gamma ** key / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.positive) / (self.gamma + 1)
+
+class WorstPages:
+    """The k worst pages of each score, in bounded min-heaps.
+
+    The worst pages are the ones with the highest errors and final score, and
+    the lowest match. Area totals are not ranked.
+    """
+
+    def __init__(self, k=__TOP_K__):
+        self.k = k
+        self.heaps = {}
+        self.seen = 0
+
+    @staticmethod
+    def _sign(key):
+        """Return -1 for the scores ranked by their lowest values, 1 otherwise."""
+        return -1 if key in __HIGHER_IS_BETTER__ else 1
+
+    def _push(self, key, item):
+        """Keep an item if it is among the k worst of its score."""
+        heap = self.heaps.setdefault(key, [])
+        if len(heap) < self.k:
+            heapq.heappush(heap, item)
+        elif item > heap[0]:
+            heapq.heapreplace(heap, item)
+
+    def add(self, page, scores):
+        """Offer the scores of a page, earlier pages being kept on ties."""
+        for key, value in scores.items():
+            if key not in __UNRANKED__:
+                self._push(key, (self._sign(key) * value, -self.seen, page))
+        self.seen += 1
+
+    def merge(self, other):
+        """Offer the pages of another WorstPages, as if they came after these ones."""
+        for key, heap in other.heaps.items():
+            for value, order, page in heap:
+                self._push(key, (value, order - self.seen, page))
+        self.seen += other.seen
+
+    def worst(self, key):
+        """Return the (page, value) pairs of a score, worst value first."""
+        return [(page, self._sign(key) * value)
+                for value, _, page in sorted(self.heaps.get(key, ()), reverse=True)]
+
+class CorpusStats:
+    """Statistics of the page scores of a corpus, built page by page and mergeable.
+
+    Sums are exact, page means and variances are streamed, area-weighted means
+    weight each page by its weight_key score (its ref area) and percentiles come
+    from a QuantileSketch. Scores are also kept as float32 per-page arrays, for
+    bootstrap confidence intervals, and the top_k worst named pages of each error
+    in a WorstPages.
+    """
+
+    def __init__(self, weight_key=None, relative_accuracy=__RELATIVE_ACCURACY__,
+                 top_k=__TOP_K__):
+        self.weight_key = weight_key
+        self.relative_accuracy = relative_accuracy
+        self.pages = 0
+        self.sums = {}
+        self.counts = {}
+        self.moments = {}
+        self.weighted_sums = {}
+        self.total_weight = ExactSum()
+        self.sketches = {}
+        self.values = {}
+        self.weights = array('f')
+        self.worst = WorstPages(top_k)
+
+    def _key(self, key):
+        """Create the statistics of a score seen for the first time."""
+        self.sums[key] = ExactSum()
+        self.moments[key] = Moments()
+        self.weighted_sums[key] = ExactSum()
+        self.sketches[key] = QuantileSketch(self.relative_accuracy)
+        self.values[key] = array('f', [math.nan]) * self.pages
+
+    def add(self, scores, n_scores=None, page=None):
+        """Add the scores and counts of a page, ranked among the worst ones if it is named."""
+        weight = None if self.weight_key is None else float(scores[self.weight_key])
+        for key, value in scores.items():
+            if key not in self.sums:
+                self._key(key)
+            value = float(value)
+            self.sums[key].add(value)
+            self.moments[key].add(value)
+            self.sketches[key].add(value)
+            self.values[key].append(value)
+            if weight is not None:
+                self.weighted_sums[key].add(value * weight)
+        for key, values in self.values.items():
+            if key not in scores:
+                values.append(math.nan)
+        for key, value in (n_scores or {}).items():
+            self.counts.setdefault(key, ExactSum()).add(value)
+        if weight is not None:
+            self.total_weight.add(weight)
+            self.weights.append(weight)
+        if page is not None:
+            self.worst.add(page, scores)
+        self.pages += 1
+
+    def merge(self, other):
+        """Add the pages of another CorpusStats, computed in another process for instance."""
+        if other.weight_key != self.weight_key:
+            raise ValueError('Cannot merge statistics weighted by {} and {}'.format(
+                self.weight_key, other.weight_key))
+        for key in other.sums:
+            if key not in self.sums:
+                self._key(key)
+            self.sums[key].merge(other.sums[key])
+            self.moments[key].merge(other.moments[key])
+            self.weighted_sums[key].merge(other.weighted_sums[key])
+            self.sketches[key].merge(other.sketches[key])
+        for key, values in self.values.items():
+            values.extend(other.values.get(key, array('f', [math.nan]) * other.pages))
+        for key, value in other.counts.items():
+            self.counts.setdefault(key, ExactSum()).merge(value)
+        self.total_weight.merge(other.total_weight)
+        self.weights.extend(other.weights)
+        self.worst.merge(other.worst)
+        self.pages += other.pages
+
+    def sum_scores(self, digits=2):
+        """Return the sum of each score over the pages, rounded once."""
+        return {key:round(total.value(), digits) for key, total in self.sums.items()}
+
+    def average_scores(self, digits=2):
+        """Return the average of each score over the pages."""
+        return {key:round(total.value() / self.pages, digits) for key, total in self.sums.items()}
+
+    def sum_counts(self):
+        """Return the sum of each count over the pages."""
+        return {key:total.value() for key, total in self.counts.items()}
+
+    def mean(self, key):
+        """Return the mean of a score over the pages it was given for."""
+        return self.moments[key].mean if self.moments[key].count else math.nan
+
+    def std(self, key):
+        """Return the sample standard deviation of a score over the pages."""
+        return math.sqrt(self.moments[key].variance())
+
+    def weighted_mean(self, key):
+        """Return the mean of a score weighted by the weight_key score of each page."""
+        if self.weight_key is None:
+            raise ValueError('No weight_key to weight the pages by')
+        total_weight = self.total_weight.value()
+        return self.weighted_sums[key].value() / total_weight if total_weight else math.nan
+
+    def quantile(self, key, q):
+        """Return the approximate quantile q of a score over the pages."""
+        return self.sketches[key].quantile(q)
+
+    def worst_pages(self, key):
+        """Return the (page, value) pairs of the worst pages for a score, worst first."""
+        return self.worst.worst(key)
+
+    def bootstrap(self, key, confidence=0.95, n_resamples=1000, weighted=False, seed=None):
+        """Return a (low, high) bootstrap confidence interval of the mean of a score.
+
+        Pages are resampled with replacement from the per-page arrays, by chunks
+        of at most __BOOTSTRAP_CHUNK__ indices, and the mean is area-weighted
+        when weighted is True.
+        """
+        values = np.frombuffer(self.values[key], dtype=np.float32).astype(np.float64)
+        if weighted:
+            if self.weight_key is None:
+                raise ValueError('No weight_key to weight the pages by')
+            weights = np.frombuffer(self.weights, dtype=np.float32).astype(np.float64)
+        else:
+            weights = np.ones_like(values)
+        given = ~np.isnan(values)
+        values, weights = values[given], weights[given]
+        if len(values) == 0:
+            return math.nan, math.nan
+        rng = np.random.default_rng(seed)
+        means = np.empty(n_resamples)
+        chunk = max(1, __BOOTSTRAP_CHUNK__ // len(values))
+        for start in range(0, n_resamples, chunk):
+            stop = min(n_resamples, start + chunk)
+            samples = rng.integers(0, len(values), size=(stop - start, len(values)))
+            sample_weights = weights[samples]
+            means[start:stop] = ((values[samples] * sample_weights).sum(axis=1)
+                                 / sample_weights.sum(axis=1))
+        tail = (1 - confidence) / 2 * 100
+        low, high = np.nanpercentile(means, [tail, 100 - tail])
+        return float(low), float(high)
+
+    def summary(self, quantiles=(0.5, 0.9, 0.99)):
+        """Return the statistics of each score as a dict, for reports."""
+        summary = {}
+        for key in self.sums:
+            summary[key] = {'sum':self.sums[key].value(), 'mean':self.mean(key),
+                            'std':self.std(key)}
+            if self.weight_key is not None:
+                summary[key]['weighted_mean'] = self.weighted_mean(key)
+            for q in quantiles:
+                summary[key]['p{:g}'.format(q * 100)] = self.quantile(key, q)
+        return summary
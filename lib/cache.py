@@ -0,0 +1,124 @@
+"""On-disk cache of parsed zones and link tables keyed by file content."""
+
+import hashlib
+import os
+from functools import lru_cache
+from zipfile import BadZipFile
+import numpy as np
+from lib.utils import zone_table_from_gedi_xml
+from lib.zones import ZoneTable
+from lib.links import LinkTable
+from lib.geometry import get_backend
+
+__CACHE_VERSION__ = 3
+__MAX_CACHE_BYTES__ = 1 << 30
+
+def file_hash(path):
+    """Return the sha1 hex digest of a file content."""
+    sha = hashlib.sha1()
+    with open(path, 'rb') as fil:
+        for chunk in iter(lambda: fil.read(1 << 20), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+class ZoneCache:
+    """Directory of .npz zone and link tables, evicted least recently used first."""
+
+    def __init__(self, cache_dir, max_bytes=__MAX_CACHE_BYTES__):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.size = sum(entry.stat().st_size for entry in self._entries())
+        self._hashes = {}
+
+    def _entries(self):
+        """Return the cache files."""
+        with os.scandir(self.cache_dir) as entries:
+            return [entry for entry in entries if entry.name.endswith('.npz')]
+
+    def _hash(self, path):
+        """Return the content hash of a file, memoized on its size and mtime."""
+        stat = os.stat(path)
+        key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+        if key not in self._hashes:
+            self._hashes[key] = file_hash(path)
+        return self._hashes[key]
+
+    def _path(self, *parts):
+        """Return the cache file of a key."""
+        key = '|'.join([str(__CACHE_VERSION__)] + [str(part) for part in parts])
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode()).hexdigest() + '.npz')
+
+    def _load(self, path):
+        """Return the arrays of a cache file, or None if it is missing or unreadable."""
+        try:
+            with np.load(path) as data:
+                arrays = {name:data[name] for name in data.files}
+            os.utime(path)
+        except (OSError, ValueError, KeyError, BadZipFile):
+            return None
+        return arrays
+
+    def _store(self, path, **arrays):
+        """Write arrays in a cache file, then evict old files if the cache is too big."""
+        tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+        with open(tmp_path, 'wb') as fil:
+            np.savez(fil, **arrays)
+        try:
+            self.size -= os.path.getsize(path)
+        except FileNotFoundError:
+            pass
+        self.size += os.path.getsize(tmp_path)
+        os.replace(tmp_path, path)
+        if self.size > self.max_bytes:
+            self.evict()
+
+    def evict(self):
+        """Remove the least recently used files until the cache fits in max_bytes."""
+        files = sorted((entry.stat().st_mtime, entry.stat().st_size, entry.path)
+                       for entry in self._entries())
+        self.size = sum(size for _, size, _ in files)
+        for _, size, path in files:
+            if self.size <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self.size -= size
+
+    def zones(self, xml_path, gedi_type="Area"):
+        """Return the ZoneTable of the first page of a GEDI xml."""
+        path = self._path('zones', self._hash(xml_path), gedi_type)
+        arrays = self._load(path)
+        if arrays is not None:
+            return ZoneTable(arrays['ids'], arrays['cols'], arrays['rows'],
+                             arrays['widths'], arrays['heights'])
+        table = zone_table_from_gedi_xml(xml_path, gedi_type)
+        self._store(path, ids=table.ids, cols=table.cols, rows=table.rows,
+                    widths=table.widths, heights=table.heights)
+        return table
+
+    def links(self, ref_xml_path, hyp_xml_path, compute, gedi_type="Area", backend=None):
+        """Return the LinkTable between two GEDI xml, computing it on a cache miss.
+
+        backend is the geometry backend compute links with, links of different
+        backends or raster scales are cached apart.
+        """
+        backend = get_backend(backend)
+        path = self._path('links', self._hash(ref_xml_path), self._hash(hyp_xml_path), gedi_type,
+                          backend.name, getattr(backend, 'scale', None))
+        arrays = self._load(path)
+        if arrays is not None:
+            return LinkTable(arrays['ref_ids'].tolist(), arrays['hyp_ids'].tolist(),
+                             arrays['links'])
+        links = compute()
+        self._store(path, links=links.data,
+                    ref_ids=np.array(links.keys_1, dtype=np.int64),
+                    hyp_ids=np.array(links.keys_2, dtype=np.int64))
+        return links
+
+@lru_cache(maxsize=None)
+def get_cache(cache_dir):
+    """Return the ZoneCache of a directory, shared by all the calls of a process."""
+    return ZoneCache(cache_dir)
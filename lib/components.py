@@ -0,0 +1,45 @@
+"""Connected components of the graph linking ref and hyp zones."""
+
+def link_components(ref_keys, hyp_keys, links):
+    """Split zones and (ref_key, hyp_key, area, strength) links in connected components.
+
+    Return a (ref_keys, hyp_keys, links) tuple per component. Zones and links
+    keep their input order within a component, and components come in the
+    order of their first ref zone, then of their first hyp zone.
+    """
+    parent = {}
+
+    def find(node):
+        """Return the root of a node, halving the path to it."""
+        while parent.get(node, node) != node:
+            parent[node] = parent.get(parent[node], parent[node])
+            node = parent[node]
+        return node
+
+    links = list(links)
+    for link in links:
+        root_1, root_2 = find(('ref', link[0])), find(('hyp', link[1]))
+        if root_1 != root_2:
+            parent[root_2] = root_1
+    components = {}
+    for key in ref_keys:
+        components.setdefault(find(('ref', key)), ([], [], []))[0].append(key)
+    for key in hyp_keys:
+        components.setdefault(find(('hyp', key)), ([], [], []))[1].append(key)
+    for link in links:
+        components[find(('ref', link[0]))][2].append(link)
+    return list(components.values())
+
+def batch_components(components, n_batches):
+    """Cut a list of components in at most n_batches consecutive batches of similar sizes."""
+    sizes = [len(refs) + len(hyps) + len(links) for refs, hyps, links in components]
+    target = max(1, sum(sizes) // max(1, n_batches))
+    batches = [[]]
+    size = 0
+    for component, component_size in zip(components, sizes):
+        if size >= target and len(batches) < n_batches:
+            batches.append([])
+            size = 0
+        batches[-1].append(component)
+        size += component_size
+    return [batch for batch in batches if batch]
@@ -3,12 +3,19 @@
 import cv2
 import numpy as np
 import shapely.geometry as sg
-import matplotlib.pyplot as plt
 import os
+import threading
+from multiprocessing import parent_process
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.util import Finalize
 from os.path import basename
 from lib.utils import get_filename
 import shutil
 
+__WRITER_WORKERS__ = 2
+__WRITER_PENDING__ = 4
+__writers__ = {}
+
 __color_map__ = {}
 __color_map__['False alarm'] = (43, 243, 240)
 __color_map__['Miss'] = (125, 125, 125)
@@ -30,7 +37,7 @@ def draw_polygon(img, polygon, color):
         if isinstance(polygon,list):
             for geom in polygon:
                 draw_polygon(img, geom, color)
-        else:
+        elif not polygon.is_empty:
             pts = np.array(polygon.exterior.coords)
             pts = np.int32([pts])
             # cv2.polylines(img, pts, True, color, 1)
@@ -47,173 +54,151 @@ def outline_polygon(img, polygon, color, thickness = 4):
         if isinstance(polygon,list):
             for geom in polygon:
                 outline_polygon(img, geom, color)
-        else:
+        elif not polygon.is_empty:
             pts = np.array(polygon.exterior.coords)
             pts = np.int32([pts])
             cv2.polylines(img, pts, True, color, thickness)
 
-def display_matches(matches, img_path, hyp_zones, alpha=0.4):
-    """Display errors groups."""
-    img = cv2.imread(img_path)
-    img_cpy = img.copy()
-    img_match = img.copy()
-    img_miss = img.copy()
-    img_false_alarm = img.copy()
-    img_split = img.copy()
-    img_merge = img.copy()
-    img_multiple = img.copy()
-
-    for _, match in matches.items():
-        # Draw miss(es)
-        if match['error_class'] == 'Miss':
-            draw_polygon(img_cpy, match['zone'], __color_map__["Miss"])
-            draw_polygon(img_miss, match['zone'], __color_map__["Miss"])
-
-        # Draw false alarm(s)
-        if match['error_class'] == 'False alarm':
-            draw_polygon(img_cpy, match['zone'], __color_map__["False alarm"])
-            draw_polygon(img_false_alarm, match['zone'], __color_map__["False alarm"])
-
-        # Draw splits
-        if match['error_class'] == 'Split':
-            draw_polygon(img_cpy, match['zone'], __color_map__["Split"])
-            draw_polygon(img_split, match['zone'], __color_map__["Split"])
-
-        # Draw merges
-        if match['error_class'] == 'Merge':
-            draw_polygon(img_cpy, match['zone'], __color_map__["Merge"])
-            draw_polygon(img_merge, match['zone'], __color_map__["Merge"])
-
-        # Draw match
-        if match['error_class'] == 'Match':
-            draw_polygon(img_cpy, match['zone'], __color_map__["Match"])
-            draw_polygon(img_match, match['zone'], __color_map__["Match"])
-
-        # Draw multiple
-        if match['error_class'] == 'Multiple':
-            draw_polygon(img_cpy, match['zone'], __color_map__["Match"])
-            draw_polygon(img_multiple, match['zone'], __color_map__["Match"])
-
-    out_folder = basename(get_filename(img_path))
-    out_folder = "output/zonemapaltresults/" + out_folder
+def prepare_folder(out_folder):
+    """Empty or create an output folder."""
     if os.path.exists(out_folder):
         shutil.rmtree(out_folder)
     os.makedirs(out_folder)
 
-    for _, hyp_zone in hyp_zones.items():
-        outline_polygon(img_cpy, hyp_zone, __color_map__["BLACK"])
-        outline_polygon(img_miss, hyp_zone, __color_map__["BLACK"])
-        outline_polygon(img_false_alarm, hyp_zone, __color_map__["BLACK"])
-        outline_polygon(img_split, hyp_zone, __color_map__["BLACK"])
-        outline_polygon(img_merge, hyp_zone, __color_map__["BLACK"])
-        outline_polygon(img_match, hyp_zone, __color_map__["BLACK"])
-        outline_polygon(img_multiple, hyp_zone, __color_map__["BLACK"])
-
-    cpy = img.copy()
-    cv2.addWeighted(img_match, alpha, cpy, 1 - alpha, 0, cpy)
-    cv2.imwrite(os.path.join(out_folder,"match.png"), cpy)
-
-    cpy = img.copy()
-    cv2.addWeighted(img_miss, alpha, cpy, 1 - alpha, 0, cpy)
-    cv2.imwrite(os.path.join(out_folder,"miss.png"), cpy)
-
-    cpy = img.copy()
-    cv2.addWeighted(img_false_alarm, alpha, cpy, 1 - alpha, 0, cpy)
-    cv2.imwrite(os.path.join(out_folder,"false_alarm.png"), cpy)
-
-    cpy = img.copy()
-    cv2.addWeighted(img_split, alpha, cpy, 1 - alpha, 0, cpy)
-    cv2.imwrite(os.path.join(out_folder,"split.png"), cpy)
-
-    cpy = img.copy()
-    cv2.addWeighted(img_merge, alpha, cpy, 1 - alpha, 0, cpy)
-    cv2.imwrite(os.path.join(out_folder,"merge.png"), cpy)
-
-    cpy = img.copy()
-    cv2.addWeighted(img_multiple, alpha, cpy, 1 - alpha, 0, cpy)
-    cv2.imwrite(os.path.join(out_folder,"multiple.png"), cpy)
-
-def display_errors(groups, img_path, hyp_zones, alpha=0.4):
-    """Display errors groups."""
+def blend_lut(color, alpha):
+    """Return the (1, 256, 3) table of addWeighted(color, alpha, value, 1 - alpha) per channel."""
+    values = np.repeat(np.arange(256, dtype=np.uint8).reshape(1, 256, 1), 3, axis=2)
+    colors = np.empty_like(values)
+    colors[...] = color
+    return cv2.addWeighted(colors, alpha, values, 1 - alpha, 0)
+
+def render_layers(img_path, out_folder, layers, outlines, alpha=0.4):
+    """Write one image per layer, its zones filled and all outlines drawn, blended over the page.
+
+    layers is a list of (name, color, geometries). Each layer is filled as one
+    bit of a single label mask, and its image is the page with the blending
+    lookup table of its color copied on the labeled pixels, instead of drawing
+    on a full copy of the page for each layer.
+    """
     img = cv2.imread(img_path)
-    img_cpy = img.copy()
-    img_match = img.copy()
-    img_miss = img.copy()
-    img_false_alarm = img.copy()
-    img_split = img.copy()
-    img_merge = img.copy()
-
+    bits = np.zeros(img.shape[:2], dtype=np.uint8)
+    scratch = np.zeros(img.shape[:2], dtype=np.uint8)
+    for bit, (_, _, geometries) in enumerate(layers):
+        scratch[...] = 0
+        for geometry in geometries:
+            draw_polygon(scratch, geometry, 1 << bit)
+        bits |= scratch
+    outline = np.zeros(img.shape[:2], dtype=np.uint8)
+    for zone in outlines:
+        outline_polygon(outline, zone, 1)
+    outlined = cv2.LUT(img, blend_lut(__color_map__['BLACK'], alpha))
+    for bit, (name, color, _) in enumerate(layers):
+        out = img.copy()
+        np.bitwise_and(bits, 1 << bit, out=scratch)
+        cv2.copyTo(cv2.LUT(img, blend_lut(color, alpha)), scratch, out)
+        cv2.copyTo(outlined, outline, out)
+        cv2.imwrite(os.path.join(out_folder, name + '.png'), out)
+
+def submit_layers(writer, img_path, out_folder, layers, outlines, alpha):
+    """Prepare the output folder, then render the layers now or in a DisplayWriter."""
+    prepare_folder(out_folder)
+    if writer is None:
+        render_layers(img_path, out_folder, layers, outlines, alpha)
+    else:
+        writer.submit(render_layers, img_path, out_folder, layers, outlines, alpha)
+
+def display_matches(matches, img_path, hyp_zones, alpha=0.4, writer=None, output_dir="output"):
+    """Display errors groups, in a DisplayWriter if one is given."""
+    layers = [(name, __color_map__[color], []) for name, color in
+              (('match', 'Match'), ('miss', 'Miss'), ('false_alarm', 'False alarm'),
+               ('split', 'Split'), ('merge', 'Merge'), ('multiple', 'Match'))]
+    classes = dict(zip(['Match', 'Miss', 'False alarm', 'Split', 'Merge', 'Multiple'], layers))
+    for _, match in matches.items():
+        if match['error_class'] in classes:
+            classes[match['error_class']][2].append(match['zone'])
+    out_folder = os.path.join(output_dir, "zonemapaltresults", basename(get_filename(img_path)))
+    submit_layers(writer, img_path, out_folder, layers, list(hyp_zones.values()), alpha)
+
+def display_errors(groups, img_path, hyp_zones, alpha=0.4, writer=None, output_dir="output"):
+    """Display errors groups, in a DisplayWriter if one is given."""
+    layers = [(name, __color_map__[color], []) for name, color in
+              (('match', 'Match'), ('miss', 'Miss'), ('false_alarm', 'False alarm'),
+               ('split', 'Split'), ('merge', 'Merge'))]
     for group in groups:
         details = group['error_details']
-        # Draw miss(es)
-        misses = details['miss']
-        if misses is not None:
-            for miss in misses:
-                draw_polygon(img_cpy, miss, __color_map__["Miss"])
-                draw_polygon(img_miss, miss, __color_map__["Miss"])
-
-        # Draw false alarm(s)
-        false_alarms = details['false_alarm']
-        if false_alarms is not None:
-            for false_alarm in false_alarms:
-                draw_polygon(img_cpy, false_alarm, __color_map__["False alarm"])
-                draw_polygon(img_false_alarm, false_alarm, __color_map__["False alarm"])
-
-        # Draw splits
-        splits = details['split']
-        if splits is not None:
-            for split in splits:
-                draw_polygon(img_cpy, split, __color_map__["Split"])
-                draw_polygon(img_split, split, __color_map__["Split"])
-
-        # Draw merges
-        merges = details['merge']
-        if merges is not None:
-            for merge in merges:
-                draw_polygon(img_cpy, merge, __color_map__["Merge"])
-                draw_polygon(img_merge, merge, __color_map__["Merge"])
-
-        # Draw match
-        match_poly = details['match']
-        if match_poly is not None:
-            draw_polygon(img_cpy, match_poly, __color_map__["Match"])
-            draw_polygon(img_match, match_poly, __color_map__["Match"])
-
-    out_folder = basename(get_filename(img_path))
-    out_folder = "output/zonemapresults/" + out_folder
-    if os.path.exists(out_folder):
-        shutil.rmtree(out_folder)
-    os.makedirs(out_folder)
-
-    for _, hyp_zone in hyp_zones.items():
-        outline_polygon(img_cpy, hyp_zone, __color_map__["BLACK"])
-        outline_polygon(img_miss, hyp_zone, __color_map__["BLACK"])
-        outline_polygon(img_false_alarm, hyp_zone, __color_map__["BLACK"])
-        outline_polygon(img_split, hyp_zone, __color_map__["BLACK"])
-        outline_polygon(img_merge, hyp_zone, __color_map__["BLACK"])
-        outline_polygon(img_match, hyp_zone, __color_map__["BLACK"])
-
-    cpy = img.copy()
-    cv2.addWeighted(img_match, alpha, cpy, 1 - alpha, 0, cpy)
-    cv2.imwrite(out_folder + "/match.png", cpy)
-
-    cpy = img.copy()
-    cv2.addWeighted(img_miss, alpha, cpy, 1 - alpha, 0, cpy)
-    cv2.imwrite(out_folder + "/miss.png", cpy)
-
-    cpy = img.copy()
-    cv2.addWeighted(img_false_alarm, alpha, cpy, 1 - alpha, 0, cpy)
-    cv2.imwrite(out_folder + "/false_alarm.png", cpy)
-
-    cpy = img.copy()
-    cv2.addWeighted(img_split, alpha, cpy, 1 - alpha, 0, cpy)
-    cv2.imwrite(out_folder + "/split.png", cpy)
-
-    cpy = img.copy()
-    cv2.addWeighted(img_merge, alpha, cpy, 1 - alpha, 0, cpy)
-    cv2.imwrite(out_folder + "/merge.png", cpy)
+        for name, _, geometries in layers:
+            if details[name] is None:
+                continue
+            if name == 'match':
+                geometries.append(details[name])
+            else:
+                geometries.extend(details[name])
+    out_folder = os.path.join(output_dir, "zonemapresults", basename(get_filename(img_path)))
+    submit_layers(writer, img_path, out_folder, layers, list(hyp_zones.values()), alpha)
+
+class DisplayWriter:
+    """Render and write visualizations in background threads.
+
+    submit blocks while max_pending renderings are queued, so that pages are
+    not scored faster than their images are written.
+    """
+
+    def __init__(self, workers=__WRITER_WORKERS__, max_pending=__WRITER_PENDING__):
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.futures = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+    def submit(self, func, *args):
+        """Queue func(*args), raising the error of a failed rendering if any."""
+        done = [future for future in self.futures if future.done()]
+        self.futures = [future for future in self.futures if future not in done]
+        for future in done:
+            future.result()
+        self.slots.acquire()
+        future = self.executor.submit(func, *args)
+        future.add_done_callback(lambda _: self.slots.release())
+        self.futures.append(future)
+
+    def wait(self):
+        """Wait for the queued renderings, raising the first error."""
+        futures, self.futures = self.futures, []
+        for future in futures:
+            future.result()
+
+    def close(self):
+        """Wait for the queued renderings and stop the threads."""
+        try:
+            self.wait()
+        finally:
+            self.executor.shutdown()
+
+def get_writer():
+    """Return the DisplayWriter of the current process, closed when the process exits."""
+    pid = os.getpid()
+    if pid not in __writers__:
+        writer = DisplayWriter()
+        Finalize(writer, writer.close, exitpriority=10)
+        __writers__[pid] = writer
+    return __writers__[pid]
+
+def wait_in_worker(writer):
+    """Wait for the renderings of a job run in a worker process, raising their first error.
+
+    Worker writers are only closed when their process exits, where errors are
+    lost, while the main process waits for its writer at the end of a batch.
+    """
+    if writer is not None and parent_process() is not None:
+        writer.wait()
 
 def display_graph(it_vect, datas):
+    import matplotlib.pyplot as plt
     ax = plt.subplot(111, xlabel='β', ylabel='Number of class error')
     for item in ([ax.title, ax.xaxis.label, ax.yaxis.label] +
                  ax.get_xticklabels() + ax.get_yticklabels()):
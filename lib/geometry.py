@@ -0,0 +1,138 @@
+"""Geometry backends computing the links and areas of zones batch by batch."""
+
+from abc import ABC, abstractmethod
+import numpy as np
+import shapely
+from lib.links import link_table
+from lib.rects import rect_link_table, link_strengths
+from lib.raster import rasterize_zones, overlap_areas
+from lib.spatial import candidate_indices
+from lib.stats import get_stats
+from lib.zones import ZoneTable
+
+__PAIRS_PER_CALL__ = 1 << 16
+
+def zone_areas(zones):
+    """Return the (N,) float64 array of the zone areas, without building ZoneTable polygons."""
+    if isinstance(zones, ZoneTable):
+        return (zones.widths.astype(np.int64) * zones.heights).astype(np.float64)
+    return shapely.area(np.array(list(zones.values()), dtype=object)).astype(np.float64)
+
+class GeometryBackend(ABC):
+    """Interface between the algorithms and the geometry of the zones.
+
+    links(zones_1, zones_2, stats) returns the LinkTable of the pairs of zones
+    with a non-zero intersection, in the order of a nested loop over zones_1
+    then zones_2, and areas(zones) the area of each zone in zone order.
+    """
+
+    name = None
+
+    @abstractmethod
+    def links(self, zones_1, zones_2, stats=None):
+        """Return the LinkTable of the intersecting zones."""
+
+    def areas(self, zones):
+        """Return the (N,) float64 array of the zone areas."""
+        return zone_areas(zones)
+
+class ShapelyBackend(GeometryBackend):
+    """Any polygons, intersected with the vectorized shapely 2 functions.
+
+    Candidate pairs come from an STRtree, and each call of shapely.intersection
+    and shapely.area handles up to __PAIRS_PER_CALL__ pairs.
+    """
+
+    name = 'shapely'
+
+    def links(self, zones_1, zones_2, stats=None):
+        stats = get_stats(stats)
+        keys_1, keys_2, idx_1, idx_2 = candidate_indices(zones_1, zones_2)
+        stats.count('candidate_pairs', len(idx_1))
+        stats.count('shapely_ops', len(idx_1))
+        geoms_1 = np.array([zones_1[key] for key in keys_1], dtype=object)
+        geoms_2 = np.array([zones_2[key] for key in keys_2], dtype=object)
+        areas_1, areas_2 = self.areas(zones_1), self.areas(zones_2)
+        areas = np.empty(len(idx_1), dtype=np.float64)
+        for start in range(0, len(idx_1), __PAIRS_PER_CALL__):
+            rows = slice(start, start + __PAIRS_PER_CALL__)
+            areas[rows] = shapely.area(shapely.intersection(geoms_1[idx_1[rows]],
+                                                            geoms_2[idx_2[rows]]))
+        with np.errstate(invalid='ignore'):
+            strengths = link_strengths(areas, areas_1[idx_1], areas_2[idx_2])
+        linked = strengths > 0
+        stats.count('links', int(linked.sum()))
+        return link_table(keys_1, keys_2, idx_1[linked], idx_2[linked], areas[linked],
+                          strengths[linked])
+
+class RectBackend(GeometryBackend):
+    """Axis-aligned rectangles, intersected as numpy boxes without any polygon.
+
+    Candidate pairs come from an STRtree of the boxes, so that only the boxes
+    that overlap are intersected.
+    """
+
+    name = 'rect'
+
+    def links(self, zones_1, zones_2, stats=None):
+        links = rect_link_table(zones_1, zones_2, stats=stats)
+        if links is None:
+            raise ValueError('The rect backend only handles axis-aligned rectangles')
+        get_stats(stats).count('links', len(links))
+        return links
+
+class AutoBackend(GeometryBackend):
+    """The rect backend when all zones are rectangles, the shapely one otherwise."""
+
+    name = 'auto'
+
+    def links(self, zones_1, zones_2, stats=None):
+        links = rect_link_table(zones_1, zones_2, stats=stats)
+        if links is None:
+            return ShapelyBackend().links(zones_1, zones_2, stats)
+        get_stats(stats).count('links', len(links))
+        return links
+
+class RasterBackend(GeometryBackend):
+    """Zones rasterized at scale, areas counted in pixels.
+
+    Areas are exact for rectangles with integer corners at scale 1, and
+    approximate otherwise. The metrics count every other area, the residuals
+    and covers of zones included, on the rasters of rasterize, so that all
+    their areas come from the same pixels.
+    """
+
+    name = 'raster'
+
+    def __init__(self, scale=1.0):
+        self.scale = scale
+
+    def rasterize(self, zones_1, zones_2):
+        """Return the RasterZones of zones_1 and zones_2, on rasters of the same shape."""
+        return rasterize_zones(zones_1, zones_2, self.scale)
+
+    def links(self, zones_1, zones_2, stats=None):
+        raster_1, raster_2 = self.rasterize(zones_1, zones_2)
+        idx_1, idx_2, pixels = overlap_areas(raster_1, raster_2)
+        get_stats(stats).count('links', len(idx_1))
+        strengths = link_strengths(pixels, raster_1.areas[idx_1], raster_2.areas[idx_2])
+        return link_table(raster_1.ids, raster_2.ids, idx_1, idx_2,
+                          pixels * raster_1.pixel_area(), strengths)
+
+    def areas(self, zones):
+        raster, _ = rasterize_zones(zones, {}, self.scale)
+        return raster.areas * raster.pixel_area()
+
+__BACKENDS__ = {backend.name:backend for backend in (AutoBackend, ShapelyBackend, RectBackend,
+                                                      RasterBackend)}
+
+def get_backend(backend=None):
+    """Return a backend from its name, a backend instance as is, or the auto backend."""
+    if backend is None:
+        return AutoBackend()
+    if isinstance(backend, GeometryBackend):
+        return backend
+    if backend not in __BACKENDS__:
+        raise ValueError('Unknown geometry backend {}, expected one of {}'.format(
+            backend, ', '.join(__BACKENDS__)))
+    return __BACKENDS__[backend]()
@@ -0,0 +1,162 @@
+"""Incremental evaluation of a page whose hyp zones are edited one at a time."""
+
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from itertools import count
+from shapely.strtree import STRtree
+from lib.geometry import get_backend
+
+class IncrementalEvaluator(ABC):
+    """Zones, links and per-component results of a page.
+
+    Ref and hyp zones are the nodes of a graph whose edges are the non-zero
+    links. Adding, removing or updating a hyp zone only invalidates the
+    connected components it touches, and evaluate() recomputes those before
+    combining the results of all the components.
+
+    Initial links, and the links of edited zones, are computed with the given
+    geometry backend, see lib.geometry. Subclasses implement
+    evaluate_component(ref_zones, hyp_zones, links), which returns (key, item)
+    pairs, and combine(items), which builds the page result from the items of
+    all components sorted by key. Links are (ref_id, hyp_id, area, strength)
+    tuples sorted by rank, the order a full evaluation would sort them in.
+    """
+
+    def __init__(self, ref_zones, hyp_zones, backend=None):
+        self.ref_zones = dict(ref_zones.items())
+        self.hyp_zones = dict(hyp_zones.items())
+        self.ref_order = {key:i for i, key in enumerate(self.ref_zones)}
+        self._orders = count(len(self.hyp_zones))
+        self.hyp_order = {key:i for i, key in enumerate(self.hyp_zones)}
+        self._ref_keys = list(self.ref_zones)
+        self._ref_tree = STRtree([self.ref_zones[key] for key in self._ref_keys])
+        self.links = {}
+        self.ref_adjacency = defaultdict(set)
+        self.hyp_adjacency = defaultdict(set)
+        self.component_of = {}
+        self.components = {}
+        self.items = {}
+        self._components = count()
+        self.dirty = set([('ref', key) for key in self.ref_zones]
+                         + [('hyp', key) for key in self.hyp_zones])
+        self.backend = get_backend(backend)
+        for ref_key, hyp_key, area, strength in self.backend.links(self.ref_zones,
+                                                                    self.hyp_zones):
+            self._add_link(ref_key, hyp_key, area, strength)
+
+    def _add_link(self, ref_key, hyp_key, area, strength):
+        """Add an edge to the link graph."""
+        self.links[ref_key, hyp_key] = (area, strength)
+        self.ref_adjacency[ref_key].add(hyp_key)
+        self.hyp_adjacency[hyp_key].add(ref_key)
+
+    def _link_hyp(self, hyp_key):
+        """Link a hyp zone to the ref zones it intersects, with the geometry backend."""
+        hyp_zone = self.hyp_zones[hyp_key]
+        ref_keys = [self._ref_keys[index]
+                    for index in sorted(self._ref_tree.query(hyp_zone).tolist())]
+        links = self.backend.links({key:self.ref_zones[key] for key in ref_keys},
+                                   {hyp_key:hyp_zone})
+        for ref_key, _, area, strength in links:
+            self._add_link(ref_key, hyp_key, area, strength)
+            self._invalidate(('ref', ref_key))
+
+    def _unlink_hyp(self, hyp_key):
+        """Remove the links of a hyp zone."""
+        for ref_key in self.hyp_adjacency.pop(hyp_key, ()):
+            del self.links[ref_key, hyp_key]
+            self.ref_adjacency[ref_key].discard(hyp_key)
+
+    def _invalidate(self, node):
+        """Mark a node and the other nodes of its component for re-evaluation."""
+        component_id = self.component_of.get(node)
+        if component_id is None:
+            self.dirty.add(node)
+            return
+        for other in self.components.pop(component_id):
+            del self.component_of[other]
+            self.dirty.add(other)
+        del self.items[component_id]
+
+    def add_zone(self, hyp_key, zone):
+        """Add a hyp zone, after the existing ones."""
+        if hyp_key in self.hyp_zones:
+            raise ValueError('Hyp zone {} already exists'.format(hyp_key))
+        self.hyp_zones[hyp_key] = zone
+        self.hyp_order[hyp_key] = next(self._orders)
+        self._invalidate(('hyp', hyp_key))
+        self._link_hyp(hyp_key)
+
+    def remove_zone(self, hyp_key):
+        """Remove a hyp zone."""
+        self._invalidate(('hyp', self._check(hyp_key)))
+        self._unlink_hyp(hyp_key)
+        self.dirty.discard(('hyp', hyp_key))
+        del self.hyp_zones[hyp_key]
+        del self.hyp_order[hyp_key]
+
+    def update_zone(self, hyp_key, zone):
+        """Replace the geometry of a hyp zone, which keeps its position."""
+        self._invalidate(('hyp', self._check(hyp_key)))
+        self._unlink_hyp(hyp_key)
+        self.hyp_zones[hyp_key] = zone
+        self._link_hyp(hyp_key)
+
+    def _check(self, hyp_key):
+        """Return hyp_key, raising a KeyError if it is not a hyp zone."""
+        if hyp_key not in self.hyp_zones:
+            raise KeyError('Unknown hyp zone {}'.format(hyp_key))
+        return hyp_key
+
+    def rank(self, ref_key, hyp_key):
+        """Return the sort key of a link, strongest first then in zone order."""
+        return (-self.links[ref_key, hyp_key][1], self.ref_order[ref_key],
+                self.hyp_order[hyp_key])
+
+    def _component(self, node):
+        """Return the ref and hyp keys connected to a node."""
+        refs, hyps = set(), set()
+        pending = [node]
+        while pending:
+            tag, key = pending.pop()
+            seen, adjacency, other_tag = ((refs, self.ref_adjacency, 'hyp') if tag == 'ref'
+                                          else (hyps, self.hyp_adjacency, 'ref'))
+            if key in seen:
+                continue
+            seen.add(key)
+            pending.extend((other_tag, other) for other in adjacency.get(key, ()))
+        return refs, hyps
+
+    def refresh(self):
+        """Evaluate the components of the nodes touched since the last refresh."""
+        while self.dirty:
+            refs, hyps = self._component(self.dirty.pop())
+            nodes = [('ref', key) for key in refs] + [('hyp', key) for key in hyps]
+            self.dirty.difference_update(nodes)
+            ref_zones = {key:self.ref_zones[key]
+                         for key in sorted(refs, key=self.ref_order.__getitem__)}
+            hyp_zones = {key:self.hyp_zones[key]
+                         for key in sorted(hyps, key=self.hyp_order.__getitem__)}
+            links = sorted(((ref_key, hyp_key) + self.links[ref_key, hyp_key]
+                            for ref_key in ref_zones for hyp_key in self.ref_adjacency[ref_key]),
+                           key=lambda link: self.rank(link[0], link[1]))
+            component_id = next(self._components)
+            self.components[component_id] = nodes
+            for node in nodes:
+                self.component_of[node] = component_id
+            self.items[component_id] = self.evaluate_component(ref_zones, hyp_zones, links)
+
+    def evaluate(self):
+        """Return the result of the page, re-evaluating the edited components only."""
+        self.refresh()
+        items = [item for component in self.items.values() for item in component]
+        items.sort(key=lambda item: item[0])
+        return self.combine([item for _, item in items])
+
+    @abstractmethod
+    def evaluate_component(self, ref_zones, hyp_zones, links):
+        """Return the (key, item) pairs of a component."""
+
+    @abstractmethod
+    def combine(self, items):
+        """Return the result of the page from the sorted items of all components."""
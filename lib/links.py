@@ -0,0 +1,50 @@
+"""Compact storage of the links between two sets of zones."""
+
+import numpy as np
+
+__LINK_DTYPE__ = np.dtype([('index_1', np.int64), ('index_2', np.int64),
+                           ('area', np.float64), ('strength', np.float64)])
+
+class LinkTable:
+    """Links between two sets of zones, as rows of a structured array.
+
+    Rows hold the positions of the zones in keys_1 and keys_2, the intersection
+    area and the link strength. Iterating yields (key_1, key_2, area, strength)
+    tuples, the link format the algorithms consume.
+    """
+
+    __slots__ = ('keys_1', 'keys_2', 'data')
+
+    def __init__(self, keys_1, keys_2, data):
+        self.keys_1 = keys_1
+        self.keys_2 = keys_2
+        self.data = data
+
+    def __len__(self):
+        return len(self.data)
+
+    def __iter__(self):
+        return zip(map(self.keys_1.__getitem__, self.data['index_1'].tolist()),
+                   map(self.keys_2.__getitem__, self.data['index_2'].tolist()),
+                   self.data['area'].tolist(), self.data['strength'].tolist())
+
+    def sorted(self):
+        """Return the links by decreasing strength, in their current order on ties."""
+        order = np.argsort(-self.data['strength'], kind='stable')
+        return LinkTable(self.keys_1, self.keys_2, self.data[order])
+
+def link_table(keys_1, keys_2, index_1, index_2, areas, strengths):
+    """Build a LinkTable from its columns."""
+    data = np.empty(len(index_1), dtype=__LINK_DTYPE__)
+    data['index_1'] = index_1
+    data['index_2'] = index_2
+    data['area'] = areas
+    data['strength'] = strengths
+    return LinkTable(keys_1, keys_2, data)
+
+def concat_links(keys_1, keys_2, tables):
+    """Build a LinkTable from blocks of (index_1, index_2, areas, strengths) columns."""
+    tables = list(tables)
+    if not tables:
+        return link_table(keys_1, keys_2, [], [], [], [])
+    return link_table(keys_1, keys_2, *[np.concatenate(column) for column in zip(*tables)])
@@ -0,0 +1,153 @@
+"""Rasterized zones, to measure overlap areas by counting pixels."""
+
+import numpy as np
+import shapely
+from lib.rects import rects_from_zones
+
+__ROWS_PER_CHUNK__ = 512
+
+class RasterZones:
+    """Zones painted in a stack of label layers where no two zones overlap.
+
+    The zone at index i is painted with label i+1, so its mask over a window
+    is a single comparison on the layer that holds it. Layers are (box, labels)
+    pairs: the first one covers the page, and a zone overlapping a zone of every
+    layer gets a layer covering its own box only, so that memory stays within
+    the page plus the boxes of the overlapping zones.
+    """
+
+    def __init__(self, zones, boxes, rectangular, shape, scale=1.0):
+        self.ids = list(zones.keys())
+        self.index = {key:i for i, key in enumerate(self.ids)}
+        self.boxes = boxes
+        self.scale = scale
+        self.shape = shape
+        self.dtype = np.uint16 if len(self.ids) < np.iinfo(np.uint16).max else np.uint32
+        self.layers = [((0, 0, shape[1], shape[0]), np.zeros(shape, dtype=self.dtype))]
+        self.layer_of = np.zeros(len(self.ids), dtype=np.int64)
+        self.areas = np.zeros(len(self.ids), dtype=np.int64)
+        for i, key in enumerate(self.ids):
+            self.paint(i, None if rectangular else polygon_mask(zones[key], boxes[i], scale))
+
+    def paint(self, i, mask=None):
+        """Paint a zone on the first layer that holds its box without overlapping another zone."""
+        box = tuple(self.boxes[i].tolist())
+        for layer_id, (layer_box, labels) in enumerate(self.layers):
+            if window_intersection(box, layer_box) != box:
+                continue
+            window = crop(labels, local_window(box, layer_box))
+            if not (window[mask] if mask is not None else window).any():
+                break
+        else:
+            layer_id = len(self.layers)
+            self.layers.append((box, np.zeros((box[3] - box[1], box[2] - box[0]),
+                                              dtype=self.dtype)))
+        layer_box, labels = self.layers[layer_id]
+        window = crop(labels, local_window(box, layer_box))
+        if mask is None:
+            window[...] = i + 1
+            self.areas[i] = window.size
+        else:
+            window[mask] = i + 1
+            self.areas[i] = np.count_nonzero(mask)
+        self.layer_of[i] = layer_id
+
+    def mask(self, i, window):
+        """Return the mask of a zone over a (left, top, right, bottom) window."""
+        layer_box, labels = self.layers[self.layer_of[i]]
+        return crop(labels, local_window(window, layer_box)) == i + 1
+
+    def pixel_area(self):
+        """Return the page area covered by one pixel."""
+        return 1.0 / (self.scale * self.scale)
+
+def zone_boxes(zones, scale=1.0):
+    """Return the pixel boxes of zones, and whether they are all rectangles."""
+    rects = rects_from_zones(zones)
+    if rects is not None:
+        boxes = np.rint(rects[1] * scale).astype(np.int64)
+        return np.clip(boxes, 0, None), True
+    bounds = np.array([zones[key].bounds for key in zones], dtype=np.float64).reshape(-1, 4)
+    bounds *= scale
+    boxes = np.concatenate([np.floor(bounds[:, :2]), np.ceil(bounds[:, 2:]) + 1], axis=1)
+    return np.clip(boxes.astype(np.int64), 0, None), False
+
+def polygon_mask(zone, box, scale):
+    """Rasterize a non-rectangular zone over its box, keeping the pixels whose centre it holds.
+
+    Sampling pixel centres keeps polygon areas unbiased, where filling the
+    polygon would also take every pixel its boundary crosses.
+    """
+    left, top, right, bottom = box
+    xs = (np.arange(left, right) + 0.5) / scale
+    ys = (np.arange(top, bottom) + 0.5) / scale
+    return shapely.contains_xy(zone, xs[None, :], ys[:, None])
+
+def rasterize_zones(ref_zones, hyp_zones, scale=1.0):
+    """Rasterize ref and hyp zones on rasters of the same shape."""
+    ref_boxes, ref_rectangular = zone_boxes(ref_zones, scale)
+    hyp_boxes, hyp_rectangular = zone_boxes(hyp_zones, scale)
+    corners = np.concatenate([ref_boxes[:, 2:], hyp_boxes[:, 2:], [[0, 0]]])
+    shape = (int(corners[:, 1].max()), int(corners[:, 0].max()))
+    return (RasterZones(ref_zones, ref_boxes, ref_rectangular, shape, scale),
+            RasterZones(hyp_zones, hyp_boxes, hyp_rectangular, shape, scale))
+
+def overlap_areas(raster_1, raster_2, rows=__ROWS_PER_CHUNK__):
+    """Return (idx_1, idx_2, pixels) of all overlapping zone pairs.
+
+    Label pairs are counted on the overlap of each pair of layers, by blocks
+    of rows, and come out sorted on idx_1 then idx_2.
+    """
+    n_labels = len(raster_2.ids) + 1
+    codes = [np.empty(0, dtype=np.int64)]
+    counts = [np.empty(0, dtype=np.int64)]
+    for box_1, labels_1 in raster_1.layers:
+        for box_2, labels_2 in raster_2.layers:
+            left, top, right, bottom = window_intersection(box_1, box_2)
+            if left >= right or top >= bottom:
+                continue
+            for start in range(top, bottom, rows):
+                window = (left, start, right, min(bottom, start + rows))
+                block_1 = crop(labels_1, local_window(window, box_1)).ravel()
+                pixels_1 = np.flatnonzero(block_1)
+                if len(pixels_1) == 0:
+                    continue
+                block_2 = crop(labels_2, local_window(window, box_2)).ravel()[pixels_1]
+                both = block_2 != 0
+                block_codes, block_counts = np.unique(
+                    block_1[pixels_1][both].astype(np.int64) * n_labels + block_2[both],
+                    return_counts=True)
+                codes.append(block_codes)
+                counts.append(block_counts)
+    codes, inverse = np.unique(np.concatenate(codes), return_inverse=True)
+    pixels = np.bincount(inverse, weights=np.concatenate(counts), minlength=len(codes))
+    return codes // n_labels - 1, codes % n_labels - 1, pixels.astype(np.int64)
+
+def window_intersection(box_1, box_2):
+    """Return the intersection of two (left, top, right, bottom) windows."""
+    return (max(box_1[0], box_2[0]), max(box_1[1], box_2[1]),
+            min(box_1[2], box_2[2]), min(box_1[3], box_2[3]))
+
+def local_window(window, box):
+    """Return a window relatively to the top left corner of a box."""
+    return (window[0] - box[0], window[1] - box[1], window[2] - box[0], window[3] - box[1])
+
+def crop(mask, window):
+    """Crop a mask with a (left, top, right, bottom) window."""
+    return mask[window[1]:window[3], window[0]:window[2]]
+
+def union_mask(raster, indices, box):
+    """Return the mask of the union of zones over a (left, top, right, bottom) box."""
+    union = np.zeros((box[3] - box[1], box[2] - box[0]), dtype=bool)
+    for i in indices:
+        window = window_intersection(box, raster.boxes[i])
+        if window[0] >= window[2] or window[1] >= window[3]:
+            continue
+        crop(union, local_window(window, box))[...] |= raster.mask(i, window)
+    return union
+
+def covered_pixels(raster, i, others, other_raster):
+    """Count the pixels of zone i covered by the union of other zones."""
+    box = raster.boxes[i]
+    covered = union_mask(other_raster, others, box)
+    return int(np.count_nonzero(covered & raster.mask(i, box)))
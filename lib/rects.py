@@ -0,0 +1,82 @@
+"""Vectorized link computation for axis-aligned rectangular zones."""
+
+import numpy as np
+from lib.zones import ZoneTable
+from lib.links import concat_links
+from lib.spatial import candidate_box_indices
+from lib.stats import get_stats
+
+__CHUNK_SIZE__ = 1 << 20
+
+def is_rectangle(zone):
+    """Return True if the zone is an axis-aligned rectangle with integer corners."""
+    if zone.geom_type != 'Polygon' or len(zone.interiors) > 0:
+        return False
+    if len(zone.exterior.coords) != 5:
+        return False
+    left, top, right, bottom = zone.bounds
+    if not all(float(value).is_integer() for value in (left, top, right, bottom)):
+        return False
+    return zone.area == (right - left) * (bottom - top)
+
+def rects_from_zones(zones):
+    """Return the zone ids and their (N,4) boxes, or None if a zone is not a rectangle."""
+    if isinstance(zones, ZoneTable):
+        return list(zones), zones.boxes()
+    ids = list(zones.keys())
+    boxes = np.empty((len(ids), 4), dtype=np.int64)
+    for i, key in enumerate(ids):
+        zone = zones[key]
+        if not is_rectangle(zone):
+            return None
+        boxes[i] = zone.bounds
+    return ids, boxes
+
+def box_areas(boxes):
+    """Return the area of each (left, top, right, bottom) box."""
+    return (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+
+def intersection_areas(boxes_1, boxes_2, chunk_size=__CHUNK_SIZE__, stats=None):
+    """Yield (rows, cols, areas) of the non-empty pairwise intersections.
+
+    Candidate pairs of overlapping boxes come from an STRtree, and their
+    intersections are computed by blocks of at most chunk_size pairs, in
+    row-major order.
+    """
+    rows, cols = candidate_box_indices(boxes_1, boxes_2)
+    get_stats(stats).count('candidate_pairs', len(rows))
+    for start in range(0, len(rows), chunk_size):
+        block_rows = rows[start:start + chunk_size]
+        block_cols = cols[start:start + chunk_size]
+        block_1, block_2 = boxes_1[block_rows], boxes_2[block_cols]
+        width = (np.minimum(block_1[:, 2], block_2[:, 2])
+                 - np.maximum(block_1[:, 0], block_2[:, 0]))
+        height = (np.minimum(block_1[:, 3], block_2[:, 3])
+                  - np.maximum(block_1[:, 1], block_2[:, 1]))
+        areas = np.clip(width, 0, None) * np.clip(height, 0, None)
+        linked = areas > 0
+        yield block_rows[linked], block_cols[linked], areas[linked]
+
+def link_strengths(areas, areas_1, areas_2):
+    """Return square(a/A1) + square(a/A2) for each intersection area."""
+    areas = areas.astype(np.float64)
+    return np.square(areas / areas_1) + np.square(areas / areas_2)
+
+def rect_link_table(zones_1, zones_2, chunk_size=__CHUNK_SIZE__, stats=None):
+    """Return the LinkTable of all linked rectangles, counting candidate pairs in stats.
+
+    Return None when one of the zones is not an axis-aligned rectangle, so
+    that the caller can fall back to the polygon computation.
+    """
+    rects_1 = rects_from_zones(zones_1)
+    rects_2 = rects_from_zones(zones_2)
+    if rects_1 is None or rects_2 is None:
+        return None
+    ids_1, boxes_1 = rects_1
+    ids_2, boxes_2 = rects_2
+    areas_1 = box_areas(boxes_1).astype(np.float64)
+    areas_2 = box_areas(boxes_2).astype(np.float64)
+    return concat_links(ids_1, ids_2,
+                        ((rows, cols, areas, link_strengths(areas, areas_1[rows], areas_2[cols]))
+                         for rows, cols, areas in intersection_areas(boxes_1, boxes_2,
+                                                                     chunk_size, stats)))
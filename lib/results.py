@@ -0,0 +1,166 @@
+"""Sinks writing the per-page results of a folder evaluation."""
+
+import json
+import os
+import numpy as np
+
+__RESULTS_FORMATS__ = ('txt', 'jsonl', 'npz')
+__BUFFER_SIZE__ = 1 << 20
+
+def write_items(file, header, items):
+    """Write a header followed by the numbered key : value lines of a dict."""
+    file.write(header)
+    for i, (key, value) in enumerate(items.items(), 1):
+        file.write('\n' + str(i) + ". " + str(key) + ' : ' + str(value))
+
+class TextResults:
+    """One metric text file per page plus a combined text file, as read by humans."""
+
+    def __init__(self, folder, metric, title):
+        self.folder = folder
+        self.metric = metric
+        self.title = title
+
+    def write_page(self, name, ref_file, hyp_file, scores, n_scores):
+        """Write the scores and counts of a page in its own folder."""
+        page_folder = os.path.join(self.folder, name)
+        os.makedirs(page_folder, exist_ok=True)
+        with open(os.path.join(page_folder, self.metric + 'metric.txt'), 'w') as file:
+            write_items(file, '{} Measures \n'.format(self.title), scores)
+            write_items(file, '\n\nCount of {} Evaluation Parameters \n'.format(self.title),
+                        n_scores)
+
+    def write_total(self, sum_scores, avg_scores, sum_n_scores):
+        """Write the sums and averages of all pages."""
+        with open(os.path.join(self.folder, 'combined{}metric.txt'.format(self.metric)),
+                  'w') as file:
+            file.write('{} Result '.format(self.title))
+            write_items(file, '\n\nTotal sum of {} scores of all files \n'.format(self.title),
+                        sum_scores)
+            write_items(file, '\n\nAverage of {} scores of all files \n'.format(self.title),
+                        avg_scores)
+            write_items(file, '\n\nTotal Count of {} Evaluation Parameters \n'.format(
+                self.title), sum_n_scores)
+
+    def close(self):
+        """Nothing is kept open."""
+
+class JsonLinesResults:
+    """A single JSON Lines file, one record per page then a total record."""
+
+    def __init__(self, folder, metric, title):
+        self.path = os.path.join(folder, metric + 'metric.jsonl')
+        self.file = open(self.path, 'w', buffering=__BUFFER_SIZE__)
+        self.n_pages = 0
+
+    def write_record(self, record):
+        """Write one JSON record on its own line."""
+        self.file.write(json.dumps(record) + '\n')
+
+    def write_page(self, name, ref_file, hyp_file, scores, n_scores):
+        """Write the scores and counts of a page."""
+        self.n_pages += 1
+        self.write_record({'type':'page', 'page':name, 'ref':ref_file, 'hyp':hyp_file,
+                           'scores':scores, 'counts':n_scores})
+
+    def write_total(self, sum_scores, avg_scores, sum_n_scores):
+        """Write the sums and averages of all pages."""
+        self.write_record({'type':'total', 'pages':self.n_pages, 'sum':sum_scores,
+                           'average':avg_scores, 'counts':sum_n_scores})
+
+    def close(self):
+        """Flush and close the file."""
+        self.file.close()
+
+class ColumnarResults:
+    """A single .npz file with one column per score and count over the pages.
+
+    The page, ref and hyp columns hold the page names and paths, the score_<key>
+    and count_<key> columns their values, and sum_<key>, average_<key> and
+    total_count_<key> the totals.
+    """
+
+    def __init__(self, folder, metric, title):
+        self.path = os.path.join(folder, metric + 'metric.npz')
+        self.pages = {'page':[], 'ref':[], 'hyp':[]}
+        self.columns = {}
+        self.totals = {}
+
+    def write_page(self, name, ref_file, hyp_file, scores, n_scores):
+        """Add the scores and counts of a page to the columns."""
+        n_pages = len(self.pages['page'])
+        for column, value in zip(('page', 'ref', 'hyp'), (name, ref_file, hyp_file)):
+            self.pages[column].append(value)
+        for prefix, values in (('score_', scores), ('count_', n_scores)):
+            for key, value in values.items():
+                self.columns.setdefault(prefix + key, [np.nan] * n_pages).append(value)
+        for column in self.columns.values():
+            if len(column) == n_pages:
+                column.append(np.nan)
+
+    def write_total(self, sum_scores, avg_scores, sum_n_scores):
+        """Keep the sums and averages of all pages."""
+        for prefix, values in (('sum_', sum_scores), ('average_', avg_scores),
+                               ('total_count_', sum_n_scores)):
+            for key, value in values.items():
+                self.totals[prefix + key] = np.float64(value)
+
+    def close(self):
+        """Write the columns."""
+        arrays = {column:np.array(values, dtype=str) for column, values in self.pages.items()}
+        arrays.update({column:np.array(values, dtype=np.float64)
+                       for column, values in self.columns.items()})
+        arrays.update(self.totals)
+        with open(self.path, 'wb') as file:
+            np.savez(file, **arrays)
+
+class PageDetails:
+    """Detailed groups or matches of every page, looked up by page name.
+
+    Pages are written as JSON lines in <metric>details.jsonl, and
+    <metric>details.index.json maps each page name to the offset and length of
+    its line, so read_page_details reads a single page without parsing the others.
+    """
+
+    def __init__(self, folder, metric):
+        self.path = os.path.join(folder, metric + 'details.jsonl')
+        self.index_path = os.path.join(folder, metric + 'details.index.json')
+        self.file = open(self.path, 'wb', buffering=__BUFFER_SIZE__)
+        self.index = {}
+
+    def write_page(self, name, details):
+        """Append the details of a page and record where they are."""
+        line = (json.dumps(details) + '\n').encode()
+        self.index[name] = [self.file.tell(), len(line)]
+        self.file.write(line)
+
+    def close(self):
+        """Close the details file and write its index."""
+        self.file.close()
+        with open(self.index_path, 'w') as file:
+            json.dump(self.index, file)
+
+def open_details(output_dir, metric):
+    """Return the PageDetails of a metric, writing in output_dir/<metric>results."""
+    folder = os.path.join(output_dir, metric + 'results')
+    os.makedirs(folder, exist_ok=True)
+    return PageDetails(folder, metric)
+
+def read_page_details(output_dir, metric, name):
+    """Return the details of a page written by a PageDetails, raising KeyError if missing."""
+    folder = os.path.join(output_dir, metric + 'results')
+    with open(os.path.join(folder, metric + 'details.index.json')) as file:
+        offset, length = json.load(file)[name]
+    with open(os.path.join(folder, metric + 'details.jsonl'), 'rb') as file:
+        file.seek(offset)
+        return json.loads(file.read(length))
+
+def open_results(output_dir, metric, title, results_format='txt'):
+    """Return the results sink of a metric, writing in output_dir/<metric>results."""
+    sinks = {'txt':TextResults, 'jsonl':JsonLinesResults, 'npz':ColumnarResults}
+    if results_format not in sinks:
+        raise ValueError('Unknown results format {}, expected one of {}'.format(
+            results_format, ', '.join(__RESULTS_FORMATS__)))
+    folder = os.path.join(output_dir, metric + 'results')
+    os.makedirs(folder, exist_ok=True)
+    return sinks[results_format](folder, metric, title)
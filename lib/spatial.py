@@ -0,0 +1,35 @@
+"""Spatial indexing helpers used to avoid comparing every pair of zones."""
+
+import numpy as np
+import shapely
+from shapely.strtree import STRtree
+
+def candidate_indices(zones_1, zones_2):
+    """Return the zone keys and the positions of the pairs whose bounding boxes overlap.
+
+    Pairs are returned in the same order as a nested loop over zones_1 then
+    zones_2 would visit them, so callers keep their link ordering.
+    """
+    keys_1 = list(zones_1.keys())
+    keys_2 = list(zones_2.keys())
+    if not keys_1 or not keys_2:
+        empty = np.empty(0, dtype=np.int64)
+        return keys_1, keys_2, empty, empty
+    tree = STRtree([zones_2[key] for key in keys_2])
+    idx_1, idx_2 = tree.query([zones_1[key] for key in keys_1])
+    order = np.lexsort((idx_2, idx_1))
+    return keys_1, keys_2, idx_1[order], idx_2[order]
+
+def candidate_box_indices(boxes_1, boxes_2):
+    """Return the positions of the pairs of (left, top, right, bottom) boxes that overlap.
+
+    Pairs come sorted on boxes_1 then boxes_2, and touching boxes are
+    included, their intersection being empty.
+    """
+    if len(boxes_1) == 0 or len(boxes_2) == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty
+    tree = STRtree(shapely.box(*boxes_2.T))
+    idx_1, idx_2 = tree.query(shapely.box(*boxes_1.T))
+    order = np.lexsort((idx_2, idx_1))
+    return idx_1[order], idx_2[order]
@@ -0,0 +1,91 @@
+"""Opt-in wall time and counters of the ZoneMap and ZoneMapAlt pipeline stages."""
+
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+
+class PipelineStats:
+    """Accumulate the wall time of stages and named counters.
+
+    callback(name, seconds) is called at the end of each stage, and with the
+    page name when the stats of a page scored in a batch are added. The
+    batch stats keep the total seconds and counters of each page.
+    """
+
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.seconds = defaultdict(float)
+        self.calls = defaultdict(int)
+        self.counters = defaultdict(int)
+        self.pages = {}
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state['callback'] = None
+        return state
+
+    @contextmanager
+    def stage(self, name):
+        """Time a block of code as a stage."""
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            elapsed = time.perf_counter() - start
+            self.seconds[name] += elapsed
+            self.calls[name] += 1
+            if self.callback is not None:
+                self.callback(name, elapsed)
+
+    def count(self, name, value=1):
+        """Add value to a counter."""
+        self.counters[name] += value
+
+    def merge(self, other):
+        """Add the times and counters of other stats."""
+        for name, seconds in other.seconds.items():
+            self.seconds[name] += seconds
+        for name, calls in other.calls.items():
+            self.calls[name] += calls
+        for name, value in other.counters.items():
+            self.counters[name] += value
+        self.pages.update(other.pages)
+        return self
+
+    def add_page(self, page, other):
+        """Merge the stats of a page, and keep its own seconds and counters."""
+        self.merge(other)
+        seconds = sum(other.seconds.values())
+        self.pages[page] = {'seconds':seconds,
+                            'stages':dict(other.seconds),
+                            'counters':dict(other.counters)}
+        if self.callback is not None:
+            self.callback(page, seconds)
+
+    def slowest_pages(self, n_pages=10):
+        """Return the (page, details) of the n slowest pages."""
+        return sorted(self.pages.items(), key=lambda item: item[1]['seconds'],
+                      reverse=True)[:n_pages]
+
+    def as_dict(self):
+        """Return the stats as plain dicts."""
+        return {'seconds':dict(self.seconds),
+                'calls':dict(self.calls),
+                'counters':dict(self.counters),
+                'pages':dict(self.pages)}
+
+class NullStats:
+    """Stand-in for PipelineStats when nothing is recorded."""
+
+    def stage(self, name):
+        """Do not time anything."""
+        return nullcontext(self)
+
+    def count(self, name, value=1):
+        """Ignore the counter."""
+
+__NO_STATS__ = NullStats()
+
+def get_stats(stats):
+    """Return stats, or a NullStats if stats is None."""
+    return __NO_STATS__ if stats is None else stats
@@ -0,0 +1,138 @@
+"""Columnar file of the zones of all the pages of a folder, read by memory mapping."""
+
+import argparse
+import json
+import os
+from array import array
+from functools import lru_cache
+import numpy as np
+from lib.utils import scan_files, iter_gedi_pages, warn_unpaired
+from lib.zones import ZoneTable
+
+__STORE_MAGIC__ = b'ZONESTR1'
+__STORE_VERSION__ = 1
+__ALIGNMENT__ = 64
+__COLUMNS__ = (('ids', 'q'), ('cols', 'i'), ('rows', 'i'), ('widths', 'i'), ('heights', 'i'))
+
+def aligned(offset):
+    """Return the first aligned offset from offset."""
+    return -(-offset // __ALIGNMENT__) * __ALIGNMENT__
+
+def write_zone_store(folder, path, recursive=False, gedi_type="Area"):
+    """Pack the zones of every page of the GEDI xml files of a folder in a zone store.
+
+    The file holds the magic, the length of a JSON header, the header, then
+    the page offset and zone columns, each aligned on __ALIGNMENT__ bytes.
+    Return the number of pages written.
+    """
+    files = []
+    page_offsets = array('q', [0])
+    columns = [array(typecode) for _, typecode in __COLUMNS__]
+    for name, xml_path in sorted(scan_files(folder, recursive).items()):
+        first_page = len(page_offsets) - 1
+        for table in iter_gedi_pages(xml_path, gedi_type):
+            for column, values in zip(columns, (table.ids, table.cols, table.rows,
+                                                table.widths, table.heights)):
+                column.extend(values.tolist())
+            page_offsets.append(len(columns[0]))
+        files.append([name, xml_path, first_page, len(page_offsets) - 1 - first_page])
+    arrays = [('page_offsets', page_offsets)] + [(name, column) for (name, _), column
+                                                  in zip(__COLUMNS__, columns)]
+    header = {'version':__STORE_VERSION__, 'gedi_type':gedi_type, 'files':files,
+              'columns':{}}
+    # Column offsets depend on the header length, which depends on the offsets
+    header_length = 0
+    while True:
+        offset = aligned(len(__STORE_MAGIC__) + 8 + header_length)
+        for name, column in arrays:
+            header['columns'][name] = [offset, column.typecode, len(column)]
+            offset = aligned(offset + len(column) * column.itemsize)
+        encoded = json.dumps(header).encode()
+        if len(encoded) <= header_length:
+            break
+        header_length = len(encoded) + 64
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    with open(tmp_path, 'wb') as fil:
+        fil.write(__STORE_MAGIC__)
+        fil.write(header_length.to_bytes(8, 'little'))
+        fil.write(encoded.ljust(header_length))
+        for name, column in arrays:
+            fil.seek(header['columns'][name][0])
+            column.tofile(fil)
+        fil.truncate(offset)
+    os.replace(tmp_path, path)
+    return len(page_offsets) - 1
+
+class ZoneStore:
+    """Zone store opened read-only with numpy.memmap.
+
+    Pages are ZoneTables whose columns are slices of the mapped file, so
+    processes opening the same store share its pages through the OS page cache.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.data = np.memmap(path, dtype=np.uint8, mode='r')
+        if bytes(self.data[:len(__STORE_MAGIC__)]) != __STORE_MAGIC__:
+            raise ValueError('{} is not a zone store'.format(path))
+        start = len(__STORE_MAGIC__)
+        header_length = int.from_bytes(bytes(self.data[start:start + 8]), 'little')
+        header = json.loads(bytes(self.data[start + 8:start + 8 + header_length]))
+        if header['version'] != __STORE_VERSION__:
+            raise ValueError('{} is a version {} zone store, expected {}'.format(
+                path, header['version'], __STORE_VERSION__))
+        self.gedi_type = header['gedi_type']
+        self.files = {name:(xml_path, first_page, n_pages)
+                      for name, xml_path, first_page, n_pages in header['files']}
+        self.columns = {}
+        for name, (offset, typecode, length) in header['columns'].items():
+            dtype = np.dtype(typecode)
+            self.columns[name] = self.data[offset:offset + length * dtype.itemsize].view(dtype)
+
+    def __len__(self):
+        return len(self.columns['page_offsets']) - 1
+
+    def page(self, index):
+        """Return a page as a ZoneTable of views on the mapped columns."""
+        start, stop = self.columns['page_offsets'][index:index + 2].tolist()
+        return ZoneTable(*(self.columns[name][start:stop] for name, _ in __COLUMNS__))
+
+    def pages(self, name):
+        """Return the pages of a file of the folder, by its relative name."""
+        _, first_page, n_pages = self.files[name]
+        return [self.page(index) for index in range(first_page, first_page + n_pages)]
+
+@lru_cache(maxsize=None)
+def get_store(path):
+    """Return the ZoneStore of a file, shared by all the calls of a process."""
+    return ZoneStore(path)
+
+def pair_stores(ref_store_path, hyp_store_path):
+    """Pair the files of a ref and a hyp store by name, as xmls_from_folder does."""
+    ref_store, hyp_store = get_store(ref_store_path), get_store(hyp_store_path)
+    file_pairs = [{'ref_file':xml_path, 'hyp_file':hyp_store.files[name][0], 'name':name}
+                  for name, (xml_path, _, _) in ref_store.files.items()
+                  if name in hyp_store.files]
+    warn_unpaired({'ref':sorted(name for name in ref_store.files if name not in hyp_store.files),
+                   'hyp':sorted(name for name in hyp_store.files if name not in ref_store.files)})
+    return file_pairs
+
+def store_page_pairs(ref_store_path, hyp_store_path, name):
+    """Return the (ref, hyp) ZoneTables of each page of a file in two stores."""
+    ref_pages = get_store(ref_store_path).pages(name)
+    hyp_pages = get_store(hyp_store_path).pages(name)
+    if len(ref_pages) != len(hyp_pages) or not ref_pages:
+        raise ValueError('{} has {} ref and {} hyp pages'.format(name, len(ref_pages),
+                                                                len(hyp_pages)))
+    return list(zip(ref_pages, hyp_pages))
+
+if __name__ == '__main__':
+    PARSER = argparse.ArgumentParser(description='Pack the zones of a folder of GEDI xml '
+                                                 'files in a zone store.')
+    PARSER.add_argument('folder')
+    PARSER.add_argument('path')
+    PARSER.add_argument('--recursive', action='store_true')
+    PARSER.add_argument('--gedi-type', default='Area')
+    ARGS = PARSER.parse_args()
+    print('{} pages written to {}'.format(
+        write_zone_store(ARGS.folder, ARGS.path, ARGS.recursive, ARGS.gedi_type), ARGS.path))
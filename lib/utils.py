@@ -2,17 +2,22 @@
 
 import random
 import os
-from os.path import basename
-from os import listdir
-from collections import defaultdict
+import warnings
+from collections import namedtuple
 import xml.etree.ElementTree as ET
-from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import zip_longest
 from xml.etree.ElementTree import Element, SubElement, tostring
 from shapely.geometry import Polygon
+from lib.zones import ZoneTableBuilder
 
 __red__, __green__, __blue__ = (255, 0, 0), (0, 255, 0), (0, 0, 255)
 __rgb__ = [__red__, __green__, __blue__]
 
+__gedi_ns__ = '{http://lamp.cfar.umd.edu/media/projects/GEDI/}'
+__gedi_document__ = __gedi_ns__ + 'DL_DOCUMENT'
+__gedi_page__ = __gedi_ns__ + 'DL_PAGE'
+
 def get_random_color():
     """Return a random rgb color."""
     return __rgb__[random.randint(0, 2)]
@@ -30,54 +35,157 @@ def zones_from_file(path):
         zones[zone_id] = Polygon([[left, top], [right, top], [right, bottom], [left, bottom]])
     return zones
 
+def iter_gedi_pages(xml_path, gedi_type="Area"):
+    """Stream the DL_PAGEs of a GEDI xml and yield their zones as ZoneTables.
+
+    Elements are cleared as soon as they are read, so only the zones of the
+    current page are kept in memory.
+    """
+    depth = 0
+    document_depth = None
+    page_depth = None
+    builder = None
+    for event, elem in ET.iterparse(xml_path, events=('start', 'end')):
+        if event == 'start':
+            depth += 1
+            if elem.tag == __gedi_document__ and document_depth is None:
+                document_depth = depth
+            elif (elem.tag == __gedi_page__ and document_depth is not None
+                  and page_depth is None):
+                page_depth = depth
+                builder = ZoneTableBuilder()
+            continue
+        if page_depth is not None and depth == page_depth + 1:
+            if elem.attrib['gedi_type'] == gedi_type:
+                builder.add(int(elem.attrib['id']),
+                            int(elem.attrib['col']),
+                            int(elem.attrib['row']),
+                            int(elem.attrib['width']),
+                            int(elem.attrib['height']))
+            elem.clear()
+        elif depth == page_depth:
+            page_depth = None
+            elem.clear()
+            yield builder.table()
+        elif depth == document_depth:
+            document_depth = None
+        depth -= 1
+
+def zone_table_from_gedi_xml(xml_path, gedi_type="Area"):
+    """Parse the zones of the first page of a GEDI xml in a ZoneTable."""
+    pages = iter_gedi_pages(xml_path, gedi_type)
+    try:
+        return next(pages)
+    except StopIteration:
+        raise ValueError('No DL_PAGE found in {}'.format(xml_path))
+    finally:
+        pages.close()
+
+def pair_gedi_pages(ref_xml_path, hyp_xml_path, gedi_type="Area"):
+    """Stream the pages of a ref and a hyp GEDI xml side by side."""
+    ref_pages = iter_gedi_pages(ref_xml_path, gedi_type)
+    hyp_pages = iter_gedi_pages(hyp_xml_path, gedi_type)
+    for ref_zones, hyp_zones in zip_longest(ref_pages, hyp_pages):
+        if ref_zones is None or hyp_zones is None:
+            raise ValueError('{} and {} do not have the same number of pages'.format(
+                ref_xml_path, hyp_xml_path))
+        yield ref_zones, hyp_zones
+
 def zones_from_gedi_xml(xml_path, gedi_type="Area"):
     """Parse zones from a GEDI xml."""
-    tree = ET.parse(xml_path)
-    root = tree.getroot()
-    document = root.find('.//{http://lamp.cfar.umd.edu/media/projects/GEDI/}DL_DOCUMENT')
-    page = document.find('.//{http://lamp.cfar.umd.edu/media/projects/GEDI/}DL_PAGE')
-    zones = {}
-    for child in page:
-        if child.attrib['gedi_type'] == gedi_type:
-            zone_id = int(child.attrib['id'])
-            left = int(child.attrib['col'])
-            top = int(child.attrib['row'])
-            right = left + int(child.attrib['width'])
-            bottom = top + int(child.attrib['height'])
-            zones[zone_id] = Polygon([[left, top], [right, top], [right, bottom], [left, bottom]])
-    return zones
+    return zone_table_from_gedi_xml(xml_path, gedi_type).to_polygons()
 
 def square(value):
     """Return the square value."""
     return value*value
 
-def xmls_from_folder(ref_folder, hyp_folder):
-    """Return matching pair of xml files from ref and hyp folders."""
+def scan_files(folder, recursive=False):
+    """Return the files of a folder keyed by their path relative to it."""
+    files = {}
+    pending = ['']
+    while pending:
+        relative = pending.pop()
+        with os.scandir(os.path.join(folder, relative)) as entries:
+            for entry in entries:
+                name = '{}/{}'.format(relative, entry.name) if relative else entry.name
+                if entry.is_dir():
+                    if recursive:
+                        pending.append(name)
+                elif entry.is_file():
+                    files[name] = '{}/{}'.format(folder, name)
+    return files
+
+def pair_files(ref_folder, hyp_folder, recursive=False):
+    """Pair files of ref and hyp folders by name, and list the unpaired ones."""
+    ref_files = scan_files(ref_folder, recursive)
+    hyp_files = scan_files(hyp_folder, recursive)
     file_pairs = []
-    for ref_file in listdir(ref_folder):
-        for hyp_file in listdir(hyp_folder):
-            if basename(ref_file) == basename(hyp_file):
-                file_pairs.append({'ref_file':'{}/{}'.format(ref_folder, ref_file),
-                                   'hyp_file':'{}/{}'.format(hyp_folder, hyp_file)})
+    for name, ref_file in ref_files.items():
+        if name in hyp_files:
+            file_pairs.append({'ref_file':ref_file, 'hyp_file':hyp_files[name]})
+    unpaired = {'ref':sorted(name for name in ref_files if name not in hyp_files),
+                'hyp':sorted(name for name in hyp_files if name not in ref_files)}
+    return file_pairs, unpaired
+
+def warn_unpaired(unpaired):
+    """Warn about the {'ref':names, 'hyp':names} files that have no pair, if any."""
+    if unpaired['ref'] or unpaired['hyp']:
+        message = '{} ref and {} hyp files have no pair: ref {}, hyp {}'.format(
+            len(unpaired['ref']), len(unpaired['hyp']), unpaired['ref'], unpaired['hyp'])
+        warnings.warn(message, stacklevel=3)
+
+def xmls_from_folder(ref_folder, hyp_folder, recursive=False):
+    """Return matching pair of xml files from ref and hyp folders.
+
+    Unpaired files are reported with warnings.warn, pair_files returns their names.
+    """
+    file_pairs, unpaired = pair_files(ref_folder, hyp_folder, recursive)
+    warn_unpaired(unpaired)
     return file_pairs
 
-def dsum(*dicts):
-    """Return the sum of dict by keys."""
-    ret = defaultdict(float)
-    for dictt in dicts:
-        for key, value in dictt.items():
-            ret[key] += value
-            ret[key] = round(ret[key],2)
-    return dict(ret)
-
-def daverage(*dicts):
-    """Return the sum of dict by keys."""
-    ret = defaultdict(float)
-    for dictt in dicts:
-        for key, value in dictt.items():
-            ret[key] += value
-            ret[key] /= 2
-    return dict(ret)
+class PageJob(namedtuple('PageJob', ['ref_file', 'hyp_file', 'mask_path', 'multipage',
+                                     'cache_dir', 'output_dir', 'with_stats', 'with_details',
+                                     'stores', 'threshold'], defaults=(None, None))):
+    """Files and options of a page scored by zonemap_job or zonemapalt_job.
+
+    stores is the (ref_store, hyp_store, name) of the page in zone stores, None
+    to read the xml files, and threshold is only used by zonemapalt.
+    """
+
+    __slots__ = ()
 
 def get_filename(path):
     return os.path.splitext(path)[0]
+
+class NullProgress:
+    """Stand-in for a tqdm bar when no progress is displayed."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def update(self, n=1):
+        """Ignore the progress."""
+
+def progress_bar(total, progress=True):
+    """Return a tqdm bar of total steps, tqdm is only imported when progress is True."""
+    if not progress:
+        return NullProgress()
+    from tqdm import tqdm
+    return tqdm(total=total)
+
+def parallel_map(func, items, workers=None, threads=False):
+    """Map func over items, in a process (or thread) pool if workers > 1.
+
+    Results are yielded in the order of items whatever the number of workers.
+    """
+    if workers is None or workers <= 1:
+        yield from map(func, items)
+        return
+    items = list(items)
+    chunksize = max(1, len(items) // (workers * 4))
+    pool = ThreadPoolExecutor if threads else ProcessPoolExecutor
+    with pool(max_workers=workers) as executor:
+        yield from executor.map(func, items, chunksize=chunksize)
@@ -0,0 +1,83 @@
+"""Compact array-backed storage for rectangular zones."""
+
+from array import array
+from collections.abc import Mapping
+import numpy as np
+from shapely.geometry import Polygon
+
+class ZoneTable(Mapping):
+    """Read-only mapping of zone id to Polygon backed by int32 columns.
+
+    Polygons are only built, and then cached, when a zone is accessed by id.
+    """
+
+    def __init__(self, ids, cols, rows, widths, heights):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.cols = np.asarray(cols, dtype=np.int32)
+        self.rows = np.asarray(rows, dtype=np.int32)
+        self.widths = np.asarray(widths, dtype=np.int32)
+        self.heights = np.asarray(heights, dtype=np.int32)
+        self._index = None
+        self._polygons = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __iter__(self):
+        return iter(self.ids.tolist())
+
+    def __getitem__(self, zone_id):
+        polygon = self._polygons.get(zone_id)
+        if polygon is None:
+            polygon = self.polygon(self.index()[zone_id])
+            self._polygons[zone_id] = polygon
+        return polygon
+
+    def __contains__(self, zone_id):
+        return zone_id in self.index()
+
+    def index(self):
+        """Return the zone id -> row mapping."""
+        if self._index is None:
+            self._index = {zone_id:row for row, zone_id in enumerate(self.ids.tolist())}
+        return self._index
+
+    def polygon(self, row):
+        """Build the polygon of a row."""
+        left, top = int(self.cols[row]), int(self.rows[row])
+        right = left + int(self.widths[row])
+        bottom = top + int(self.heights[row])
+        return Polygon([[left, top], [right, top], [right, bottom], [left, bottom]])
+
+    def boxes(self):
+        """Return the (N,4) int64 array of (left, top, right, bottom) boxes."""
+        left = self.cols.astype(np.int64)
+        top = self.rows.astype(np.int64)
+        return np.stack([left, top, left + self.widths, top + self.heights], axis=1)
+
+    def to_polygons(self):
+        """Return a plain dict of zone id -> Polygon."""
+        return {zone_id:self[zone_id] for zone_id in self}
+
+class ZoneTableBuilder:
+    """Accumulate zones row by row before freezing them in a ZoneTable."""
+
+    def __init__(self):
+        self.rows_by_id = {}
+        self.columns = (array('q'), array('i'), array('i'), array('i'), array('i'))
+
+    def add(self, zone_id, col, row, width, height):
+        """Add a zone, a repeated id overwrites the previous values."""
+        values = (zone_id, col, row, width, height)
+        if zone_id in self.rows_by_id:
+            index = self.rows_by_id[zone_id]
+            for column, value in zip(self.columns, values):
+                column[index] = value
+        else:
+            self.rows_by_id[zone_id] = len(self.columns[0])
+            for column, value in zip(self.columns, values):
+                column.append(value)
+
+    def table(self):
+        """Return the zones added so far as a ZoneTable."""
+        return ZoneTable(*(np.asarray(column) for column in self.columns))
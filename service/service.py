@@ -0,0 +1,190 @@
+"""Local HTTP service scoring ZoneMap and ZoneMapAlt jobs on a warm process pool."""
+
+import argparse
+import json
+import os
+import threading
+from functools import partial
+from io import BytesIO
+from concurrent.futures import ProcessPoolExecutor, wait
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from lib.utils import zone_table_from_gedi_xml
+
+__HOST__ = '127.0.0.1'
+__PORT__ = 8765
+__MAX_IN_FLIGHT__ = 64
+__MAX_BODY_BYTES__ = 64 << 20
+__THRESHOLD__ = 0.15
+__METRICS__ = ('zonemap', 'zonemapalt')
+
+def warm_up():
+    """Import the scoring modules, so that workers pay the import cost only once."""
+    import zonemap.zonemap
+    import zonemapalt.zonemapalt
+    return True
+
+def job_source(job, tag):
+    """Return the path or the in-memory payload of the ref or hyp xml of a job."""
+    if tag + '_xml' in job:
+        return BytesIO(job[tag + '_xml'].encode('utf-8')), None
+    return job[tag], job[tag]
+
+def score_job(job, cache_dir=None):
+    """Score one job dict in a worker, and return its scores or its error message.
+
+    A job gives 'ref' and 'hyp' paths, or 'ref_xml' and 'hyp_xml' GEDI payloads,
+    and optionally 'threshold' and 'multipage'. Zones and links of path jobs are
+    cached in cache_dir, the cache directory of the server.
+    """
+    from zonemap.zonemap import zonemap, zonemap_xml, zonemap_document
+    from zonemapalt.zonemapalt import zonemapalt, zonemapalt_xml, zonemapalt_document
+    try:
+        metric = job['metric']
+        ref, ref_path = job_source(job, 'ref')
+        hyp, hyp_path = job_source(job, 'hyp')
+        threshold = float(job.get('threshold', __THRESHOLD__))
+        cache_dir = cache_dir if ref_path and hyp_path else None
+        if job.get('multipage', False):
+            if metric == 'zonemap':
+                scores, n_scores = zonemap_document(ref, hyp)
+            else:
+                scores, n_scores = zonemapalt_document(ref, hyp, threshold)
+        elif ref_path and hyp_path:
+            if metric == 'zonemap':
+                _, scores, n_scores = zonemap_xml(ref, hyp, cache_dir=cache_dir)
+            else:
+                scores, n_scores = zonemapalt_xml(ref, hyp, threshold, cache_dir=cache_dir)
+        else:
+            ref_zones = zone_table_from_gedi_xml(ref)
+            hyp_zones = zone_table_from_gedi_xml(hyp)
+            if metric == 'zonemap':
+                _, scores, n_scores = zonemap(ref_zones, hyp_zones)
+            else:
+                scores, n_scores = zonemapalt(ref_zones, hyp_zones, threshold)
+    except Exception as error:
+        return {'error':'{}: {}'.format(type(error).__name__, error)}
+    return {'scores':scores, 'counts':n_scores}
+
+class InFlight:
+    """Count the jobs being scored, and refuse new ones past a limit."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def acquire(self, n_jobs):
+        """Reserve n_jobs slots, return False if they would exceed the limit."""
+        with self.lock:
+            if self.count + n_jobs > self.limit:
+                return False
+            self.count += n_jobs
+            return True
+
+    def release(self, n_jobs):
+        """Free n_jobs slots."""
+        with self.lock:
+            self.count -= n_jobs
+
+class ScoringServer(ThreadingHTTPServer):
+    """HTTP server holding the worker pool and the in-flight limit."""
+
+    daemon_threads = True
+
+    def __init__(self, address, workers=None, max_in_flight=__MAX_IN_FLIGHT__, cache_dir=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=warm_up)
+        # The pool spawns its processes on demand: start them all before the first request
+        wait([self.executor.submit(warm_up) for _ in range(self.workers)])
+        self.in_flight = InFlight(max_in_flight)
+        self.cache_dir = cache_dir
+        super().__init__(address, ScoringHandler)
+
+    def score(self, jobs):
+        """Score a batch of jobs on the pool, results come in the order of jobs."""
+        chunksize = max(1, len(jobs) // (self.workers * 4))
+        return list(self.executor.map(partial(score_job, cache_dir=self.cache_dir), jobs,
+                                      chunksize=chunksize))
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown()
+
+class ScoringHandler(BaseHTTPRequestHandler):
+    """Serve GET /health, and POST /zonemap or /zonemapalt with a job or a list of jobs."""
+
+    def send_json(self, status, body, headers=None):
+        """Send a JSON response."""
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        if self.path != '/health':
+            self.send_json(404, {'error':'unknown path {}'.format(self.path)})
+            return
+        self.send_json(200, {'workers':self.server.workers,
+                             'in_flight':self.server.in_flight.count,
+                             'max_in_flight':self.server.in_flight.limit})
+
+    def do_POST(self):
+        metric = self.path.strip('/')
+        if metric not in __METRICS__:
+            self.send_json(404, {'error':'unknown path {}'.format(self.path)})
+            return
+        length = int(self.headers.get('Content-Length', 0))
+        if length > __MAX_BODY_BYTES__:
+            self.send_json(413, {'error':'request body is larger than {} bytes'.format(
+                __MAX_BODY_BYTES__)})
+            return
+        try:
+            body = json.loads(self.rfile.read(length))
+        except ValueError as error:
+            self.send_json(400, {'error':'invalid JSON: {}'.format(error)})
+            return
+        jobs = body if isinstance(body, list) else [body]
+        if not all(isinstance(job, dict) for job in jobs):
+            self.send_json(400, {'error':'a job must be a JSON object'})
+            return
+        if any('cache_dir' in job for job in jobs):
+            self.send_json(400, {'error':'cache_dir is set by the server, not by jobs'})
+            return
+        for job in jobs:
+            job['metric'] = metric
+        if not self.server.in_flight.acquire(len(jobs)):
+            self.send_json(503, {'error':'too many jobs in flight'}, {'Retry-After':'1'})
+            return
+        try:
+            results = self.server.score(jobs)
+        finally:
+            self.server.in_flight.release(len(jobs))
+        self.send_json(200, results if isinstance(body, list) else results[0])
+
+def serve(host=__HOST__, port=__PORT__, workers=None, max_in_flight=__MAX_IN_FLIGHT__,
+          cache_dir=None):
+    """Run the scoring service until interrupted."""
+    server = ScoringServer((host, port), workers, max_in_flight, cache_dir)
+    print('Scoring on http://{}:{} with {} workers'.format(host, server.server_port,
+                                                          server.workers))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == '__main__':
+    __parser__ = argparse.ArgumentParser(description=__doc__)
+    __parser__.add_argument('--host', default=__HOST__)
+    __parser__.add_argument('--port', type=int, default=__PORT__)
+    __parser__.add_argument('--workers', type=int, default=None)
+    __parser__.add_argument('--max-in-flight', type=int, default=__MAX_IN_FLIGHT__)
+    __parser__.add_argument('--cache-dir', default=None)
+    __args__ = __parser__.parse_args()
+    serve(__args__.host, __args__.port, __args__.workers, __args__.max_in_flight,
+          __args__.cache_dir)
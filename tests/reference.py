@@ -0,0 +1,120 @@
+"""Original nested-loop algorithms, and pages, the optimized code is checked against."""
+
+import random
+from shapely import affinity
+from shapely.geometry import Polygon
+from experiments.synthetic_pages import generate_page
+
+def reference_links(zones_1, zones_2):
+    """Return the (key_1, key_2, area, strength) links of every intersecting pair."""
+    links = []
+    for key_1, zone_1 in zones_1.items():
+        for key_2, zone_2 in zones_2.items():
+            area = zone_1.intersection(zone_2).area
+            if area == 0:
+                continue
+            strength = (area / zone_1.area) ** 2 + (area / zone_2.area) ** 2
+            links.append((key_1, key_2, area, strength))
+    return links
+
+def sort_reference_links(links):
+    """Sort links by decreasing strength, keeping their order on ties."""
+    return sorted(links, key=lambda link: link[3], reverse=True)
+
+def find_in_groups(zone_id, groups, tag):
+    """Return the index of the group holding a zone id, -1 if none does."""
+    for i, group in enumerate(groups):
+        if zone_id in group[tag]:
+            return i
+    return -1
+
+def reference_groups(sorted_links):
+    """Make ZoneMap groups by scanning the groups for each link."""
+    groups = []
+    for gt_id, sys_id, _, _ in sorted_links:
+        gt_group_id = find_in_groups(gt_id, groups, 'gt')
+        sys_group_id = find_in_groups(sys_id, groups, 'sys')
+        if gt_group_id == -1:
+            if sys_group_id == -1:
+                groups.append({'gt':[gt_id], 'sys':[sys_id]})
+            elif len(groups[sys_group_id]['sys']) == 1:
+                groups[sys_group_id]['gt'].append(gt_id)
+        elif sys_group_id == -1 and len(groups[gt_group_id]['gt']) == 1:
+            groups[gt_group_id]['sys'].append(sys_id)
+    return groups
+
+def reference_zonemap(gt_zones, sys_zones):
+    """Return the (groups, results, n_results) of ZoneMap with error geometries."""
+    from zonemap.zonemap import add_unmatched, compute_errors, compute_scores, compute_zonemap
+    groups = reference_groups(sort_reference_links(reference_links(gt_zones, sys_zones)))
+    groups = add_unmatched(groups, gt_zones, sys_zones)
+    groups = compute_scores(compute_errors(groups, gt_zones, sys_zones))
+    results, n_results = compute_zonemap(groups, gt_zones)
+    return groups, results, n_results
+
+def reference_matches(sorted_links, ref_zones, hyp_zones, threshold, tolerance=0):
+    """Make ZoneMapAlt matches, replaying the previous matches of each link.
+
+    Areas up to tolerance times the ref zone area are taken as empty.
+    """
+    from zonemapalt.zonemapalt import get_error_class
+    ref_links, hyp_links, matches = {}, {}, {}
+    for i, (ref_id, hyp_id, _, _) in enumerate(sorted_links):
+        ref_link = ref_links.get(ref_id)
+        hyp_link = hyp_links.get(hyp_id)
+        ref_zone = ref_zones[ref_id]
+        hyp_zone = hyp_zones[hyp_id]
+        ref_card, hyp_card = 1, 1
+        if hyp_link is not None:
+            ref_card += len(hyp_link)
+            for matched_ref_id in hyp_link:
+                matched_ref = ref_zones[matched_ref_id]
+                ref_zone = ref_zone.difference(ref_zone.intersection(matched_ref))
+                hyp_zone = hyp_zone.difference(hyp_zone.intersection(matched_ref))
+        if ref_link is not None:
+            hyp_card += len(ref_link)
+            for matched_hyp_id in ref_link:
+                ref_zone = ref_zone.difference(ref_zone.intersection(hyp_zones[matched_hyp_id]))
+        intersection = ref_zone.intersection(hyp_zone)
+        sliver = tolerance * ref_zones[ref_id].area
+        ratio = 0
+        if ref_zone.area > sliver and intersection.area > sliver:
+            ratio = intersection.area / ref_zone.area
+        if ratio > threshold:
+            ref_links.setdefault(ref_id, []).append(hyp_id)
+            hyp_links.setdefault(hyp_id, []).append(ref_id)
+            matches[i] = {'ref_id':ref_id, 'hyp_id':hyp_id, 'ref_card':ref_card,
+                          'hyp_card':hyp_card, 'zone':intersection,
+                          'error_class':get_error_class(ref_card, hyp_card)}
+    return matches, ref_links, hyp_links
+
+def reference_zonemapalt(ref_zones, hyp_zones, threshold, tolerance=0):
+    """Return the (scores, n_scores) of ZoneMapAlt with the replayed matches."""
+    from zonemapalt.zonemapalt import find_missed_areas, compute_errors, compute_scores
+    links = sort_reference_links(reference_links(ref_zones, hyp_zones))
+    matches, ref_links, hyp_links = reference_matches(links, ref_zones, hyp_zones, threshold,
+                                                       tolerance)
+    matches = find_missed_areas(matches, ref_zones, hyp_zones, ref_links, hyp_links)
+    scores, n_scores = compute_errors(matches)
+    return compute_scores(scores, ref_zones), n_scores
+
+def rectangle_page(seed, n_zones=40, **rates):
+    """Return the ref and hyp ZoneTables of a synthetic page."""
+    return generate_page(seed, n_zones, **rates)
+
+def polygon_page(seed, n_zones=30):
+    """Return ref and hyp dicts of randomly rotated rectangles."""
+    rng = random.Random(seed)
+
+    def zones():
+        """Draw the zones of one side."""
+        polygons = {}
+        for key in range(n_zones):
+            left, top = rng.uniform(0, 800), rng.uniform(0, 1000)
+            width, height = rng.uniform(20, 200), rng.uniform(10, 100)
+            polygon = Polygon([(left, top), (left + width, top), (left + width, top + height),
+                               (left, top + height)])
+            polygons[key] = affinity.rotate(polygon, rng.uniform(-30, 30))
+        return polygons
+
+    return zones(), zones()
@@ -0,0 +1,80 @@
+"""Streaming, mergeable corpus statistics."""
+
+import math
+import random
+import numpy as np
+import pytest
+from lib.aggregate import CorpusStats
+
+def random_pages(seed, n_pages=300):
+    """Return (name, scores, counts) of random pages."""
+    rng = random.Random(seed)
+    pages = []
+    for i in range(n_pages):
+        scores = {'zonemap_score':rng.uniform(0, 150), 'match':rng.uniform(0, 1e5),
+                  'miss':rng.expovariate(1e-3), 'total_gt_area':rng.uniform(1e4, 1e6)}
+        if i % 7:
+            scores['merge'] = rng.uniform(0, 100)
+        pages.append(('page_{}'.format(i), scores, {'match':rng.randint(0, 50)}))
+    return pages
+
+def single_pass(pages):
+    corpus = CorpusStats('total_gt_area', top_k=5)
+    for name, scores, counts in pages:
+        corpus.add(scores, counts, name)
+    return corpus
+
+def test_merge_matches_single_pass():
+    pages = random_pages(0)
+    expected = single_pass(pages)
+    merged = CorpusStats('total_gt_area', top_k=5)
+    for start in range(0, len(pages), 70):
+        merged.merge(single_pass(pages[start:start + 70]))
+    assert merged.pages == expected.pages
+    assert merged.sum_scores() == expected.sum_scores()
+    assert merged.average_scores() == expected.average_scores()
+    assert merged.sum_counts() == expected.sum_counts()
+    for key in expected.sums:
+        assert merged.mean(key) == pytest.approx(expected.mean(key), rel=1e-12)
+        assert merged.std(key) == pytest.approx(expected.std(key), rel=1e-9)
+        assert merged.weighted_mean(key) == pytest.approx(expected.weighted_mean(key),
+                                                          rel=1e-12)
+        assert merged.quantile(key, 0.9) == expected.quantile(key, 0.9)
+        assert merged.worst_pages(key) == expected.worst_pages(key)
+        assert list(merged.values[key]) == pytest.approx(list(expected.values[key]),
+                                                         nan_ok=True)
+        assert (merged.bootstrap(key, seed=1, n_resamples=200)
+                == expected.bootstrap(key, seed=1, n_resamples=200))
+
+def test_statistics_match_numpy():
+    pages = random_pages(1)
+    corpus = single_pass(pages)
+    miss = np.array([scores['miss'] for _, scores, _ in pages])
+    weights = np.array([scores['total_gt_area'] for _, scores, _ in pages])
+    assert corpus.sum_scores()['miss'] == round(math.fsum(miss), 2)
+    assert corpus.mean('miss') == pytest.approx(miss.mean(), rel=1e-12)
+    assert corpus.std('miss') == pytest.approx(miss.std(ddof=1), rel=1e-9)
+    assert corpus.weighted_mean('miss') == pytest.approx(np.average(miss, weights=weights),
+                                                         rel=1e-12)
+    for q in (0.1, 0.5, 0.99):
+        rank_value = np.sort(miss)[int(q * (len(miss) - 1))]
+        assert corpus.quantile('miss', q) == pytest.approx(rank_value, rel=0.011)
+    merge = [scores['merge'] for _, scores, _ in pages if 'merge' in scores]
+    assert corpus.mean('merge') == pytest.approx(np.mean(merge), rel=1e-12)
+    low, high = corpus.bootstrap('miss', seed=0)
+    assert low < miss.mean() < high
+
+def test_worst_pages_rank_errors_and_lowest_match():
+    pages = random_pages(2)
+    corpus = single_pass(pages)
+    for key, lowest in (('miss', False), ('zonemap_score', False), ('match', True)):
+        ranked = sorted(((scores[key], name) for name, scores, _ in pages), reverse=not lowest)
+        assert corpus.worst_pages(key) == [(name, value) for value, name in ranked[:5]]
+    assert corpus.worst_pages('total_gt_area') == []
+
+def test_worst_pages_keep_earlier_pages_on_ties():
+    corpus = CorpusStats(top_k=2)
+    for name in ('a', 'b', 'c'):
+        corpus.add({'miss':1.0, 'match':1.0}, page=name)
+    assert corpus.worst_pages('miss') == [('a', 1.0), ('b', 1.0)]
+    assert corpus.worst_pages('match') == [('a', 1.0), ('b', 1.0)]
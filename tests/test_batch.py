@@ -0,0 +1,71 @@
+"""Folder drivers of ZoneMap and ZoneMapAlt."""
+
+import json
+import os
+import numpy as np
+import pytest
+from experiments.synthetic_pages import write_corpus
+from lib.results import open_results, read_page_details
+from zonemap.zonemap import zonemap_xml, zonemap_xmls, group_details
+from zonemapalt.zonemapalt import zonemapalt_xmls, zonemapalt_sweep_xmls
+
+@pytest.fixture(scope='module')
+def corpus(tmp_path_factory):
+    folder = tmp_path_factory.mktemp('corpus')
+    write_corpus(str(folder), 6, 30, seed=3)
+    return str(folder / 'reference'), str(folder / 'hypothesis')
+
+def test_workers_do_not_change_zonemap(corpus, tmp_path):
+    serial = zonemap_xmls(*corpus, output_dir=str(tmp_path / 'serial'))
+    assert zonemap_xmls(*corpus, workers=2, output_dir=str(tmp_path / 'pool')) == serial
+
+def test_workers_do_not_change_zonemapalt(corpus, tmp_path):
+    serial = zonemapalt_xmls(*corpus, progress=False, output_dir=str(tmp_path / 'serial'))
+    assert zonemapalt_xmls(*corpus, workers=2, progress=False,
+                           output_dir=str(tmp_path / 'pool')) == serial
+
+def test_sweep_matches_per_threshold_folders(corpus, tmp_path):
+    thresholds = [0.0, 0.15, 0.6]
+    sweep = zonemapalt_sweep_xmls(*corpus, thresholds, workers=2, progress=False)
+    assert sweep == [zonemapalt_xmls(*corpus, threshold=threshold, progress=False,
+                                     output_dir=str(tmp_path / str(threshold)))
+                     for threshold in thresholds]
+
+def test_results_formats_hold_the_same_scores(corpus, tmp_path):
+    totals = zonemap_xmls(*corpus, output_dir=str(tmp_path), results_format='jsonl')
+    assert zonemap_xmls(*corpus, output_dir=str(tmp_path), results_format='npz') == totals
+    folder = tmp_path / 'zonemapresults'
+    with open(str(folder / 'zonemapmetric.jsonl')) as file:
+        records = [json.loads(line) for line in file]
+    pages, total = records[:-1], records[-1]
+    assert (total['sum'], total['average'], total['counts']) == totals
+    columns = np.load(str(folder / 'zonemapmetric.npz'))
+    assert columns['page'].tolist() == [record['page'] for record in pages]
+    for i, record in enumerate(pages):
+        _, scores, counts = zonemap_xml(record['ref'], record['hyp'])
+        assert (record['scores'], record['counts']) == (scores, counts)
+        assert all(columns['score_' + key][i] == value for key, value in scores.items())
+    assert all(columns['sum_' + key] == value for key, value in totals[0].items())
+
+def test_text_results_are_written_per_page(corpus, tmp_path):
+    zonemap_xmls(*corpus, output_dir=str(tmp_path))
+    folder = tmp_path / 'zonemapresults'
+    assert len([name for name in os.listdir(str(folder)) if (folder / name).is_dir()]) == 6
+    assert (folder / 'combinedzonemapmetric.txt').exists()
+
+def test_unknown_results_format_raises(tmp_path):
+    with pytest.raises(ValueError):
+        open_results(str(tmp_path), 'zonemap', 'ZoneMap', 'csv')
+
+def test_page_details_are_read_back_by_name(corpus, tmp_path):
+    zonemap_xmls(*corpus, output_dir=str(tmp_path), details=True)
+    zonemapalt_xmls(*corpus, output_dir=str(tmp_path), details=True, progress=False)
+    name = 'page_00002'
+    groups, _, _ = zonemap_xml('{}/{}.xml'.format(corpus[0], name),
+                               '{}/{}.xml'.format(corpus[1], name))
+    assert read_page_details(str(tmp_path), 'zonemap', name) == group_details(groups)
+    matches = read_page_details(str(tmp_path), 'zonemapalt', name)
+    assert {match['error_class'] for match in matches} <= {'Match', 'Miss', 'False alarm',
+                                                           'Split', 'Merge', 'Multiple'}
+    with pytest.raises(KeyError):
+        read_page_details(str(tmp_path), 'zonemap', 'missing')
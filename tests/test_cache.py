@@ -0,0 +1,65 @@
+"""On-disk zone and link cache."""
+
+import os
+import numpy as np
+from experiments.synthetic_pages import gedi_xml
+from lib.cache import ZoneCache
+from zonemap.zonemap import compute_links, zonemap_xml
+from tests.reference import rectangle_page
+
+def write_page(tmp_path):
+    """Write the ref and hyp GEDI files of a page and return their paths."""
+    ref_zones, hyp_zones = rectangle_page(4)
+    ref_path, hyp_path = tmp_path / 'ref.xml', tmp_path / 'hyp.xml'
+    ref_path.write_text(gedi_xml([ref_zones]))
+    hyp_path.write_text(gedi_xml([hyp_zones]))
+    return str(ref_path), str(hyp_path), ref_zones, hyp_zones
+
+def test_zones_and_links_round_trip(tmp_path):
+    ref_path, hyp_path, ref_zones, hyp_zones = write_page(tmp_path)
+    cache = ZoneCache(str(tmp_path / 'cache'))
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return compute_links(ref_zones, hyp_zones)
+
+    for _ in range(2):
+        zones = cache.zones(ref_path)
+        np.testing.assert_array_equal(zones.boxes(), ref_zones.boxes())
+        links = cache.links(ref_path, hyp_path, compute)
+        assert list(links) == list(compute_links(ref_zones, hyp_zones))
+    assert len(calls) == 1
+    reopened = ZoneCache(str(tmp_path / 'cache'))
+    assert reopened.size == cache.size
+    assert list(reopened.links(ref_path, hyp_path, compute)) == list(links)
+    assert len(calls) == 1
+
+def test_links_are_cached_per_backend(tmp_path):
+    ref_path, hyp_path, ref_zones, hyp_zones = write_page(tmp_path)
+    cache = ZoneCache(str(tmp_path / 'cache'))
+    backends = [None, 'raster']
+    for backend in backends:
+        cache.links(ref_path, hyp_path, lambda: compute_links(ref_zones, hyp_zones),
+                    backend=backend)
+    assert len(os.listdir(str(tmp_path / 'cache'))) == len(backends)
+
+def test_rewrites_keep_the_size_exact(tmp_path):
+    cache = ZoneCache(str(tmp_path), max_bytes=1 << 20)
+    path = cache._path('key')
+    for _ in range(5):
+        cache._store(path, values=np.arange(100))
+    assert cache.size == os.path.getsize(path)
+
+def test_eviction_keeps_the_cache_under_max_bytes(tmp_path):
+    cache = ZoneCache(str(tmp_path), max_bytes=4000)
+    for key in range(10):
+        cache._store(cache._path(key), values=np.arange(100))
+    assert cache.size <= 4000
+    assert sum(entry.stat().st_size for entry in os.scandir(str(tmp_path))) == cache.size
+
+def test_cached_scores_match_uncached(tmp_path):
+    ref_path, hyp_path, _, _ = write_page(tmp_path)
+    expected = zonemap_xml(ref_path, hyp_path)[1:]
+    for _ in range(2):
+        assert zonemap_xml(ref_path, hyp_path, cache_dir=str(tmp_path / 'cache'))[1:] == expected
@@ -0,0 +1,36 @@
+"""Connected components of the link graph, scored apart."""
+
+import pytest
+from lib.components import link_components, batch_components
+from zonemap.zonemap import zonemap, zonemap_components, compute_links, sort_links
+from zonemapalt.zonemapalt import zonemapalt, zonemapalt_components
+from tests.reference import rectangle_page, polygon_page
+
+@pytest.mark.parametrize('page', [rectangle_page, polygon_page])
+@pytest.mark.parametrize('seed', range(4))
+@pytest.mark.parametrize('workers', [None, 2])
+def test_components_match_full_evaluation(page, seed, workers):
+    ref_zones, hyp_zones = page(seed)
+    groups, results, n_results = zonemap(ref_zones, hyp_zones)
+    component_groups, component_results, component_n_results = zonemap_components(
+        ref_zones, hyp_zones, workers=workers, threads=True)
+    assert (component_results, component_n_results) == (results, n_results)
+    assert ([(group['gt'], group['sys'], group['error']) for group in component_groups]
+            == [(group['gt'], group['sys'], group['error']) for group in groups])
+    for threshold in (0.0, 0.15, 0.5):
+        assert (zonemapalt_components(ref_zones, hyp_zones, threshold, workers=workers)
+                == zonemapalt(ref_zones, hyp_zones, threshold))
+
+def test_components_partition_zones_and_links():
+    ref_zones, hyp_zones = rectangle_page(1)
+    links = list(sort_links(compute_links(ref_zones, hyp_zones)))
+    components = link_components(ref_zones, hyp_zones, links)
+    assert sorted(key for refs, _, _ in components for key in refs) == sorted(ref_zones)
+    assert sorted(key for _, hyps, _ in components for key in hyps) == sorted(hyp_zones)
+    assert sorted(link for _, _, component_links in components
+                  for link in component_links) == sorted(links)
+    for refs, hyps, component_links in components:
+        assert all(link[0] in refs and link[1] in hyps for link in component_links)
+    batches = batch_components(components, 4)
+    assert len(batches) <= 4
+    assert [component for batch in batches for component in batch] == components
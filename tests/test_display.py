@@ -0,0 +1,58 @@
+"""Visualization rendering and its background writer."""
+
+import threading
+import numpy as np
+import pytest
+from shapely.geometry import box
+
+cv2 = pytest.importorskip('cv2')
+
+from experiments.synthetic_pages import write_corpus
+from lib.display import DisplayWriter, render_layers
+from zonemap.zonemap import zonemap_xmls
+from zonemapalt.zonemapalt import zonemapalt_xmls
+
+def test_layers_blend_their_zones_only(tmp_path):
+    img_path = str(tmp_path / 'page.png')
+    cv2.imwrite(img_path, np.full((60, 80, 3), 200, dtype=np.uint8))
+    layers = [('match', (0, 255, 0), [box(10, 10, 30, 30)]),
+              ('miss', (0, 0, 255), [box(40, 20, 70, 50)])]
+    render_layers(img_path, str(tmp_path), layers, [], alpha=0.4)
+    for name, color, (zone,) in layers:
+        out = cv2.imread(str(tmp_path / (name + '.png')))
+        left, top, right, bottom = (int(value) for value in zone.bounds)
+        expected = np.rint(np.array(color) * 0.4 + 200 * 0.6)
+        np.testing.assert_allclose(out[top + 2, left + 2], expected, atol=1)
+        assert (out[0, 0] == 200).all()
+
+def test_writer_runs_every_rendering():
+    done = []
+    lock = threading.Lock()
+
+    def render(i):
+        with lock:
+            done.append(i)
+
+    with DisplayWriter(workers=2, max_pending=2) as writer:
+        for i in range(20):
+            writer.submit(render, i)
+    assert sorted(done) == list(range(20))
+
+def test_writer_raises_rendering_errors():
+    def fail():
+        raise RuntimeError('cannot write')
+
+    writer = DisplayWriter()
+    writer.submit(fail)
+    with pytest.raises(RuntimeError):
+        writer.wait()
+    writer.close()
+
+@pytest.mark.parametrize('workers', [None, 2])
+def test_batch_raises_worker_rendering_errors(tmp_path, workers):
+    write_corpus(str(tmp_path), 2, 10)
+    # No page image exists in the mask folder, so every rendering fails
+    for xmls in (zonemap_xmls, zonemapalt_xmls):
+        with pytest.raises(AttributeError):
+            xmls(str(tmp_path / 'reference'), str(tmp_path / 'hypothesis'),
+                 str(tmp_path / 'images'), workers=workers, output_dir=str(tmp_path / 'output'))
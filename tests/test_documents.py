@@ -0,0 +1,36 @@
+"""Multi-page GEDI documents."""
+
+import pytest
+from experiments.synthetic_pages import gedi_xml
+from lib.utils import pair_gedi_pages
+from zonemap.zonemap import zonemap, zonemap_document, document_results
+from zonemapalt.zonemapalt import zonemapalt, zonemapalt_document, document_scores
+from tests.reference import rectangle_page
+
+@pytest.fixture
+def document(tmp_path):
+    pages = [rectangle_page(seed) for seed in range(3)]
+    ref_path, hyp_path = tmp_path / 'ref.xml', tmp_path / 'hyp.xml'
+    ref_path.write_text(gedi_xml([ref_zones for ref_zones, _ in pages]))
+    hyp_path.write_text(gedi_xml([hyp_zones for _, hyp_zones in pages]))
+    return str(ref_path), str(hyp_path), pages
+
+def test_zonemap_document_aggregates_pages(document):
+    ref_path, hyp_path, pages = document
+    results, n_results = zonemap_document(ref_path, hyp_path)
+    expected = document_results(zonemap(*page)[1:] for page in pages)
+    assert (results, n_results) == expected
+    assert n_results['match'] == sum(zonemap(*page)[2]['match'] for page in pages)
+
+def test_zonemapalt_document_aggregates_pages(document):
+    ref_path, hyp_path, pages = document
+    expected = document_scores(zonemapalt(*page, 0.15) for page in pages)
+    assert zonemapalt_document(ref_path, hyp_path, 0.15) == expected
+
+def test_page_counts_must_agree(tmp_path):
+    ref_zones, hyp_zones = rectangle_page(0)
+    ref_path, hyp_path = tmp_path / 'ref.xml', tmp_path / 'hyp.xml'
+    ref_path.write_text(gedi_xml([ref_zones, ref_zones]))
+    hyp_path.write_text(gedi_xml([hyp_zones]))
+    with pytest.raises(ValueError):
+        list(pair_gedi_pages(str(ref_path), str(hyp_path)))
@@ -0,0 +1,67 @@
+"""Pluggable geometry backends."""
+
+import pytest
+from lib.geometry import GeometryBackend, RasterBackend, get_backend, zone_areas
+from lib.stats import PipelineStats
+from zonemap.zonemap import zonemap
+from zonemapalt.zonemapalt import zonemapalt
+from tests.reference import reference_links, rectangle_page, polygon_page
+
+__BACKENDS__ = ['auto', 'rect', 'shapely', 'raster']
+
+@pytest.mark.parametrize('backend', __BACKENDS__)
+@pytest.mark.parametrize('seed', range(3))
+def test_backends_agree_on_rectangles(backend, seed):
+    ref_zones, hyp_zones = rectangle_page(seed)
+    expected = reference_links(ref_zones.to_polygons(), hyp_zones.to_polygons())
+    assert list(get_backend(backend).links(ref_zones, hyp_zones)) == expected
+    assert get_backend(backend).areas(ref_zones).tolist() == zone_areas(ref_zones).tolist()
+    assert (zonemap(ref_zones, hyp_zones, backend=backend)[1:]
+            == zonemap(ref_zones, hyp_zones, backend='shapely')[1:])
+    assert (zonemapalt(ref_zones, hyp_zones, 0.15, backend=backend)
+            == zonemapalt(ref_zones, hyp_zones, 0.15, backend='shapely'))
+
+def test_auto_falls_back_to_shapely_on_polygons():
+    ref_zones, hyp_zones = polygon_page(0)
+    stats = PipelineStats()
+    links = get_backend().links(ref_zones, hyp_zones, stats)
+    assert list(links) == list(get_backend('shapely').links(ref_zones, hyp_zones))
+    assert stats.counters['shapely_ops'] > 0
+    with pytest.raises(ValueError):
+        get_backend('rect').links(ref_zones, hyp_zones)
+
+def test_raster_polygon_links_are_close():
+    ref_zones, hyp_zones = polygon_page(1)
+    exact = {link[:2]:link[2] for link in get_backend('shapely').links(ref_zones, hyp_zones)}
+    raster = {link[:2]:link[2] for link in get_backend('raster').links(ref_zones, hyp_zones)}
+    large = [pair for pair, area in exact.items() if area > 500]
+    assert large
+    for pair in large:
+        assert raster[pair] == pytest.approx(exact[pair], rel=0.05)
+
+def test_backends_are_looked_up_by_name():
+    backend = get_backend('raster')
+    assert get_backend(backend) is backend
+    assert get_backend(None).name == 'auto'
+    with pytest.raises(ValueError):
+        get_backend('gpu')
+    with pytest.raises(TypeError):
+        GeometryBackend()
+
+@pytest.mark.parametrize('scale', [0.3, 0.5])
+@pytest.mark.parametrize('seed', range(3))
+def test_raster_surfaces_are_non_negative(scale, seed):
+    ref_zones, hyp_zones = rectangle_page(seed)
+    backend = RasterBackend(scale)
+    groups, results, _ = zonemap(ref_zones, hyp_zones, backend=backend)
+    assert all(detail['surf'] >= 0 for group in groups
+               for detail in group['error_details'].values())
+    assert results['total_gt_area'] == pytest.approx(backend.areas(ref_zones).sum(), abs=0.01)
+    details = []
+    zonemapalt(ref_zones, hyp_zones, 0.15, details=details, backend=backend)
+    assert all(match['area'] > 0 for match in details)
+
+def test_raster_gives_no_error_geometry():
+    ref_zones, hyp_zones = rectangle_page(0)
+    with pytest.raises(ValueError):
+        zonemap(ref_zones, hyp_zones, geometry=True, backend='raster')
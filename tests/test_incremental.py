@@ -0,0 +1,69 @@
+"""Incremental re-evaluation of edited hyp zones."""
+
+import random
+import pytest
+from lib.incremental import IncrementalEvaluator
+from zonemap.zonemap import ZoneMapEvaluator, zonemap
+from zonemapalt.zonemapalt import ZoneMapAltEvaluator, zonemapalt
+from tests.reference import rectangle_page, polygon_page
+
+def edit(evaluators, hyp_zones, other_zones, seed):
+    """Apply the same random removals, updates and additions to evaluators and hyp_zones."""
+    rng = random.Random(seed)
+    others = list(other_zones.values())
+    for key in rng.sample(list(hyp_zones), 5):
+        for evaluator in evaluators:
+            evaluator.remove_zone(key)
+        del hyp_zones[key]
+    for key in rng.sample(list(hyp_zones), 5):
+        zone = rng.choice(others)
+        for evaluator in evaluators:
+            evaluator.update_zone(key, zone)
+        hyp_zones[key] = zone
+    for key in range(1000, 1005):
+        zone = rng.choice(others)
+        for evaluator in evaluators:
+            evaluator.add_zone(key, zone)
+        hyp_zones[key] = zone
+
+@pytest.mark.parametrize('page', [rectangle_page, polygon_page])
+@pytest.mark.parametrize('seed', range(4))
+def test_edits_match_full_evaluation(page, seed):
+    ref_zones, hyp_zones = page(seed)
+    ref_zones, hyp_zones = dict(ref_zones.items()), dict(hyp_zones.items())
+    zonemap_evaluator = ZoneMapEvaluator(ref_zones, hyp_zones)
+    zonemapalt_evaluator = ZoneMapAltEvaluator(ref_zones, hyp_zones, 0.15)
+    zonemap_evaluator.evaluate()
+    zonemapalt_evaluator.evaluate()
+    edit([zonemap_evaluator, zonemapalt_evaluator], hyp_zones, dict(page(seed + 100)[1].items()),
+         seed)
+    assert zonemap_evaluator.evaluate()[1:] == zonemap(ref_zones, hyp_zones)[1:]
+    assert zonemapalt_evaluator.evaluate() == zonemapalt(ref_zones, hyp_zones, 0.15)
+
+@pytest.mark.parametrize('backend, page', [('shapely', polygon_page), ('rect', rectangle_page),
+                                           ('raster', rectangle_page), ('raster', polygon_page)])
+def test_edits_use_the_evaluator_backend(backend, page):
+    ref_zones, hyp_zones = page(3)
+    ref_zones, hyp_zones = dict(ref_zones.items()), dict(hyp_zones.items())
+    evaluators = [ZoneMapEvaluator(ref_zones, hyp_zones, backend),
+                  ZoneMapAltEvaluator(ref_zones, hyp_zones, 0.15, backend)]
+    for evaluator in evaluators:
+        evaluator.evaluate()
+    edit(evaluators, hyp_zones, dict(page(4)[1].items()), 3)
+    full = [ZoneMapEvaluator(ref_zones, hyp_zones, backend),
+            ZoneMapAltEvaluator(ref_zones, hyp_zones, 0.15, backend)]
+    assert evaluators[0].links == full[0].links
+    assert evaluators[0].evaluate()[1:] == full[0].evaluate()[1:]
+    assert evaluators[1].evaluate() == full[1].evaluate()
+
+def test_evaluator_is_abstract():
+    with pytest.raises(TypeError):
+        IncrementalEvaluator({}, {})
+
+def test_unknown_and_duplicate_zones_raise():
+    ref_zones, hyp_zones = rectangle_page(0)
+    evaluator = ZoneMapEvaluator(ref_zones, hyp_zones)
+    with pytest.raises(KeyError):
+        evaluator.remove_zone(-1)
+    with pytest.raises(ValueError):
+        evaluator.add_zone(next(iter(hyp_zones)), hyp_zones[next(iter(hyp_zones))])
@@ -0,0 +1,28 @@
+"""Structured array link tables."""
+
+import numpy as np
+from lib.links import link_table, concat_links
+from zonemap.zonemap import compute_links
+from tests.reference import reference_links, sort_reference_links, rectangle_page
+
+def test_sorted_keeps_ties_in_order():
+    links = link_table(['a', 'b'], ['x', 'y', 'z'], [0, 0, 1, 1], [0, 1, 2, 0],
+                       [1.0, 2.0, 1.0, 3.0], [0.5, 0.9, 0.5, 0.9])
+    assert [link[:2] for link in links.sorted()] == [('a', 'y'), ('b', 'x'), ('a', 'x'),
+                                                     ('b', 'z')]
+
+def test_sorted_links_match_sorted_dicts():
+    ref_zones, hyp_zones = rectangle_page(2, split_rate=0.4)
+    links = compute_links(ref_zones, hyp_zones)
+    expected = sort_reference_links(reference_links(ref_zones.to_polygons(),
+                                                    hyp_zones.to_polygons()))
+    assert list(links.sorted()) == expected
+
+def test_columns_and_blocks_build_the_same_table():
+    columns = link_table([10, 11], [20, 21], [0, 1], [1, 0], [4.0, 2.0], [0.25, 0.5])
+    blocks = concat_links([10, 11], [20, 21], [(np.array([0]), np.array([1]), np.array([4.0]),
+                                                np.array([0.25])),
+                                               (np.array([1]), np.array([0]), np.array([2.0]),
+                                                np.array([0.5]))])
+    assert list(columns) == list(blocks) == [(10, 21, 4.0, 0.25), (11, 20, 2.0, 0.5)]
+    assert len(concat_links([], [], [])) == 0
@@ -0,0 +1,54 @@
+"""Rasterized zones and pixel-exact scoring."""
+
+import pytest
+from shapely import affinity
+from lib.raster import rasterize_zones, overlap_areas
+from lib.rects import rect_link_table
+from zonemap.zonemap import zonemap, zonemap_raster
+from zonemapalt.zonemapalt import zonemapalt, zonemapalt_raster
+from lib.geometry import get_backend, zone_areas
+from tests.reference import rectangle_page, polygon_page
+
+@pytest.mark.parametrize('density', [0.3, 0.95])
+@pytest.mark.parametrize('seed', range(3))
+def test_overlaps_match_rectangle_links(seed, density):
+    ref_zones, hyp_zones = rectangle_page(seed, 80, density=density)
+    ref_raster, hyp_raster = rasterize_zones(ref_zones, hyp_zones)
+    idx_1, idx_2, pixels = overlap_areas(ref_raster, hyp_raster, rows=37)
+    links = rect_link_table(ref_zones, hyp_zones)
+    assert idx_1.tolist() == links.data['index_1'].tolist()
+    assert idx_2.tolist() == links.data['index_2'].tolist()
+    assert pixels.tolist() == links.data['area'].tolist()
+
+@pytest.mark.parametrize('density', [0.3, 0.95])
+@pytest.mark.parametrize('seed', range(3))
+def test_raster_scores_match_rectangles(seed, density):
+    ref_zones, hyp_zones = rectangle_page(seed, 80, density=density)
+    assert zonemap_raster(ref_zones, hyp_zones)[1:] == zonemap(ref_zones, hyp_zones)[1:]
+    assert (zonemapalt_raster(ref_zones, hyp_zones, 0.15)
+            == zonemapalt(ref_zones, hyp_zones, 0.15))
+
+def test_overlapping_zones_do_not_allocate_pages():
+    ref_zones, _ = rectangle_page(0, 150, density=0.95)
+    raster, _ = rasterize_zones(ref_zones, {})
+    page_box, page = raster.layers[0]
+    assert page_box == (0, 0, raster.shape[1], raster.shape[0])
+    assert len(raster.layers) > 2
+    assert sum(labels.size for _, labels in raster.layers[1:]) <= sum(
+        (right - left) * (bottom - top) for left, top, right, bottom in raster.boxes.tolist())
+    for i in range(len(raster.ids)):
+        assert raster.mask(i, raster.boxes[i]).sum() == raster.areas[i]
+
+def test_downscaled_areas_are_close():
+    ref_zones, hyp_zones = rectangle_page(1)
+    results = zonemap_raster(ref_zones, hyp_zones, scale=0.5)[1]
+    expected = zonemap(ref_zones, hyp_zones)[1]
+    assert results['total_gt_area'] == pytest.approx(expected['total_gt_area'], rel=0.05)
+
+@pytest.mark.parametrize('seed', range(5))
+def test_polygon_areas_are_close(seed):
+    ref_zones = {key:affinity.translate(zone, 50, 50)
+                 for key, zone in polygon_page(seed)[0].items()}
+    areas, expected = get_backend('raster').areas(ref_zones), zone_areas(ref_zones)
+    assert areas == pytest.approx(expected, rel=0.05)
+    assert areas.sum() == pytest.approx(expected.sum(), rel=1e-3)
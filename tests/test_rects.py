@@ -0,0 +1,35 @@
+"""Vectorized rectangle links."""
+
+import pytest
+from shapely.geometry import Polygon
+from experiments.synthetic_pages import generate_page
+from lib.geometry import get_backend
+from lib.rects import is_rectangle, rect_link_table
+from lib.stats import PipelineStats
+from tests.reference import reference_links, polygon_page, rectangle_page
+
+@pytest.mark.parametrize('seed', range(5))
+@pytest.mark.parametrize('chunk_size', [7, 1 << 22])
+def test_rect_links_match_nested_loop(seed, chunk_size):
+    ref_zones, hyp_zones = rectangle_page(seed)
+    links = list(rect_link_table(ref_zones, hyp_zones, chunk_size))
+    assert links == reference_links(ref_zones.to_polygons(), hyp_zones.to_polygons())
+
+def test_table_and_polygons_give_the_same_links():
+    ref_zones, hyp_zones = rectangle_page(1)
+    assert (list(rect_link_table(ref_zones, hyp_zones))
+            == list(rect_link_table(ref_zones.to_polygons(), hyp_zones.to_polygons())))
+
+def test_non_rectangles_are_refused():
+    ref_zones, hyp_zones = polygon_page(0)
+    assert rect_link_table(ref_zones, hyp_zones) is None
+    assert not is_rectangle(Polygon([(0, 0), (2, 0), (1, 2)]))
+    assert not is_rectangle(Polygon([(0, 0), (2.5, 0), (2.5, 1), (0, 1)]))
+    assert is_rectangle(Polygon([(0, 0), (2, 0), (2, 1), (0, 1)]))
+
+def test_only_overlapping_boxes_are_intersected():
+    ref_zones, hyp_zones = generate_page(0, 2000)
+    stats = PipelineStats()
+    links = rect_link_table(ref_zones, hyp_zones, stats=stats)
+    assert 0 < stats.counters['candidate_pairs'] < len(ref_zones) * len(hyp_zones) // 100
+    assert list(links) == list(get_backend('shapely').links(ref_zones, hyp_zones))
@@ -0,0 +1,70 @@
+"""Local HTTP scoring service."""
+
+import json
+import threading
+import urllib.error
+import urllib.request
+import pytest
+from experiments.synthetic_pages import gedi_xml
+from service.service import ScoringServer, score_job
+from zonemap.zonemap import zonemap
+from zonemapalt.zonemapalt import zonemapalt
+from tests.reference import rectangle_page
+
+@pytest.fixture(scope='module')
+def server():
+    server = ScoringServer(('127.0.0.1', 0), workers=1)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield 'http://127.0.0.1:{}'.format(server.server_port)
+    server.shutdown()
+    server.server_close()
+
+def post(url, body):
+    """POST a JSON body and return the status and the decoded response."""
+    request = urllib.request.Request(url, data=json.dumps(body).encode(), method='POST')
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as error:
+        return error.code, json.loads(error.read())
+
+def page_job():
+    """Return the zones and the in-memory job of a page."""
+    ref_zones, hyp_zones = rectangle_page(5)
+    return ref_zones, hyp_zones, {'ref_xml':gedi_xml([ref_zones]),
+                                  'hyp_xml':gedi_xml([hyp_zones])}
+
+def test_score_job_matches_direct_calls():
+    ref_zones, hyp_zones, job = page_job()
+    _, scores, counts = zonemap(ref_zones, hyp_zones)
+    assert score_job(dict(job, metric='zonemap')) == {'scores':scores, 'counts':counts}
+    scores, counts = zonemapalt(ref_zones, hyp_zones, 0.3)
+    assert (score_job(dict(job, metric='zonemapalt', threshold=0.3))
+            == {'scores':scores, 'counts':counts})
+    assert 'error' in score_job({'metric':'zonemap', 'ref':'missing.xml', 'hyp':'missing.xml'})
+
+def test_service_scores_batches(server):
+    _, _, job = page_job()
+    status, result = post(server + '/zonemap', [job, job])
+    assert status == 200
+    assert result == [score_job(dict(job, metric='zonemap'))] * 2
+
+def test_jobs_cannot_choose_the_cache(server, tmp_path):
+    _, _, job = page_job()
+    status, _ = post(server + '/zonemap', dict(job, cache_dir=str(tmp_path / 'cache')))
+    assert status == 400
+    assert not (tmp_path / 'cache').exists()
+
+def test_health_reports_workers(server):
+    with urllib.request.urlopen(server + '/health') as response:
+        assert json.loads(response.read())['workers'] == 1
+
+def test_workers_start_with_the_server():
+    server = ScoringServer(('127.0.0.1', 0), workers=2)
+    try:
+        processes = list(server.executor._processes.values())
+        assert len(processes) == 2
+        assert all(process.is_alive() for process in processes)
+    finally:
+        server.server_close()
@@ -0,0 +1,30 @@
+"""STRtree candidates and the shapely link stage."""
+
+import pytest
+from lib.spatial import candidate_indices
+from zonemap.zonemap import compute_links
+from tests.reference import reference_links, polygon_page, rectangle_page
+
+@pytest.mark.parametrize('seed', range(5))
+def test_candidates_cover_intersecting_pairs_in_loop_order(seed):
+    ref_zones, hyp_zones = polygon_page(seed)
+    keys_1, keys_2, idx_1, idx_2 = candidate_indices(ref_zones, hyp_zones)
+    pairs = [(keys_1[i], keys_2[j]) for i, j in zip(idx_1.tolist(), idx_2.tolist())]
+    order = {key:i for i, key in enumerate(ref_zones)}
+    assert pairs == sorted(pairs, key=lambda pair: (order[pair[0]], pair[1]))
+    linked = {(key_1, key_2) for key_1, key_2, _, _ in reference_links(ref_zones, hyp_zones)}
+    assert linked <= set(pairs)
+
+@pytest.mark.parametrize('seed', range(5))
+def test_shapely_links_match_nested_loop(seed):
+    ref_zones, hyp_zones = polygon_page(seed)
+    links = list(compute_links(ref_zones, hyp_zones, backend='shapely'))
+    expected = reference_links(ref_zones, hyp_zones)
+    assert [link[:2] for link in links] == [link[:2] for link in expected]
+    for link, expected_link in zip(links, expected):
+        assert link[2:] == pytest.approx(expected_link[2:], rel=1e-12)
+
+def test_empty_zones_have_no_candidates():
+    ref_zones, _ = rectangle_page(0)
+    _, _, idx_1, idx_2 = candidate_indices(ref_zones.to_polygons(), {})
+    assert len(idx_1) == len(idx_2) == 0
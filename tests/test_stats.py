@@ -0,0 +1,34 @@
+"""Opt-in pipeline stage timing and counters."""
+
+import pickle
+from lib.stats import PipelineStats
+from zonemap.zonemap import zonemap, zonemap_xmls
+from zonemapalt.zonemapalt import zonemapalt
+from experiments.synthetic_pages import write_corpus
+from tests.reference import rectangle_page, polygon_page
+
+def test_stats_do_not_change_results():
+    ref_zones, hyp_zones = rectangle_page(2)
+    stats = PipelineStats()
+    assert zonemap(ref_zones, hyp_zones, stats=stats)[1:] == zonemap(ref_zones, hyp_zones)[1:]
+    assert set(stats.seconds) == {'links', 'sort', 'groups', 'errors', 'scores'}
+    assert stats.counters['groups'] > 0
+    assert (zonemapalt(ref_zones, hyp_zones, 0.15, stats=stats)
+            == zonemapalt(ref_zones, hyp_zones, 0.15))
+    assert stats.calls['links'] == 2
+
+def test_shapely_operations_are_counted():
+    ref_zones, hyp_zones = polygon_page(1)
+    stats = PipelineStats()
+    zonemapalt(ref_zones, hyp_zones, 0.15, stats=stats)
+    assert stats.counters['shapely_ops'] >= stats.counters['candidate_pairs'] > 0
+
+def test_batch_stats_merge_pages(tmp_path):
+    write_corpus(str(tmp_path), 3, 20)
+    stats = PipelineStats(callback=lambda name, seconds: None)
+    zonemap_xmls(str(tmp_path / 'reference'), str(tmp_path / 'hypothesis'), stats=stats,
+                 output_dir=str(tmp_path / 'output'))
+    assert sorted(stats.pages) == ['page_00000', 'page_00001', 'page_00002']
+    assert stats.counters['groups'] == sum(page['counters']['groups']
+                                           for page in stats.pages.values())
+    assert pickle.loads(pickle.dumps(stats)).callback is None
@@ -0,0 +1,53 @@
+"""Memory-mapped columnar zone stores."""
+
+import numpy as np
+import pytest
+from experiments.synthetic_pages import gedi_xml, write_corpus
+from lib.store import ZoneStore, write_zone_store, pair_stores, store_page_pairs
+from lib.utils import iter_gedi_pages
+from zonemap.zonemap import zonemap_xmls
+from zonemapalt.zonemapalt import zonemapalt_xmls
+from tests.reference import rectangle_page
+
+def test_store_round_trip(tmp_path):
+    folder = tmp_path / 'xml'
+    folder.mkdir()
+    documents = {'a.xml':[rectangle_page(0)[0]], 'b.xml':[rectangle_page(seed)[1]
+                                                        for seed in range(3)]}
+    for name, pages in documents.items():
+        (folder / name).write_text(gedi_xml(pages))
+    path = str(tmp_path / 'zones.store')
+    assert write_zone_store(str(folder), path) == 4
+    store = ZoneStore(path)
+    assert len(store) == 4
+    for name, pages in documents.items():
+        stored = store.pages(name)
+        assert len(stored) == len(pages)
+        for table, expected in zip(stored, iter_gedi_pages(str(folder / name))):
+            np.testing.assert_array_equal(table.ids, expected.ids)
+            np.testing.assert_array_equal(table.boxes(), expected.boxes())
+
+def test_not_a_store_raises(tmp_path):
+    path = tmp_path / 'zones.store'
+    path.write_bytes(b'not a zone store at all')
+    with pytest.raises(ValueError):
+        ZoneStore(str(path))
+
+def test_stores_score_like_xml_folders(tmp_path):
+    write_corpus(str(tmp_path), 4, 25, seed=9)
+    (tmp_path / 'reference' / 'extra.xml').write_text(gedi_xml([rectangle_page(0)[0]]))
+    folders = [str(tmp_path / 'reference'), str(tmp_path / 'hypothesis')]
+    stores = [str(tmp_path / 'ref.store'), str(tmp_path / 'hyp.store')]
+    for folder, store in zip(folders, stores):
+        write_zone_store(folder, store)
+    with pytest.warns(UserWarning, match='extra.xml'):
+        pairs = pair_stores(*stores)
+    assert len(pairs) == 4
+    assert len(store_page_pairs(*stores, pairs[0]['name'])) == 1
+    with pytest.warns(UserWarning):
+        assert (zonemap_xmls(*stores, stores=True, output_dir=str(tmp_path / 'store'))
+                == zonemap_xmls(*folders, output_dir=str(tmp_path / 'xml')))
+    with pytest.warns(UserWarning):
+        assert (zonemapalt_xmls(*stores, stores=True, progress=False,
+                                output_dir=str(tmp_path / 'store'))
+                == zonemapalt_xmls(*folders, progress=False, output_dir=str(tmp_path / 'xml')))
@@ -0,0 +1,32 @@
+"""Synthetic pages and the stage benchmark."""
+
+import numpy as np
+from experiments.synthetic_pages import generate_page, write_corpus
+from experiments.performance_benchmark import benchmark
+
+def test_pages_are_seeded():
+    page, same_page = generate_page(7, 50), generate_page(7, 50)
+    for table, same_table in zip(page, same_page):
+        np.testing.assert_array_equal(table.boxes(), same_table.boxes())
+    assert not np.array_equal(generate_page(8, 50)[0].boxes(), page[0].boxes())
+
+def test_zones_stay_on_the_page():
+    ref_zones, hyp_zones = generate_page(0, 200, density=0.9)
+    assert len(ref_zones) == 200
+    for table in (ref_zones, hyp_zones):
+        boxes = table.boxes()
+        assert (boxes[:, :2] >= 0).all()
+        assert (boxes[:, 2:] > boxes[:, :2]).all()
+
+def test_corpus_has_one_file_per_page(tmp_path):
+    write_corpus(str(tmp_path), 3, 10)
+    for folder in ('reference', 'hypothesis'):
+        assert sorted(path.name for path in (tmp_path / folder).iterdir()) == [
+            'page_00000.xml', 'page_00001.xml', 'page_00002.xml']
+
+def test_benchmark_times_every_stage():
+    records = benchmark(scales=[20], repeat=1)
+    stages = {(record['metric'], record['stage']) for record in records}
+    assert ('zonemap', 'end_to_end') in stages
+    assert ('zonemapalt', 'make_matches') in stages
+    assert all(record['seconds'] >= 0 and record['peak_bytes'] >= 0 for record in records)
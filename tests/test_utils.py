@@ -0,0 +1,78 @@
+"""GEDI parsing and folder pairing."""
+
+import os
+import subprocess
+import sys
+import numpy as np
+import pytest
+from experiments.synthetic_pages import gedi_xml
+from lib.utils import (zone_table_from_gedi_xml, zones_from_gedi_xml, iter_gedi_pages,
+                       pair_files, xmls_from_folder, progress_bar, NullProgress)
+from tests.reference import rectangle_page
+
+def write_xml(path, pages):
+    """Write ZoneTables as the pages of a GEDI file and return its path."""
+    path.write_text(gedi_xml(pages))
+    return str(path)
+
+def assert_same_zones(table, expected):
+    for column in ('ids', 'cols', 'rows', 'widths', 'heights'):
+        np.testing.assert_array_equal(getattr(table, column), getattr(expected, column))
+
+def test_zone_table_round_trip(tmp_path):
+    ref_zones, hyp_zones = rectangle_page(0)
+    assert_same_zones(zone_table_from_gedi_xml(write_xml(tmp_path / 'ref.xml', [ref_zones])),
+                      ref_zones)
+    polygons = zones_from_gedi_xml(write_xml(tmp_path / 'hyp.xml', [hyp_zones]))
+    assert list(polygons) == list(hyp_zones)
+    assert all(polygons[key].equals(hyp_zones[key]) for key in hyp_zones)
+
+def test_pages_are_streamed_in_order(tmp_path):
+    pages = [rectangle_page(seed)[0] for seed in range(3)]
+    path = write_xml(tmp_path / 'doc.xml', pages)
+    tables = list(iter_gedi_pages(path))
+    assert len(tables) == 3
+    for table, expected in zip(tables, pages):
+        assert_same_zones(table, expected)
+
+def test_other_gedi_types_are_skipped(tmp_path):
+    ref_zones, _ = rectangle_page(1)
+    path = write_xml(tmp_path / 'ref.xml', [ref_zones])
+    assert len(zone_table_from_gedi_xml(path, gedi_type='TextLine')) == 0
+
+def test_no_page_raises(tmp_path):
+    path = tmp_path / 'empty.xml'
+    path.write_text(gedi_xml([]))
+    with pytest.raises(ValueError):
+        zone_table_from_gedi_xml(str(path))
+
+def make_folder(folder, names):
+    """Create empty files in a folder and return its path."""
+    for name in names:
+        (folder / name).parent.mkdir(parents=True, exist_ok=True)
+        (folder / name).touch()
+    return str(folder)
+
+def test_pair_files_lists_unpaired_names(tmp_path):
+    ref_folder = make_folder(tmp_path / 'ref', ['a.xml', 'b.xml', 'sub/d.xml'])
+    hyp_folder = make_folder(tmp_path / 'hyp', ['a.xml', 'c.xml', 'sub/d.xml'])
+    pairs, unpaired = pair_files(ref_folder, hyp_folder)
+    assert pairs == [{'ref_file':ref_folder + '/a.xml', 'hyp_file':hyp_folder + '/a.xml'}]
+    assert unpaired == {'ref':['b.xml'], 'hyp':['c.xml']}
+    pairs, _ = pair_files(ref_folder, hyp_folder, recursive=True)
+    assert sorted(pair['ref_file'] for pair in pairs) == [ref_folder + '/a.xml',
+                                                           ref_folder + '/sub/d.xml']
+
+def test_unpaired_files_are_warned(tmp_path):
+    ref_folder = make_folder(tmp_path / 'ref', ['a.xml', 'b.xml'])
+    hyp_folder = make_folder(tmp_path / 'hyp', ['a.xml'])
+    with pytest.warns(UserWarning, match='b.xml'):
+        assert len(xmls_from_folder(ref_folder, hyp_folder)) == 1
+
+def test_scoring_does_not_import_display_dependencies():
+    code = ('import sys, zonemap.zonemap, zonemapalt.zonemapalt; '
+            'print(sorted(set(sys.modules) & {"cv2", "tqdm", "matplotlib"}))')
+    output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True,
+                            check=True, cwd=os.path.dirname(os.path.dirname(__file__))).stdout
+    assert output.strip() == '[]'
+    assert isinstance(progress_bar(10, progress=False), NullProgress)
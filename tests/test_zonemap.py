@@ -0,0 +1,44 @@
+"""ZoneMap grouping and scoring."""
+
+import pytest
+from zonemap.zonemap import (make_groups, sort_links, compute_links, compute_error_surfs,
+                             zonemap)
+from tests.reference import (reference_groups, reference_zonemap, sort_reference_links,
+                             reference_links, rectangle_page, polygon_page)
+
+@pytest.mark.parametrize('page', [rectangle_page, polygon_page])
+@pytest.mark.parametrize('seed', range(5))
+def test_groups_match_group_scan(page, seed):
+    gt_zones, sys_zones = page(seed)
+    groups = make_groups(sort_links(compute_links(gt_zones, sys_zones)))
+    if hasattr(gt_zones, 'to_polygons'):
+        gt_zones, sys_zones = gt_zones.to_polygons(), sys_zones.to_polygons()
+    assert groups == reference_groups(sort_reference_links(reference_links(gt_zones,
+                                                                            sys_zones)))
+
+@pytest.mark.parametrize('seed', range(3))
+def test_error_geometries_match_reference(seed):
+    gt_zones, sys_zones = polygon_page(seed)
+    _, results, n_results = zonemap(gt_zones, sys_zones, geometry=True)
+    assert (results, n_results) == reference_zonemap(gt_zones, sys_zones)[1:]
+
+@pytest.mark.parametrize('seed', range(5))
+def test_surfaces_from_links_match_error_geometries(seed):
+    gt_zones, sys_zones = rectangle_page(seed, split_rate=0.3, merge_rate=0.2)
+    groups, results, n_results = zonemap(gt_zones, sys_zones)
+    geometry_groups, geometry_results, geometry_n_results = zonemap(gt_zones, sys_zones,
+                                                                    geometry=True)
+    assert (results, n_results) == (geometry_results, geometry_n_results)
+    for group, geometry_group in zip(groups, geometry_groups):
+        assert group['error_details']['match']['area'] is None
+        for key, detail in group['error_details'].items():
+            assert detail['surf'] == pytest.approx(geometry_group['error_details'][key]['surf'])
+
+@pytest.mark.parametrize('seed', range(20))
+def test_polygons_match_reference(seed):
+    gt_zones, sys_zones = polygon_page(seed)
+    assert zonemap(gt_zones, sys_zones)[1:] == reference_zonemap(gt_zones, sys_zones)[1:]
+
+def test_unknown_error_type_raises():
+    with pytest.raises(ValueError, match=r'gt \[1, 2\] and sys \[3, 4\]'):
+        compute_error_surfs([{'gt':[1, 2], 'sys':[3, 4]}], {}, {}, [])
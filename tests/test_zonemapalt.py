@@ -0,0 +1,39 @@
+"""ZoneMapAlt matching and scoring."""
+
+import pytest
+from zonemapalt.zonemapalt import (zonemapalt, zonemapalt_sweep, make_matches, sort_links,
+                                   compute_links, __AREA_TOLERANCE__)
+from tests.reference import reference_zonemapalt, rectangle_page, polygon_page
+
+__THRESHOLDS__ = [0.0, 0.15, 0.5]
+
+@pytest.mark.parametrize('threshold', __THRESHOLDS__)
+@pytest.mark.parametrize('seed', range(5))
+def test_rectangles_match_replayed_matches(seed, threshold):
+    ref_zones, hyp_zones = rectangle_page(seed)
+    assert (zonemapalt(ref_zones, hyp_zones, threshold)
+            == reference_zonemapalt(ref_zones.to_polygons(), hyp_zones.to_polygons(), threshold))
+
+@pytest.mark.parametrize('threshold', __THRESHOLDS__)
+@pytest.mark.parametrize('seed', range(10))
+def test_polygons_match_replayed_matches_without_slivers(seed, threshold):
+    ref_zones, hyp_zones = polygon_page(seed)
+    assert (zonemapalt(ref_zones, hyp_zones, threshold)
+            == reference_zonemapalt(ref_zones, hyp_zones, threshold, __AREA_TOLERANCE__))
+
+def test_slivers_do_not_match():
+    ref_zones, hyp_zones = polygon_page(44)
+    links = sort_links(compute_links(ref_zones, hyp_zones))
+    for threshold in __THRESHOLDS__:
+        matches, _, _ = make_matches(links, ref_zones, hyp_zones, threshold)
+        assert all(match['zone'].area > __AREA_TOLERANCE__ * ref_zones[match['ref_id']].area
+                   for match in matches.values())
+    assert (zonemapalt(ref_zones, hyp_zones, 0.5)
+            != reference_zonemapalt(ref_zones, hyp_zones, 0.5))
+
+@pytest.mark.parametrize('page', [rectangle_page, polygon_page])
+def test_sweep_matches_per_threshold_runs(page):
+    ref_zones, hyp_zones = page(2)
+    thresholds = [0.0, 0.1, 0.25, 0.5, 0.9]
+    assert (zonemapalt_sweep(ref_zones, hyp_zones, thresholds)
+            == [zonemapalt(ref_zones, hyp_zones, threshold) for threshold in thresholds])
@@ -1,71 +1,82 @@
 """This script aims to produce the same results as ZONEMAP."""
 
 from os.path import basename
-from operator import itemgetter
 import numpy as np
 from shapely.geometry import Polygon
 import shapely.geometry as sg
-from lib.utils import (zones_from_gedi_xml, square, xmls_from_folder, dsum, daverage,
-                   get_filename)
-from lib.display import display_errors, display_graph
+from shapely.ops import unary_union
+from lib.utils import (zone_table_from_gedi_xml, square, xmls_from_folder,
+                   get_filename, parallel_map, pair_gedi_pages, PageJob)
+from lib.components import link_components, batch_components
+from lib.geometry import get_backend, zone_areas, RasterBackend
+from lib.cache import get_cache
+from lib.rects import rects_from_zones
+from lib.results import open_results, open_details
+from lib.store import pair_stores, store_page_pairs
+from lib.stats import PipelineStats, get_stats
+from lib.aggregate import CorpusStats
+from lib.incremental import IncrementalEvaluator
+from lib.raster import covered_pixels
 
 __MS__ = 0.5
 
 def compute_link(zone_1, zone_2):
     """Compute a link between two zones."""
-    intersect = zone_1.intersection(zone_2)
-    if intersect.area == 0:
+    return compute_area_link(zone_1.intersection(zone_2).area, zone_1.area, zone_2.area)
+
+def compute_area_link(area, area_1, area_2):
+    """Compute a link from the intersection area and the areas of two zones."""
+    if area == 0:
         return 0
-    return (square(float(intersect.area)/float(zone_1.area))
-            + square(float(intersect.area)/float(zone_2.area)))
-
-def compute_links(gt_rects, sys_rects):
-    """Compute all links."""
-    links = []
-    for gt_key, gt_rect in gt_rects.items():
-        for sys_key, sys_rect in sys_rects.items():
-            strength = compute_link(gt_rect, sys_rect)
-            if strength > 0:
-                links.append({'strength':strength,
-                              'gt_id':gt_key,
-                              'sys_id':sys_key})
-    return links
+    return (square(float(area)/float(area_1))
+            + square(float(area)/float(area_2)))
+
+def compute_links(gt_rects, sys_rects, stats=None, backend=None):
+    """Compute all links in a LinkTable, with the auto geometry backend by default."""
+    return get_backend(backend).links(gt_rects, sys_rects, stats)
 
 def sort_links(links):
-    """Sort the links."""
-    return sorted(links, key=itemgetter('strength'), reverse=True)
+    """Sort the links by decreasing strength."""
+    return links.sorted()
 
 def make_groups(links):
     """Make groups from links."""
     groups = []
-    for link in links:
-        gt_group_id = find_in_groups(link['gt_id'], groups, 'gt')
-        sys_group_id = find_in_groups(link['sys_id'], groups, 'sys')
+    gt_index = {}
+    sys_index = {}
+    for gt_id, sys_id, _, _ in links:
+        gt_group_id = gt_index.get(gt_id, -1)
+        sys_group_id = sys_index.get(sys_id, -1)
 
         if gt_group_id == -1:
             if sys_group_id == -1: # Gt not matched && sys not matched
                 group = {'gt':[], 'sys':[]}
-                group['gt'].append(link['gt_id'])
-                group['sys'].append(link['sys_id'])
+                group['gt'].append(gt_id)
+                group['sys'].append(sys_id)
+                gt_index[gt_id] = len(groups)
+                sys_index[sys_id] = len(groups)
                 groups.append(group)
             else: # Gt not matched && sys matched
                 card_sys = len(groups[sys_group_id]['sys'])
                 if card_sys == 1:
-                    groups[sys_group_id]['gt'].append(link['gt_id'])
+                    groups[sys_group_id]['gt'].append(gt_id)
+                    gt_index[gt_id] = sys_group_id
         elif sys_group_id == -1: # Gt matched && sys not matched
             card_ref = len(groups[gt_group_id]['gt'])
             if card_ref == 1:
-                groups[gt_group_id]['sys'].append(link['sys_id'])
+                groups[gt_group_id]['sys'].append(sys_id)
+                sys_index[sys_id] = gt_group_id
 
     return groups
 
 def add_generic_unmatched(groups, rects, tag):
     """Add items that are not in a group in a group of one."""
-    for key, _ in rects.items():
-        group_id = find_in_groups(key, groups, tag)
-        if group_id == -1:
+    index = index_groups(groups, tag)
+    for key in rects:
+        if key not in index:
             group = {'gt':[], 'sys':[]}
             group[tag].append(key)
+            index[key] = len(groups)
             groups.append(group)
 
 def add_unmatched(groups, gt_rects, sys_rects):
@@ -74,14 +85,13 @@ def add_unmatched(groups, gt_rects, sys_rects):
     add_generic_unmatched(groups, sys_rects, 'sys')
     return groups
 
-def find_in_groups(zone_id, groups, tag):
-    """Find a zone id in groups."""
-    for i in range(0, len(groups)):
-        group = groups[i]
+def index_groups(groups, tag):
+    """Map each zone id of a tag to the index of its group."""
+    index = {}
+    for i, group in enumerate(groups):
         for zone in group[tag]:
-            if zone == zone_id:
-                return i
-    return -1
+            index.setdefault(zone, i)
+    return index
 
 def get_error_type(group):
     """Return the error type depending on the cardinality."""
@@ -250,11 +260,11 @@ def compute_merge(group, gt_rects, sys_rects):
             'split':None,
             'merge':merges}
 
-def get_total_area(gt_rects):
-    """Compute the sum of area of a set."""
+def get_total_area(gt_rects, backend=None):
+    """Compute the sum of area of a set, measured by the geometry backend."""
     area = 0
-    for _, gt_rect in gt_rects.items():
-        area += gt_rect.area
+    for gt_area in get_zone_areas(gt_rects, backend).values():
+        area += gt_area
     return area
 
 def get_area(error_detail):
@@ -263,7 +273,7 @@ def get_area(error_detail):
     if error_detail is not None:
         for item in error_detail:
             if isinstance(item, sg.collection.GeometryCollection):
-                for geom in item:
+                for geom in item.geoms:
                     area += geom.area
             else:
                 area = item.area
@@ -292,9 +302,10 @@ def compute_scores(groups):
         compute_score(group)
     return groups
 
-def compute_zonemap(groups, gt_rects):
+def compute_zonemap(groups, gt_rects, gt_area=None):
     """Compute the zonemap score with details."""
-    gt_area = get_total_area(gt_rects)
+    if gt_area is None:
+        gt_area = get_total_area(gt_rects)
     match, miss, false_alarm, split, merge = (0, 0, 0, 0, 0)
     n_match, n_miss, n_false_alarm, n_split, n_merge = (0, 0, 0, 0, 0)
     for group in groups:
@@ -327,83 +338,397 @@ def compute_zonemap(groups, gt_rects):
                               'split':n_split,
                               'merge':n_merge}
 
-def zonemap(gt_zones, sys_zones, mask_path=None):
-    """Perform the zonemap algorithm."""
-    links = compute_links(gt_zones, sys_zones)
-    sorted_links = sort_links(links)
-    groups = make_groups(sorted_links)
-    groups = add_unmatched(groups, gt_zones, sys_zones)
-    groups = compute_errors(groups, gt_zones, sys_zones)
+def zonemap(gt_zones, sys_zones, mask_path=None, links=None, geometry=False, writer=None,
+            output_dir="output", stats=None, backend=None):
+    """Perform the zonemap algorithm, links can be given if already computed.
+
+    Error geometries are only built when geometry is True, errors are
+    displayed or some zones are not rectangles, otherwise error surfaces are
+    computed from the link areas.
+    Errors are displayed in the background when a DisplayWriter is given.
+    Stage times and counters are recorded in stats when a PipelineStats is given.
+    Links are computed with the given geometry backend, see lib.geometry. The
+    raster backend gives error surfaces only, and measures them on its rasters.
+    """
+    stats = get_stats(stats)
+    backend = get_backend(backend)
+    if isinstance(backend, RasterBackend) and (geometry or mask_path is not None):
+        raise ValueError('The raster backend gives error surfaces, not error geometries')
+    if links is None:
+        with stats.stage('links'):
+            links = compute_links(gt_zones, sys_zones, stats, backend)
+    with stats.stage('sort'):
+        sorted_links = sort_links(links)
+    with stats.stage('groups'):
+        groups = make_groups(sorted_links)
+        groups = add_unmatched(groups, gt_zones, sys_zones)
+    stats.count('groups', len(groups))
+    with stats.stage('errors'):
+        with_geometry = (geometry or mask_path is not None
+                         or not surfs_from_links(gt_zones, sys_zones, backend))
+        if with_geometry:
+            groups = compute_errors(groups, gt_zones, sys_zones)
+            stats.count('error_geometries', len(groups))
+        else:
+            groups = compute_error_surfs(groups, gt_zones, sys_zones, sorted_links, stats,
+                                         backend)
+    if mask_path is not None:
+        with stats.stage('display'):
+            from lib.display import display_errors
+            display_errors(groups, mask_path, sys_zones, writer=writer, output_dir=output_dir)
+    with stats.stage('scores'):
+        if with_geometry:
+            groups = compute_scores(groups)
+        results, n_results = compute_zonemap(groups, gt_zones, get_total_area(gt_zones, backend))
+    return groups, results, n_results
+
+def error_surfs(group, gts, syss, areas, overlaps, strengths, covered):
+    """Compute the surfaces of a group from zone and intersection areas only.
+
+    gts and syss are the keys of the group zones in areas['gt'], areas['sys'],
+    and in the (gt, sys) keyed overlaps and strengths. covered(tag, key, others)
+    returns the area of a zone covered by the union of others. The surfaces are
+    the ones compute_errors and compute_scores would give, including get_area
+    keeping the last item of a list.
+    """
+    match, miss, false_alarm, split, merge = (0, 0, 0, 0, 0)
+    if group['error'] == "False alarm":
+        false_alarm = areas['sys'][syss[0]]
+    elif group['error'] == "Miss":
+        miss = areas['gt'][gts[0]]
+    elif group['error'] == "Match":
+        match = overlaps[gts[0], syss[0]]
+        miss = areas['gt'][gts[0]] - match
+        false_alarm = areas['sys'][syss[0]] - match
+    elif group['error'] == "Split":
+        gt = gts[0]
+        best_id = max(syss, key=lambda sys: (strengths[gt, sys], -syss.index(sys)))
+        match = overlaps[gt, best_id]
+        splits = [overlaps[gt, sys] for sys in syss if sys != best_id]
+        split = (splits[-1] if splits else 0) * len(syss) * __MS__
+        false_alarm = areas['sys'][syss[-1]] - overlaps[gt, syss[-1]]
+        miss = areas['gt'][gt] - covered('gt', gt, syss)
+    elif group['error'] == "Merge":
+        sys = syss[0]
+        best_id = max(gts, key=lambda gt: (strengths[gt, sys], -gts.index(gt)))
+        match = overlaps[best_id, sys]
+        merges = [overlaps[gt, sys] for gt in gts if gt != best_id]
+        merge = (merges[-1] if merges else 0) * len(gts) * __MS__
+        miss = areas['gt'][gts[-1]] - overlaps[gts[-1], sys]
+        false_alarm = areas['sys'][sys] - covered('sys', sys, gts)
+    return {'match':match, 'miss':miss, 'false_alarm':false_alarm, 'split':split, 'merge':merge}
+
+def surfs_from_links(gt_rects, sys_rects, backend=None):
+    """Return True if error surfaces can be computed from the link areas.
+
+    Only the areas of rectangles are exact, subtracting the float areas of
+    other polygons leaves residues that would count as extra errors. Pixel
+    counts of the raster backend are exact for any zone.
+    """
+    if isinstance(backend, RasterBackend):
+        return True
+    return rects_from_zones(gt_rects) is not None and rects_from_zones(sys_rects) is not None
+
+def get_zone_areas(zones, backend=None):
+    """Return the area of each zone, without building polygons for zone tables."""
+    if backend is None:
+        return dict(zip(zones, zone_areas(zones).tolist()))
+    return dict(zip(zones, get_backend(backend).areas(zones).tolist()))
+
+def compute_error_surfs(groups, gt_rects, sys_rects, links, stats=None, backend=None):
+    """Compute the error surfaces of groups from the link areas, without any geometry.
+
+    With the raster backend, zone areas and covered areas are pixel counts of
+    the same rasters as the link areas.
+    """
+    stats = get_stats(stats)
+    overlaps, strengths = {}, {}
+    for gt_id, sys_id, area, strength in links:
+        overlaps[gt_id, sys_id] = area
+        strengths[gt_id, sys_id] = strength
+    if isinstance(backend, RasterBackend):
+        areas, covered = raster_measures(*backend.rasterize(gt_rects, sys_rects))
+    else:
+        areas, covered = polygon_measures(gt_rects, sys_rects, overlaps, stats)
 
-    if mask_path != None:
-        display_errors(groups, mask_path, sys_zones)
+    for group in groups:
+        group['error'] = get_error_type(group)
+        if group['error'] == "UNKNOWN":
+            raise ValueError('Unknown error type for the group of gt {} and sys {}'.format(
+                group['gt'], group['sys']))
+        surfs = error_surfs(group, group['gt'], group['sys'], areas, overlaps, strengths, covered)
+        group['error_details'] = {key:{'area':None, 'surf':surf} for key, surf in surfs.items()}
+    return groups
 
-    groups = compute_scores(groups)
-    results, n_results = compute_zonemap(groups, gt_zones)
+def polygon_measures(gt_rects, sys_rects, overlaps, stats):
+    """Return the zone areas and the covered area function of error_surfs for polygons."""
+    areas = {'gt':get_zone_areas(gt_rects), 'sys':get_zone_areas(sys_rects)}
+    rects = {'gt':gt_rects, 'sys':sys_rects}
+
+    def covered(tag, key, others):
+        """Return the area of a zone covered by the union of zones of the other tag."""
+        other_tag = 'sys' if tag == 'gt' else 'gt'
+        pairs = [(key, other) if tag == 'gt' else (other, key) for other in others]
+        bounds = [rects[other_tag][other].bounds for other in others]
+        if not any(overlap_bounds(bounds_1, bounds_2)
+                   for i, bounds_1 in enumerate(bounds) for bounds_2 in bounds[i + 1:]):
+            return sum(overlaps[pair] for pair in pairs)
+        stats.count('shapely_ops', 2)
+        union = unary_union([rects[other_tag][other] for other in others])
+        return rects[tag][key].intersection(union).area
+
+    return areas, covered
+
+def raster_measures(gt_raster, sys_raster):
+    """Return the zone areas and the covered area function of error_surfs for rasters."""
+    pixel_area = gt_raster.pixel_area()
+    rasters = {'gt':gt_raster, 'sys':sys_raster}
+    areas = {tag:dict(zip(raster.ids, (raster.areas * pixel_area).tolist()))
+             for tag, raster in rasters.items()}
+
+    def covered(tag, key, others):
+        """Return the area of the pixels of a zone covered by zones of the other tag."""
+        raster = rasters[tag]
+        other_raster = rasters['sys' if tag == 'gt' else 'gt']
+        return covered_pixels(raster, raster.index[key],
+                              [other_raster.index[other] for other in others],
+                              other_raster) * pixel_area
+
+    return areas, covered
+
+def overlap_bounds(bounds_1, bounds_2):
+    """Return True if two (minx, miny, maxx, maxy) bounds overlap on a non-empty area."""
+    return (bounds_1[0] < bounds_2[2] and bounds_2[0] < bounds_1[2]
+            and bounds_1[1] < bounds_2[3] and bounds_2[1] < bounds_1[3])
+
+def component_groups(links, gt_rects, sys_rects, backend=None):
+    """Group and score the zones of a connected component of the link graph."""
+    groups = make_groups(links)
+    groups = add_unmatched(groups, gt_rects, sys_rects)
+    if not surfs_from_links(gt_rects, sys_rects, backend):
+        return compute_scores(compute_errors(groups, gt_rects, sys_rects))
+    return compute_error_surfs(groups, gt_rects, sys_rects, links, backend=backend)
+
+def group_key(group, ranks, gt_order, sys_order):
+    """Return the position of a group among the groups of the whole page.
+
+    Linked groups come first in the order of the link that created them, then
+    unmatched gt zones and unmatched sys zones in the order of the zones.
+    """
+    if group['gt'] and group['sys']:
+        return (0, ranks[group['gt'][0], group['sys'][0]])
+    if group['gt']:
+        return (1, gt_order[group['gt'][0]])
+    return (2, sys_order[group['sys'][0]])
+
+class ZoneMapEvaluator(IncrementalEvaluator):
+    """ZoneMap of a page re-evaluated incrementally when sys zones are edited.
+
+    evaluate() returns the (groups, results, n_results) zonemap() would give
+    on the current zones, sys zones added by add_zone coming after the others.
+    """
+
+    def __init__(self, gt_zones, sys_zones, backend=None):
+        super().__init__(gt_zones, sys_zones, backend)
+        self.gt_area = get_total_area(self.ref_zones, self.backend)
+
+    def evaluate_component(self, ref_zones, hyp_zones, links):
+        ranks = {(gt_key, sys_key):self.rank(gt_key, sys_key) for gt_key, sys_key, _, _ in links}
+        return [(group_key(group, ranks, self.ref_order, self.hyp_order), group)
+                for group in component_groups(links, ref_zones, hyp_zones, self.backend)]
+
+    def combine(self, items):
+        results, n_results = compute_zonemap(items, self.ref_zones, self.gt_area)
+        return items, results, n_results
+
+def zonemap_component_job(job):
+    """Group and score a batch of (links, gt_rects, sys_rects) components with a backend."""
+    batch, backend = job
+    return [component_groups(links, gt_rects, sys_rects, backend)
+            for links, gt_rects, sys_rects in batch]
+
+def zonemap_components(gt_zones, sys_zones, links=None, workers=None, threads=False,
+                       stats=None, backend=None):
+    """Perform the zonemap algorithm on each connected component of the link graph.
+
+    Components are evaluated in a process (or thread) pool when workers > 1,
+    then merged, which gives the groups and results zonemap() would give
+    without displaying errors. This parallelizes pages with many zones.
+    """
+    stats = get_stats(stats)
+    backend = get_backend(backend)
+    if links is None:
+        with stats.stage('links'):
+            links = compute_links(gt_zones, sys_zones, stats, backend)
+    with stats.stage('sort'):
+        sorted_links = sort_links(links)
+    with stats.stage('components'):
+        components = link_components(gt_zones, sys_zones, sorted_links)
+        batches = batch_components(components, (workers or 1) * 4)
+        jobs = [([(links, {key:gt_zones[key] for key in gts}, {key:sys_zones[key] for key in syss})
+                  for gts, syss, links in batch], backend) for batch in batches]
+    stats.count('components', len(components))
+    with stats.stage('groups'):
+        ranks = {(gt_key, sys_key):rank
+                 for rank, (gt_key, sys_key, _, _) in enumerate(sorted_links)}
+        gt_order = {key:i for i, key in enumerate(gt_zones)}
+        sys_order = {key:i for i, key in enumerate(sys_zones)}
+        groups = [group for batch in parallel_map(zonemap_component_job, jobs, workers, threads)
+                  for component in batch for group in component]
+        groups.sort(key=lambda group: group_key(group, ranks, gt_order, sys_order))
+    stats.count('groups', len(groups))
+    with stats.stage('scores'):
+        results, n_results = compute_zonemap(groups, gt_zones, get_total_area(gt_zones, backend))
     return groups, results, n_results
 
-def zonemap_xml(gt_xml_path, sys_xml_path, mask_path=None):
-    """Compute ZoneMap with given gedi xml files."""
-    gt_zones = zones_from_gedi_xml(gt_xml_path)
-    sys_zones = zones_from_gedi_xml(sys_xml_path)
-    groups, results, n_results = zonemap(gt_zones, sys_zones, mask_path)
+def zonemap_raster(gt_zones, sys_zones, scale=1.0):
+    """Perform the zonemap algorithm by counting pixels on rasterized zones.
+
+    Error areas come out as surfaces only, and are approximate when scale < 1.
+    """
+    return zonemap(gt_zones, sys_zones, backend=RasterBackend(scale))
+
+def zonemap_xml(gt_xml_path, sys_xml_path, mask_path=None, cache_dir=None, writer=None,
+                output_dir="output", stats=None, backend=None):
+    """Compute ZoneMap with given gedi xml files, zones and links can be cached in cache_dir."""
+    stats = get_stats(stats)
+    links = None
+    with stats.stage('load'):
+        if cache_dir is None:
+            gt_zones = zone_table_from_gedi_xml(gt_xml_path)
+            sys_zones = zone_table_from_gedi_xml(sys_xml_path)
+        else:
+            cache = get_cache(cache_dir)
+            gt_zones = cache.zones(gt_xml_path)
+            sys_zones = cache.zones(sys_xml_path)
+            links = cache.links(gt_xml_path, sys_xml_path,
+                                lambda: compute_links(gt_zones, sys_zones, stats, backend),
+                                backend=backend)
+    groups, results, n_results = zonemap(gt_zones, sys_zones, mask_path, links, writer=writer,
+                                         output_dir=output_dir, stats=stats, backend=backend)
     return groups, results, n_results
 
-def zonemap_xmls(ref_folder, hyp_folder, mask_folder=None):
-    """Perform the zonemapalt algorithm on xmls folders."""
-    file_pairs = xmls_from_folder(ref_folder, hyp_folder)
-    sum_scores = {}
-    sum_n_scores = {}
+def zonemap_pages(gt_xml_path, sys_xml_path, stats=None):
+    """Yield the ZoneMap results of each page of multi-page gedi xml files."""
+    yield from zonemap_page_pairs(pair_gedi_pages(gt_xml_path, sys_xml_path), stats)
+
+def zonemap_page_pairs(page_pairs, stats=None):
+    """Yield the ZoneMap results of each (gt_zones, sys_zones) page."""
+    for gt_zones, sys_zones in page_pairs:
+        _, results, n_results = zonemap(gt_zones, sys_zones, stats=stats)
+        yield results, n_results
+
+def zonemap_document(gt_xml_path, sys_xml_path, stats=None):
+    """Compute ZoneMap page by page on gedi xml files and aggregate the document."""
+    return document_results(zonemap_pages(gt_xml_path, sys_xml_path, stats))
+
+def document_results(page_results):
+    """Aggregate the (results, n_results) of the pages of a document."""
+    pages = CorpusStats()
+    for results, n_results in page_results:
+        pages.add(results, n_results)
+    sum_results = pages.sum_scores()
+    sum_n_results = pages.sum_counts()
+    total_error = (sum_results['miss'] + sum_results['false_alarm']
+                   + sum_results['split'] + sum_results['merge'])
+    sum_results['zonemap_score'] = round(total_error * 100 / float(sum_results['total_gt_area']), 2)
+    return sum_results, sum_n_results
+
+def group_details(groups):
+    """Return the groups of a page as JSON records, with their error surfaces only."""
+    return [{'gt':group['gt'], 'sys':group['sys'], 'error':group['error'],
+             'surfs':{key:float(detail['surf'])
+                      for key, detail in group['error_details'].items()}}
+            for group in groups]
+
+def zonemap_job(job):
+    """Score the page of a PageJob.
+
+    Zones are read from the stores of the job when given, instead of the xml
+    files. Return the scores, the counts, the PipelineStats of the job and its
+    group records, None without stats or details. Multi-page documents have
+    no details.
+    """
+    stats = PipelineStats() if job.with_stats else None
+    if job.stores is not None:
+        with get_stats(stats).stage('load'):
+            page_pairs = store_page_pairs(*job.stores)
+        if job.multipage:
+            current_score, n_scores = document_results(zonemap_page_pairs(page_pairs, stats))
+            return current_score, n_scores, stats, None
+    elif job.multipage:
+        current_score, n_scores = zonemap_document(job.ref_file, job.hyp_file, stats)
+        return current_score, n_scores, stats, None
+    writer = None
+    if job.mask_path is not None:
+        from lib.display import get_writer, wait_in_worker
+        writer = get_writer()
+    if job.stores is not None:
+        groups, current_score, n_scores = zonemap(*page_pairs[0], job.mask_path, writer=writer,
+                                                  output_dir=job.output_dir, stats=stats)
+    else:
+        groups, current_score, n_scores = zonemap_xml(job.ref_file, job.hyp_file, job.mask_path,
+                                                      job.cache_dir, writer, job.output_dir,
+                                                      stats)
+    if writer is not None:
+        wait_in_worker(writer)
+    return current_score, n_scores, stats, group_details(groups) if job.with_details else None
+
+def zonemap_xmls(ref_folder, hyp_folder, mask_folder=None, workers=None, multipage=False,
+                 recursive=False, cache_dir=None, output_dir="output", results_format='txt',
+                 stats=None, corpus=None, details=False, stores=False):
+    """Perform the zonemapalt algorithm on xmls folders.
+
+    When stores is True, ref_folder and hyp_folder are zone stores written by
+    lib.store.write_zone_store, and zones are read from them without parsing xml.
+
+    Page results are written in output_dir/zonemapresults as txt files, a
+    single jsonl file or a single npz of columns depending on results_format.
+    The stats of every page are merged in stats when a PipelineStats is given,
+    and the scores of every page in corpus when a CorpusStats is given. When
+    details is True, the groups of every page are written there too, to be
+    read back with lib.results.read_page_details.
+    """
+    if stores:
+        file_pairs = pair_stores(ref_folder, hyp_folder)
+    else:
+        file_pairs = xmls_from_folder(ref_folder, hyp_folder, recursive)
+    results = open_results(output_dir, 'zonemap', 'ZoneMap', results_format)
+    page_details = open_details(output_dir, 'zonemap') if details else None
+    pages = CorpusStats('total_gt_area')
+    jobs = []
     for pair in file_pairs:
         mask_path = None
         filename = basename(get_filename(pair['hyp_file']))
         if mask_folder is not None:
             mask_path = '{}/{}.{}'.format(mask_folder, filename, 'jpg')
-        _, current_score, n_scores = zonemap_xml(pair['ref_file'], pair['hyp_file'], mask_path)
-
-        out_folder = "output/zonemapresults/" + filename
-        with open(out_folder + '/zonemapmetric.txt', 'w') as file:
-            file.write('ZoneMap Measures \n')
-            i = 0
-            for k, v in current_score.items():
-                i = i + 1
-                file.write('\n' + str(i) + ". " + str(k) + ' : ' + str(v))
-            file.write('\n\nCount of ZoneMap Evaluation Parameters \n')
-            i = 0
-            for k, v in n_scores.items():
-                i = i + 1
-                file.write('\n' + str(i) + ". " + str(k) + ' : ' + str(v))
-            file.close()
-
-        sum_scores = dsum(sum_scores, current_score)
-        sum_n_scores = dsum(sum_n_scores, n_scores)
-
-    nb_files = len(file_pairs)
-    avg_scores = {}
-    for key, value in sum_scores.items():
-        avg_scores[key] = float(value)/float(nb_files)
-        avg_scores[key] = round(avg_scores[key], 2)
-
-    with open("output/zonemapresults/combinedzonemapmetric.txt", 'w') as file:
-        file.write('ZoneMap Result ')
-        file.write('\n\nTotal sum of ZoneMap scores of all files \n')
-        i = 0
-        for k, v in sum_scores.items():
-            i = i + 1
-            file.write('\n' + str(i) + ". " + str(k) + ' : ' + str(v))
-
-        file.write('\n\nAverage of ZoneMap scores of all files \n')
-        i = 0
-        for k, v in avg_scores.items():
-            i = i + 1
-            file.write('\n' + str(i) + ". " + str(k) + ' : ' + str(v))
-
-        file.write('\n\nTotal Count of ZoneMap Evaluation Parameters \n')
-        i = 0
-        for k, v in sum_n_scores.items():
-            i = i + 1
-            file.write('\n' + str(i) + ". " + str(k) + ' : ' + str(v))
-        file.close()
+        jobs.append(PageJob(pair['ref_file'], pair['hyp_file'], mask_path, multipage, cache_dir,
+                            output_dir, with_stats=stats is not None, with_details=details,
+                            stores=(ref_folder, hyp_folder, pair['name']) if stores else None))
+
+    for pair, (current_score, n_scores, page_stats, groups) in zip(
+            file_pairs, parallel_map(zonemap_job, jobs, workers)):
+        filename = basename(get_filename(pair['hyp_file']))
+        if stats is not None:
+            stats.add_page(filename, page_stats)
+        results.write_page(filename, pair['ref_file'], pair['hyp_file'], current_score, n_scores)
+        if groups is not None:
+            page_details.write_page(filename, groups)
+        pages.add(current_score, n_scores, filename)
+
+    if mask_folder is not None:
+        from lib.display import get_writer
+        get_writer().wait()
+
+    if corpus is not None:
+        corpus.merge(pages)
+    sum_scores = pages.sum_scores()
+    avg_scores = pages.average_scores()
+    sum_n_scores = pages.sum_counts()
+    results.write_total(sum_scores, avg_scores, sum_n_scores)
+    results.close()
+    if page_details is not None:
+        page_details.close()
 
     return sum_scores, avg_scores, sum_n_scores
 
@@ -2,90 +2,96 @@
 
 import copy
 from os.path import basename
-from tqdm import tqdm
 from shapely.geometry import Polygon
 import shapely.geometry as sg
 import numpy as np
-import cv2
-from operator import itemgetter
 
-from lib.utils import (square, zones_from_gedi_xml, xmls_from_folder, dsum, daverage,
-                   get_filename)
-from lib.display import display_matches, display_graph
+from lib.utils import (zone_table_from_gedi_xml, xmls_from_folder,
+                   get_filename, parallel_map, pair_gedi_pages, progress_bar, PageJob)
+from lib.components import link_components, batch_components
+from lib.geometry import get_backend, RasterBackend
+from lib.cache import get_cache
+from lib.results import open_results, open_details
+from lib.store import pair_stores, store_page_pairs
+from lib.stats import PipelineStats, get_stats
+from lib.aggregate import CorpusStats
+from lib.incremental import IncrementalEvaluator
+from lib.raster import window_intersection, local_window, crop, union_mask, covered_pixels
 
 __MS__ = 0.5
+# Areas below this fraction of their ref zone area are slivers left by float differences
+__AREA_TOLERANCE__ = 1e-9
 
-def compute_link(zone_1, zone_2):
-    """Compute a link between two zones."""
-    intersect = zone_1.intersection(zone_2)
-    if intersect.area == 0:
-        return 0
-    return (square(float(intersect.area)/float(zone_1.area))
-            + square(float(intersect.area)/float(zone_2.area)))
-
-def compute_links(ref_zones, hyp_zones):
-    """Compute all links."""
-    links = []
-    for ref_key, ref_zone in ref_zones.items():
-        for hyp_key, hyp_zone in hyp_zones.items():
-            strength = compute_link(ref_zone, hyp_zone)
-            if strength > 0:
-                links.append({'strength':strength,
-                              'ref_id':ref_key,
-                              'hyp_id':hyp_key})
-    return links
+def compute_links(ref_zones, hyp_zones, stats=None, backend=None):
+    """Compute all links in a LinkTable, with the auto geometry backend by default."""
+    return get_backend(backend).links(ref_zones, hyp_zones, stats)
 
 def sort_links(links):
-    """Sort the links."""
-    return sorted(links, key=itemgetter('strength'), reverse=True)
-
-def make_matches(links, ref_zones, hyp_zones, threshold):
-    """Make groups from links."""
+    """Sort the links by decreasing strength."""
+    return links.sorted()
+
+def make_matches(links, ref_zones, hyp_zones, threshold, stats=None):
+    """Make groups from links.
+
+    The part of each ref zone left by its matches is kept from one link to the
+    next instead of being recomputed, which rounds differently on non-rectangular
+    zones. Areas below __AREA_TOLERANCE__ of the ref zone area are taken as
+    empty, so that float slivers never make a match. The original
+    implementation could match them, at threshold 0 or when the sliver is all
+    that is left of a ref zone, so such pages can change class.
+    """
+    stats = get_stats(stats)
     ref_links = {}
     hyp_links = {}
     matches = {}
-    for i, link in enumerate(links):
-        ref_link = find_in_links(link['ref_id'], ref_links)
-        hyp_link = find_in_links(link['hyp_id'], hyp_links)
+    # Part of each ref zone not covered yet by the hyp zones matched to it
+    ref_residuals = {}
+    # Union of the ref zones matched to each hyp zone
+    hyp_covers = {}
+    for i, (ref_id, hyp_id, _, _) in enumerate(links):
+        ref_link = find_in_links(ref_id, ref_links)
+        hyp_link = find_in_links(hyp_id, hyp_links)
 
-        # Get original zones
-        ref_zone = copy.copy(ref_zones[link['ref_id']])
-        hyp_zone = copy.copy(hyp_zones[link['hyp_id']])
+        ref_residual = ref_residuals.get(ref_id, ref_zones[ref_id])
+        hyp_zone = hyp_zones[hyp_id]
 
         ref_card = 1
         hyp_card = 1
+        ref_zone = ref_residual
         if hyp_link is not None: # hyp matched
             ref_card += len(hyp_link)
-            for matched_ref_id in hyp_link:
-                matched_ref = copy.copy(ref_zones[matched_ref_id])
-                ref_zone = ref_zone.difference(ref_zone.intersection(matched_ref))
-                hyp_zone = hyp_zone.difference(hyp_zone.intersection(matched_ref))
+            ref_zone = ref_zone.difference(hyp_covers[hyp_id])
+            stats.count('shapely_ops')
 
         if ref_link is not None: # ref matched
             hyp_card += len(ref_link)
-            for matched_hyp_id in ref_link:
-                matched_hyp = copy.copy(hyp_zones[matched_hyp_id])
-                ref_zone = ref_zone.difference(ref_zone.intersection(matched_hyp))
 
         # Compute ratio
         hyp_ref_intersection = ref_zone.intersection(hyp_zone)
+        stats.count('shapely_ops')
+        sliver = __AREA_TOLERANCE__ * ref_zones[ref_id].area
         matching_ratio = 0
-        if ref_zone.area > 0:
+        if ref_zone.area > sliver and hyp_ref_intersection.area > sliver:
             matching_ratio = hyp_ref_intersection.area / ref_zone.area
 
         if matching_ratio > threshold:
             # Match them all
             if ref_link is not None:
-                ref_links[link['ref_id']].append(link['hyp_id'])
+                ref_links[ref_id].append(hyp_id)
             else:
-                ref_links[link['ref_id']] = [link['hyp_id']]
+                ref_links[ref_id] = [hyp_id]
             if hyp_link is not None:
-                hyp_links[link['hyp_id']].append(link['ref_id'])
+                hyp_links[hyp_id].append(ref_id)
+                hyp_covers[hyp_id] = hyp_covers[hyp_id].union(
+                    ref_zones[ref_id])
             else:
-                hyp_links[link['hyp_id']] = [link['ref_id']]
+                hyp_links[hyp_id] = [ref_id]
+                hyp_covers[hyp_id] = ref_zones[ref_id]
+            ref_residuals[ref_id] = ref_residual.difference(hyp_zone)
+            stats.count('shapely_ops', 2 if hyp_link is not None else 1)
 
-            matches[i] = {'ref_id':link['ref_id'],
-                          'hyp_id':link['hyp_id'],
+            matches[i] = {'ref_id':ref_id,
+                          'hyp_id':hyp_id,
                           'ref_card':ref_card,
                           'hyp_card':hyp_card,
                           'zone':hyp_ref_intersection,
@@ -127,8 +133,9 @@ def get_coef(error_type):
     elif error_type == "Split" or error_type == "Merge" or error_type == "Multiple":
         return 0.5
 
-def find_missed_areas(matches, ref_zones, hyp_zones, ref_links, hyp_links):
+def find_missed_areas(matches, ref_zones, hyp_zones, ref_links, hyp_links, stats=None):
     """Find missed areas."""
+    stats = get_stats(stats)
     for ref_zone_id, ref_zone in ref_zones.items(): # For each zones
         ref_zone_tmp = copy.copy(ref_zone)
         ref_link = find_in_links(ref_zone_id, ref_links) # Look for it in links
@@ -136,6 +143,7 @@ def find_missed_areas(matches, ref_zones, hyp_zones, ref_links, hyp_links):
             for hyp_zone_id in ref_link:
                 hyp_zone = hyp_zones[hyp_zone_id]
                 ref_zone_tmp = ref_zone_tmp.difference(ref_zone_tmp.intersection(hyp_zone))
+                stats.count('shapely_ops', 2)
         if ref_zone_tmp.area > 0:
             matches['miss_{}'.format(ref_zone_id)] = {'ref_id':ref_zone_id,
                                                       'hyp_id':None,
@@ -148,6 +156,7 @@ def find_missed_areas(matches, ref_zones, hyp_zones, ref_links, hyp_links):
             for ref_zone_id in hyp_link:
                 ref_zone = ref_zones[ref_zone_id]
                 hyp_zone_tmp = hyp_zone_tmp.difference(hyp_zone_tmp.intersection(ref_zone))
+                stats.count('shapely_ops', 2)
         if hyp_zone_tmp.area > 0:
             matches['fa_{}'.format(hyp_zone_id)] = {'ref_id':None,
                                                     'hyp_id':hyp_zone_id,
@@ -156,28 +165,34 @@ def find_missed_areas(matches, ref_zones, hyp_zones, ref_links, hyp_links):
 
     return matches
 
+def get_match_area(match):
+    """Return the area of a match, given directly when it has no geometry."""
+    if match['zone'] is None:
+        return match['area']
+    return match['zone'].area
+
 def compute_errors(matches):
     """Compute surface errors."""
     matchh, miss, false_alarm, split, merge, multiple = (0, 0, 0, 0, 0, 0)
     n_match, n_miss, n_fa, n_split, n_merge, n_multiple = (0, 0, 0, 0, 0, 0)
     for _, match in matches.items():
         if match['error_class'] == "Match":
-            matchh += match['zone'].area
+            matchh += get_match_area(match)
             n_match += 1
         if match['error_class'] == "Miss":
-            miss += match['zone'].area
+            miss += get_match_area(match)
             n_miss += 1
         if match['error_class'] == "False alarm":
-            false_alarm += match['zone'].area
+            false_alarm += get_match_area(match)
             n_fa += 1
         if match['error_class'] == "Split":
-            split += match['zone'].area * __MS__ * match['hyp_card']
+            split += get_match_area(match) * __MS__ * match['hyp_card']
             n_split += 1
         if match['error_class'] == "Merge":
-            merge += match['zone'].area * __MS__ * match['ref_card']
+            merge += get_match_area(match) * __MS__ * match['ref_card']
             n_merge += 1
         if match['error_class'] == "Multiple":
-            multiple += match['zone'].area * __MS__ * (match['ref_card']+match['hyp_card'])
+            multiple += get_match_area(match) * __MS__ * (match['ref_card']+match['hyp_card'])
             n_multiple += 1
     return {'match':round(matchh,2),
             'miss':round(miss,2),
@@ -191,16 +206,17 @@ def compute_errors(matches):
                                     'merge':n_merge,
                                     'multiple':n_multiple}
 
-def get_total_area(zones):
-    """Compute the sum of area of a set."""
+def get_total_area(zones, backend=None):
+    """Compute the sum of area of a set, measured by the geometry backend."""
     area = 0
-    for _, zone in zones.items():
-        area += zone.area
+    for zone_area in get_backend(backend).areas(zones).tolist():
+        area += zone_area
     return area
 
-def compute_scores(scores, ref_zones):
+def compute_scores(scores, ref_zones, ref_zones_area=None):
     """Compute zonemapalt score."""
-    ref_zones_area = get_total_area(ref_zones)
+    if ref_zones_area is None:
+        ref_zones_area = get_total_area(ref_zones)
     total_error = (scores['miss'] + scores['false_alarm'] + scores['split']
                    + scores['merge'] + scores['multiple'])
     zonemapalt_score = float(total_error)*100/float(ref_zones_area)
@@ -208,86 +224,409 @@ def compute_scores(scores, ref_zones):
     scores['total_ref_area'] = round(ref_zones_area, 2)
     return scores
 
-def zonemapalt(ref_zones, hyp_zones, threshold, mask_path=None):
-    """Perform the zonemapalt algorithm."""
-    links = compute_links(ref_zones, hyp_zones)
+def zonemapalt(ref_zones, hyp_zones, threshold, mask_path=None, links=None, writer=None,
+               output_dir="output", stats=None, details=None, backend=None):
+    """Perform the zonemapalt algorithm, links can be given if already computed.
+
+    Matches are displayed in the background when a DisplayWriter is given.
+    Stage times and counters are recorded in stats when a PipelineStats is given,
+    and match records appended to details when a list is given. Links are
+    computed with the given geometry backend, see lib.geometry. The raster
+    backend matches zones on its rasters, and gives matches without geometry.
+    """
+    stats = get_stats(stats)
+    backend = get_backend(backend)
+    if links is None:
+        with stats.stage('links'):
+            links = compute_links(ref_zones, hyp_zones, stats, backend)
+    with stats.stage('sort'):
+        sorted_links = sort_links(links)
+    return score_links(sorted_links, ref_zones, hyp_zones, threshold, mask_path, writer,
+                       output_dir, stats, details, backend)
+
+def zonemapalt_sweep(ref_zones, hyp_zones, thresholds, links=None, backend=None):
+    """Perform the zonemapalt algorithm for several thresholds, linking zones once."""
+    backend = get_backend(backend)
+    if links is None:
+        links = compute_links(ref_zones, hyp_zones, backend=backend)
     sorted_links = sort_links(links)
-    matches, ref_links, hyp_links = make_matches(sorted_links, ref_zones, hyp_zones, threshold)
-    matches = find_missed_areas(matches, ref_zones, hyp_zones, ref_links, hyp_links)
+    return [score_links(sorted_links, ref_zones, hyp_zones, threshold, backend=backend)
+            for threshold in thresholds]
+
+def score_links(sorted_links, ref_zones, hyp_zones, threshold, mask_path=None, writer=None,
+                output_dir="output", stats=None, details=None, backend=None):
+    """Match sorted links with a threshold and compute the scores."""
+    stats = get_stats(stats)
+    if isinstance(backend, RasterBackend) and mask_path is not None:
+        raise ValueError('The raster backend gives matches without geometry to display')
+    if isinstance(backend, RasterBackend):
+        with stats.stage('matches'):
+            matches, _, _ = raster_matches(sorted_links, *backend.rasterize(ref_zones, hyp_zones),
+                                           threshold)
+        stats.count('matches', len(matches))
+    else:
+        with stats.stage('matches'):
+            matches, ref_links, hyp_links = make_matches(sorted_links, ref_zones, hyp_zones,
+                                                         threshold, stats)
+        stats.count('matches', len(matches))
+        with stats.stage('missed_areas'):
+            matches = find_missed_areas(matches, ref_zones, hyp_zones, ref_links, hyp_links,
+                                        stats)
+    if details is not None:
+        details.extend(match_details(matches))
     if mask_path is not None:
-        print('Displaying matches')
-        display_matches(matches, mask_path, hyp_zones)
-    scores,n_scores = compute_errors(matches)
-    scores = compute_scores(scores, ref_zones)
+        with stats.stage('display'):
+            from lib.display import display_matches
+            print('Displaying matches')
+            display_matches(matches, mask_path, hyp_zones, writer=writer, output_dir=output_dir)
+    with stats.stage('scores'):
+        scores,n_scores = compute_errors(matches)
+        scores = compute_scores(scores, ref_zones, get_total_area(ref_zones, backend))
+    return scores, n_scores
+
+def match_details(matches):
+    """Return the matches of a page as JSON records, without their geometry."""
+    return [{'ref_id':match['ref_id'], 'hyp_id':match['hyp_id'],
+             'error_class':match['error_class'], 'ref_card':match.get('ref_card'),
+             'hyp_card':match.get('hyp_card'), 'area':float(get_match_area(match))}
+            for match in matches.values()]
+
+def component_matches(links, ref_zones, hyp_zones, threshold, backend=None):
+    """Match the zones of a connected component of the link graph, misses included.
+
+    With the raster backend, matches, residuals and covers are counted on its
+    rasters, otherwise they are computed on the zone polygons.
+    """
+    if isinstance(backend, RasterBackend):
+        return raster_matches(links, *backend.rasterize(ref_zones, hyp_zones), threshold)[0]
+    matches, ref_links, hyp_links = make_matches(links, ref_zones, hyp_zones, threshold)
+    return find_missed_areas(matches, ref_zones, hyp_zones, ref_links, hyp_links)
+
+def match_key(match, ranks, ref_order, hyp_order):
+    """Return the position of a match among the matches of the whole page.
+
+    Matched links come first in link order, then missed ref areas and false
+    alarm hyp areas in the order of the zones.
+    """
+    if match['ref_id'] is not None and match['hyp_id'] is not None:
+        return (0, ranks[match['ref_id'], match['hyp_id']])
+    if match['ref_id'] is not None:
+        return (1, ref_order[match['ref_id']])
+    return (2, hyp_order[match['hyp_id']])
+
+class ZoneMapAltEvaluator(IncrementalEvaluator):
+    """ZoneMapAlt of a page re-evaluated incrementally when hyp zones are edited.
+
+    evaluate() returns the (scores, n_scores) zonemapalt() would give on the
+    current zones, hyp zones added by add_zone coming after the others.
+    """
+
+    def __init__(self, ref_zones, hyp_zones, threshold, backend=None):
+        super().__init__(ref_zones, hyp_zones, backend)
+        self.threshold = threshold
+        self.ref_area = get_total_area(self.ref_zones, self.backend)
+
+    def evaluate_component(self, ref_zones, hyp_zones, links):
+        ranks = {(ref_key, hyp_key):self.rank(ref_key, hyp_key) for ref_key, hyp_key, _, _ in links}
+        matches = component_matches(links, ref_zones, hyp_zones, self.threshold, self.backend)
+        return [(match_key(match, ranks, self.ref_order, self.hyp_order), match)
+                for match in matches.values()]
+
+    def combine(self, items):
+        scores, n_scores = compute_errors(dict(enumerate(items)))
+        return compute_scores(scores, self.ref_zones, self.ref_area), n_scores
+
+def zonemapalt_component_job(job):
+    """Match a batch of (links, ref_zones, hyp_zones) components with a threshold and a backend."""
+    batch, threshold, backend = job
+    return [component_matches(links, ref_zones, hyp_zones, threshold, backend)
+            for links, ref_zones, hyp_zones in batch]
+
+def zonemapalt_components(ref_zones, hyp_zones, threshold, links=None, workers=None,
+                          threads=False, stats=None, backend=None):
+    """Perform the zonemapalt algorithm on each connected component of the link graph.
+
+    Components are matched in a process (or thread) pool when workers > 1,
+    then merged, which gives the scores zonemapalt() would give without
+    displaying matches. This parallelizes pages with many zones.
+    """
+    stats = get_stats(stats)
+    backend = get_backend(backend)
+    if links is None:
+        with stats.stage('links'):
+            links = compute_links(ref_zones, hyp_zones, stats, backend)
+    with stats.stage('sort'):
+        sorted_links = sort_links(links)
+    with stats.stage('components'):
+        components = link_components(ref_zones, hyp_zones, sorted_links)
+        batches = batch_components(components, (workers or 1) * 4)
+        jobs = [([(links, {key:ref_zones[key] for key in refs},
+                   {key:hyp_zones[key] for key in hyps}) for refs, hyps, links in batch],
+                 threshold, backend) for batch in batches]
+    stats.count('components', len(components))
+    with stats.stage('matches'):
+        ranks = {(ref_key, hyp_key):rank
+                 for rank, (ref_key, hyp_key, _, _) in enumerate(sorted_links)}
+        ref_order = {key:i for i, key in enumerate(ref_zones)}
+        hyp_order = {key:i for i, key in enumerate(hyp_zones)}
+        matches = [match for batch in parallel_map(zonemapalt_component_job, jobs, workers, threads)
+                   for component in batch for match in component.values()]
+        matches.sort(key=lambda match: match_key(match, ranks, ref_order, hyp_order))
+    stats.count('matches', len(matches))
+    with stats.stage('scores'):
+        scores, n_scores = compute_errors(dict(enumerate(matches)))
+        scores = compute_scores(scores, ref_zones, get_total_area(ref_zones, backend))
     return scores, n_scores
 
-def zonemapalt_xml(ref_path, hyp_path, threshold, mask_path=None):
+def raster_matches(links, ref_raster, hyp_raster, threshold):
+    """Make matches and find missed areas by counting pixels on rasterized zones."""
+    ref_links = {}
+    hyp_links = {}
+    matches = {}
+    pixel_area = ref_raster.pixel_area()
+    # Mask of each ref zone not covered yet by the hyp zones matched to it
+    ref_residuals = {}
+    for i, (ref_id, hyp_id, _, _) in enumerate(links):
+        ref_link = find_in_links(ref_id, ref_links)
+        hyp_link = find_in_links(hyp_id, hyp_links)
+        ref = ref_raster.index[ref_id]
+        hyp = hyp_raster.index[hyp_id]
+        ref_box = ref_raster.boxes[ref]
+        window = window_intersection(ref_box, hyp_raster.boxes[hyp])
+
+        if ref not in ref_residuals:
+            ref_residuals[ref] = ref_raster.mask(ref, ref_box)
+        ref_zone = ref_residuals[ref]
+        hyp_mask = hyp_raster.mask(hyp, window)
+
+        ref_card = 1
+        hyp_card = 1
+        if hyp_link is not None: # hyp matched
+            ref_card += len(hyp_link)
+            matched_refs = [ref_raster.index[ref_id] for ref_id in hyp_link]
+            ref_zone = ref_zone & ~union_mask(ref_raster, matched_refs, ref_box)
+
+        if ref_link is not None: # ref matched
+            hyp_card += len(ref_link)
+
+        ref_area = np.count_nonzero(ref_zone)
+        zone_area = np.count_nonzero(crop(ref_zone, local_window(window, ref_box)) & hyp_mask)
+        matching_ratio = 0
+        if ref_area > 0:
+            matching_ratio = zone_area / ref_area
+
+        if matching_ratio > threshold:
+            ref_links.setdefault(ref_id, []).append(hyp_id)
+            hyp_links.setdefault(hyp_id, []).append(ref_id)
+            crop(ref_residuals[ref], local_window(window, ref_box))[...] &= ~hyp_mask
+            matches[i] = {'ref_id':ref_id,
+                          'hyp_id':hyp_id,
+                          'ref_card':ref_card,
+                          'hyp_card':hyp_card,
+                          'zone':None,
+                          'area':float(zone_area) * pixel_area,
+                          'error_class':get_error_class(ref_card, hyp_card)}
+
+    for ref, ref_id in enumerate(ref_raster.ids):
+        area = ref_raster.areas[ref]
+        if ref in ref_residuals:
+            area = np.count_nonzero(ref_residuals[ref])
+        if area > 0:
+            matches['miss_{}'.format(ref_id)] = {'ref_id':ref_id,
+                                                 'hyp_id':None,
+                                                 'zone':None,
+                                                 'area':float(area) * pixel_area,
+                                                 'error_class':'Miss'}
+    for hyp, hyp_id in enumerate(hyp_raster.ids):
+        area = hyp_raster.areas[hyp]
+        if hyp_id in hyp_links:
+            matched_refs = [ref_raster.index[ref_id] for ref_id in hyp_links[hyp_id]]
+            area -= covered_pixels(hyp_raster, hyp, matched_refs, ref_raster)
+        if area > 0:
+            matches['fa_{}'.format(hyp_id)] = {'ref_id':None,
+                                               'hyp_id':hyp_id,
+                                               'zone':None,
+                                               'area':float(area) * pixel_area,
+                                               'error_class':'False alarm'}
+
+    return matches, ref_links, hyp_links
+
+def zonemapalt_raster(ref_zones, hyp_zones, threshold, scale=1.0):
+    """Perform the zonemapalt algorithm by counting pixels on rasterized zones.
+
+    Matches come out without geometry, and areas are approximate when scale < 1.
+    """
+    return zonemapalt(ref_zones, hyp_zones, threshold, backend=RasterBackend(scale))
+
+def load_xmls(ref_path, hyp_path, cache_dir=None, stats=None, backend=None):
+    """Read the zones of xml files, and their links when they are cached in cache_dir."""
+    with get_stats(stats).stage('load'):
+        if cache_dir is None:
+            return zone_table_from_gedi_xml(ref_path), zone_table_from_gedi_xml(hyp_path), None
+        cache = get_cache(cache_dir)
+        ref_zones = cache.zones(ref_path)
+        hyp_zones = cache.zones(hyp_path)
+        links = cache.links(ref_path, hyp_path,
+                            lambda: compute_links(ref_zones, hyp_zones, stats, backend),
+                            backend=backend)
+        return ref_zones, hyp_zones, links
+
+def zonemapalt_xml(ref_path, hyp_path, threshold, mask_path=None, cache_dir=None, writer=None,
+                   output_dir="output", stats=None, details=None, backend=None):
     """Read xml files before performing the zonemapalt algorithm."""
-    ref_zones = zones_from_gedi_xml(ref_path)
-    sys_zones = zones_from_gedi_xml(hyp_path)
-    scores, n_scores = zonemapalt(ref_zones, sys_zones, threshold, mask_path)
+    ref_zones, sys_zones, links = load_xmls(ref_path, hyp_path, cache_dir, stats, backend)
+    scores, n_scores = zonemapalt(ref_zones, sys_zones, threshold, mask_path, links, writer,
+                                  output_dir, stats, details, backend)
     return scores, n_scores
 
-def zonemapalt_xmls(ref_folder, hyp_folder, mask_folder=None, threshold=0.15):
-    """Perform the zonemapalt algorithm on xmls folders."""
-    file_pairs = xmls_from_folder(ref_folder, hyp_folder)
-    sum_scores = {}
-    sum_n_scores = {}
-    with tqdm(total=len(file_pairs)) as pbar:
-        for pair in file_pairs:
-            mask_path = None
+def zonemapalt_pages(ref_path, hyp_path, threshold, stats=None):
+    """Yield the zonemapalt scores of each page of multi-page xml files."""
+    yield from zonemapalt_page_pairs(pair_gedi_pages(ref_path, hyp_path), threshold, stats)
+
+def zonemapalt_page_pairs(page_pairs, threshold, stats=None):
+    """Yield the zonemapalt scores of each (ref_zones, hyp_zones) page."""
+    for ref_zones, hyp_zones in page_pairs:
+        yield zonemapalt(ref_zones, hyp_zones, threshold, stats=stats)
+
+def zonemapalt_document(ref_path, hyp_path, threshold, stats=None):
+    """Perform the zonemapalt algorithm page by page and aggregate the document."""
+    return document_scores(zonemapalt_pages(ref_path, hyp_path, threshold, stats))
+
+def document_scores(page_scores):
+    """Aggregate the (scores, n_scores) of the pages of a document."""
+    pages = CorpusStats()
+    for scores, n_scores in page_scores:
+        pages.add(scores, n_scores)
+    sum_scores = pages.sum_scores()
+    sum_n_scores = pages.sum_counts()
+    total_error = (sum_scores['miss'] + sum_scores['false_alarm'] + sum_scores['split']
+                   + sum_scores['merge'] + sum_scores['multiple'])
+    sum_scores['zonemapalt_score'] = round(total_error * 100 / float(sum_scores['total_ref_area']), 2)
+    return sum_scores, sum_n_scores
+
+def zonemapalt_job(job):
+    """Score the page of a PageJob with its threshold.
+
+    Zones are read from the stores of the job when given, instead of the xml
+    files. Return the scores, the counts, the PipelineStats of the job and its
+    match records, None without stats or details. Multi-page documents have
+    no details.
+    """
+    stats = PipelineStats() if job.with_stats else None
+    if job.stores is not None:
+        with get_stats(stats).stage('load'):
+            page_pairs = store_page_pairs(*job.stores)
+        if job.multipage:
+            scores, n_scores = document_scores(zonemapalt_page_pairs(page_pairs, job.threshold,
+                                                                     stats))
+            return scores, n_scores, stats, None
+    elif job.multipage:
+        scores, n_scores = zonemapalt_document(job.ref_file, job.hyp_file, job.threshold, stats)
+        return scores, n_scores, stats, None
+    writer = None
+    if job.mask_path is not None:
+        from lib.display import get_writer, wait_in_worker
+        writer = get_writer()
+    details = [] if job.with_details else None
+    if job.stores is not None:
+        scores, n_scores = zonemapalt(*page_pairs[0], job.threshold, job.mask_path, None, writer,
+                                      job.output_dir, stats, details)
+    else:
+        scores, n_scores = zonemapalt_xml(job.ref_file, job.hyp_file, job.threshold,
+                                          job.mask_path, job.cache_dir, writer, job.output_dir,
+                                          stats, details)
+    if writer is not None:
+        wait_in_worker(writer)
+    return scores, n_scores, stats, details
+
+def zonemapalt_xmls(ref_folder, hyp_folder, mask_folder=None, threshold=0.15, workers=None,
+                    multipage=False, recursive=False, cache_dir=None, progress=True,
+                    output_dir="output", results_format='txt', stats=None, corpus=None,
+                    details=False, stores=False):
+    """Perform the zonemapalt algorithm on xmls folders, with a tqdm bar if progress is True.
+
+    When stores is True, ref_folder and hyp_folder are zone stores written by
+    lib.store.write_zone_store, and zones are read from them without parsing xml.
+
+    Page results are written in output_dir/zonemapaltresults as txt files, a
+    single jsonl file or a single npz of columns depending on results_format.
+    The stats of every page are merged in stats when a PipelineStats is given,
+    and the scores of every page in corpus when a CorpusStats is given. When
+    details is True, the matches of every page are written there too, to be
+    read back with lib.results.read_page_details.
+    """
+    if stores:
+        file_pairs = pair_stores(ref_folder, hyp_folder)
+    else:
+        file_pairs = xmls_from_folder(ref_folder, hyp_folder, recursive)
+    results = open_results(output_dir, 'zonemapalt', 'ZoneMapAlt', results_format)
+    page_details = open_details(output_dir, 'zonemapalt') if details else None
+    pages = CorpusStats('total_ref_area')
+    jobs = []
+    for pair in file_pairs:
+        mask_path = None
+        filename = basename(get_filename(pair['hyp_file']))
+        if mask_folder is not None:
+            mask_path = '{}/{}.{}'.format(mask_folder, filename, 'jpg')
+        jobs.append(PageJob(pair['ref_file'], pair['hyp_file'], mask_path, multipage, cache_dir,
+                            output_dir, with_stats=stats is not None, with_details=details,
+                            stores=(ref_folder, hyp_folder, pair['name']) if stores else None,
+                            threshold=threshold))
+
+    with progress_bar(len(file_pairs), progress) as pbar:
+        for pair, (current_score, n_scores, page_stats, matches) in zip(
+                file_pairs, parallel_map(zonemapalt_job, jobs, workers)):
             filename = basename(get_filename(pair['hyp_file']))
-            if mask_folder is not None:
-                mask_path = '{}/{}.{}'.format(mask_folder, filename, 'jpg')
-            current_score, n_scores = zonemapalt_xml(pair['ref_file'], pair['hyp_file'], threshold, mask_path)
-
-            out_folder = "output/zonemapaltresults/" + filename
-            with open(out_folder + '/zonemapaltmetric.txt', 'w') as file:
-                file.write('ZoneMapAlt Measures \n')
-                i = 0
-                for k, v in current_score.items():
-                    i = i + 1
-                    file.write('\n' + str(i) + ". " + str(k) + ' : ' + str(v))
-                file.write('\n\nCount of ZoneMapAlt Evaluation Parameters \n')
-                i = 0
-                for k, v in n_scores.items():
-                    i = i + 1
-                    file.write('\n' + str(i) + ". " + str(k) + ' : ' + str(v))
-                file.close()
-
-            sum_scores = dsum(sum_scores, current_score)
-            sum_n_scores = dsum(sum_n_scores, n_scores)
-
+            if stats is not None:
+                stats.add_page(filename, page_stats)
+            results.write_page(filename, pair['ref_file'], pair['hyp_file'], current_score,
+                               n_scores)
+            if matches is not None:
+                page_details.write_page(filename, matches)
+            pages.add(current_score, n_scores, filename)
             pbar.update()
 
-    nb_files = len(file_pairs)
-    avg_scores = {}
-    for key, value in sum_scores.items():
-        avg_scores[key] = float(value)/float(nb_files)
-        avg_scores[key] = round(avg_scores[key], 2)
-
-    with open("output/zonemapaltresults/combinedzonemapaltmetric.txt", 'w') as file:
-        file.write('ZoneMapAlt Result ')
-        file.write('\n\nTotal sum of ZoneMapAlt scores of all files \n')
-        i = 0
-        for k, v in sum_scores.items():
-            i = i + 1
-            file.write('\n' + str(i) + ". " + str(k) + ' : ' + str(v))
-
-        file.write('\n\nAverage of ZoneMapAlt scores of all files \n')
-        i = 0
-        for k, v in avg_scores.items():
-            i = i + 1
-            file.write('\n' + str(i) + ". " + str(k) + ' : ' + str(v))
-
-        file.write('\n\nTotal Count of ZoneMapAlt Evaluation Parameters \n')
-        i = 0
-        for k, v in sum_n_scores.items():
-            i = i + 1
-            file.write('\n' + str(i) + ". " + str(k) + ' : ' + str(v))
-        file.close()
+    if mask_folder is not None:
+        from lib.display import get_writer
+        get_writer().wait()
+
+    if corpus is not None:
+        corpus.merge(pages)
+    sum_scores = pages.sum_scores()
+    avg_scores = pages.average_scores()
+    sum_n_scores = pages.sum_counts()
+    results.write_total(sum_scores, avg_scores, sum_n_scores)
+    results.close()
+    if page_details is not None:
+        page_details.close()
 
     return sum_scores, avg_scores, sum_n_scores
 
+def zonemapalt_sweep_job(job):
+    """Sweep the thresholds on one (ref, hyp, thresholds, cache) job in a worker process."""
+    ref_file, hyp_file, thresholds, cache_dir = job
+    ref_zones, hyp_zones, links = load_xmls(ref_file, hyp_file, cache_dir)
+    return zonemapalt_sweep(ref_zones, hyp_zones, thresholds, links)
+
+def zonemapalt_sweep_xmls(ref_folder, hyp_folder, thresholds, workers=None, recursive=False,
+                          cache_dir=None, progress=True):
+    """Perform the zonemapalt algorithm on xmls folders for several thresholds at once.
+
+    Return a (sum_scores, avg_scores, sum_n_scores) tuple for each threshold.
+    """
+    file_pairs = xmls_from_folder(ref_folder, hyp_folder, recursive)
+    thresholds = list(thresholds)
+    pages = [CorpusStats('total_ref_area') for _ in thresholds]
+    jobs = [(pair['ref_file'], pair['hyp_file'], thresholds, cache_dir) for pair in file_pairs]
+
+    with progress_bar(len(file_pairs), progress) as pbar:
+        for sweep in parallel_map(zonemapalt_sweep_job, jobs, workers):
+            for threshold_pages, (current_score, n_scores) in zip(pages, sweep):
+                threshold_pages.add(current_score, n_scores)
+            pbar.update()
+
+    return [(threshold_pages.sum_scores(), threshold_pages.average_scores(),
+             threshold_pages.sum_counts()) for threshold_pages in pages]
+
 if __name__ == '__main__':
     print(zonemapalt_xmls("input/all/reference/", "input/all/hypothesis", "input/all/images"))